@@ -1,498 +1,1618 @@
-import sqlite3
-import os
-import shutil
-from datetime import datetime
-
-# Конфигурационная переменная для пути к папке интерфейса WoW
-WoW_InterfaceFolderPath = "C:\GAMES\Isengard_WotLK_335a\Interface\AddOns\EzInfo"  # Укажите путь, например: "C:\Isengard_WotLK_335a\Interface\AddOns\EzInfo"
-
-# Глобальная переменная для файла лога
-log_file = None
-
-def setup_logging():
-    """Настраивает логирование в файл с временной меткой"""
-    global log_file
-    logs_dir = "LOGS"
-    if not os.path.exists(logs_dir):
-        os.makedirs(logs_dir)
-    
-    # Создаем имя файла с текущей датой и временем
-    current_time = datetime.now().strftime("%d.%m.%Y-%H.%M.%S")
-    log_filename = f"DataInfuser_{current_time}.txt"  # Изменено на .txt
-    log_filepath = os.path.join(logs_dir, log_filename)
-    
-    try:
-        # Открываем файл для записи (используем 'a' для добавления, чтобы не потерять данные при ошибках)
-        log_file = open(log_filepath, 'a', encoding='utf-8')
-        
-        # Пишем начальную информацию
-        log_file.write(f"Логирование начато: {log_filepath}\n")
-        log_file.write(f"Время запуска: {datetime.now().strftime('%d.%m.%Y %H:%M:%S')}\n")
-        log_file.write("-" * 50 + "\n")
-        log_file.flush()
-        log_message(f"Лог-файл создан: {log_filepath}")
-    except Exception as e:
-        print(f"Ошибка создания лог-файла: {e}")
-
-def log_message(message):
-    """Записывает сообщение в лог файл и выводит в консоль"""
-    global log_file
-    print(message)  # Выводим в консоль
-    if log_file:
-        try:
-            log_file.write(message + "\n")
-            log_file.flush()  # Принудительно записываем в файл
-        except Exception as e:
-            print(f"Ошибка записи в лог: {e}")
-
-def close_logging():
-    """Закрывает файл лога"""
-    global log_file
-    if log_file:
-        try:
-            log_file.write("-" * 50 + "\n")
-            log_file.write(f"Логирование завершено: {datetime.now().strftime('%d.%m.%Y %H:%M:%S')}\n")
-            log_file.close()
-            log_message(f"Лог-файл закрыт")
-        except Exception as e:
-            print(f"Ошибка закрытия лог-файла: {e}")
-        finally:
-            log_file = None
-
-# Таблицы для преобразования классов и рас
-CLASSES = {
-    "Hunter": 0,
-    "Warlock": 1,
-    "Priest": 2,
-    "Paladin": 3,
-    "Mage": 4,
-    "Rogue": 5,
-    "Druid": 6,
-    "Shaman": 7,
-    "Warrior": 8,
-    "Death Knight": 9,
-}
-
-RACES = {
-    "Human": 0,
-    "Dwarf": 1,
-    "Night Elf": 2,
-    "Gnome": 3,
-    "Draenei": 4,
-    "Orc": 5,
-    "Undead": 6,
-    "Tauren": 7,
-    "Troll": 8,
-    "Blood Elf": 9,
-}
-
-# Функция для определения цвета GS
-def get_gs_color(gs_value):
-    """Возвращает цветовой код для значения GS"""
-    if not gs_value or gs_value == 0:
-        return "FFFAFAFA"  # белый для пустых значений
-    elif gs_value < 1000:
-        return "FFFAFAFA"  # белый
-    elif gs_value < 2000:
-        return "FFA1FA4F"  # зеленый
-    elif gs_value < 3000:
-        return "FF5763FB"  # синий
-    elif gs_value < 4000:
-        return "FF8A2BE2"  # фиолетовый
-    elif gs_value < 5000:
-        return "FFFF8C00"  # ярко-оранжевый
-    elif gs_value < 6000:
-        return "FFFF4500"  # красно-оранжевый
-    elif gs_value < 6200:
-        return "FFff8484"  # темно-красный
-    else:
-        return "FFFF1493"  # глубокий розовый
-
-def find_database_file():
-    """Находит последний файл базы данных в каталоге BASES или текущем каталоге"""
-    bases_dir = "BASES"
-    # Ищем в каталоге BASES
-    if os.path.exists(bases_dir) and os.path.isdir(bases_dir):
-        db_files = []
-        for file in os.listdir(bases_dir):
-            if file.startswith('ezbase_') and file.endswith('.db'):
-                file_path = os.path.join(bases_dir, file)
-                db_files.append((file_path, os.path.getmtime(file_path)))
-        if db_files:
-            # Сортируем по дате изменения (последний первый)
-            db_files.sort(key=lambda x: x[1], reverse=True)
-            log_message(f"Найдена база в BASES: {os.path.basename(db_files[0][0])}")
-            return db_files[0][0]
-    # Ищем в текущем каталоге
-    for file in os.listdir('.'):
-        if file.startswith('ezbase_') and file.endswith('.db'):
-            log_message(f"Найдена база в текущем каталоге: {file}")
-            return file
-    return None
-
-def generate_database_code(database_dict):
-    """Генерирует LUA код базы данных с разбивкой по строкам"""
-    lines = []
-    lines.append("{")
-    # Сортируем по forum_name для сохранения алфавитного порядка
-    sorted_items = sorted(database_dict.items(), key=lambda x: x[0])
-    account_lines = []
-    for forum_name, chars_list in sorted_items:
-        # Экранируем специальные символы в forum_name
-        escaped_forum_name = forum_name.replace('"', '\\"').replace("'", "\\'")
-        # Создаем список всех персонажей для этого аккаунта
-        char_lines = []
-        for char_data in chars_list:
-            name, lvl, gs, race, guild, class_num, gs_color = char_data
-            # Экранируем специальные символы в имени и гильдии
-            escaped_name = name.replace('"', '\\"').replace("'", "\\'") if name else ""
-            escaped_guild = guild.replace('"', '\\"').replace("'", "\\'") if guild else ""
-            char_line = f'{{"{escaped_name}",{lvl},{gs},{race},"{escaped_guild}",{class_num},"{gs_color}"}}'
-            char_lines.append(char_line)
-        # Объединяем персонажей в строки, разбивая если слишком длинные
-        current_line = ""
-        account_parts = []
-        for char_line in char_lines:
-            # Если добавление следующего персонажа превысит 4000 символов, начинаем новую строку
-            if len(current_line) + len(char_line) + 2 > 4000 and current_line:
-                account_parts.append(current_line.rstrip(','))
-                current_line = char_line + ","
-            else:
-                current_line += char_line + ","
-        # Добавляем последнюю часть
-        if current_line:
-            account_parts.append(current_line.rstrip(','))
-        # Формируем окончательный код для аккаунта
-        if len(account_parts) == 1:
-            account_line = f'["{escaped_forum_name}"] = {{{account_parts[0]}}}'
-        else:
-            account_line = f'["{escaped_forum_name}"] = {{\n    '
-            account_line += ',\n    '.join(account_parts)
-            account_line += '\n  }'
-        account_lines.append(account_line)
-    # Объединяем все аккаунты с переносами строк
-    lines.append(',\n  '.join(account_lines))
-    lines.append("}")
-    return '\n'.join(lines)
-
-def generate_addon_with_database():
-    """Основная функция генерации аддона"""
-    log_message("Запуск генерации аддона...")
-    # Находим базу данных автоматически
-    db_path = find_database_file()
-    if not db_path:
-        log_message("Ошибка: Файл базы данных не найден!")
-        log_message("Убедитесь, что файл с именем ezbase_*.db находится в папке BASES или в текущей папке.")
-        return
-    log_message(f"Используется база данных: {db_path}")
-    # Получаем дату изменения файла как дату сборки
-    build_time = datetime.fromtimestamp(os.path.getmtime(db_path)).strftime('%d.%m.%Y %H:%M')
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    # Получаем общее количество записей
-    cursor.execute("SELECT COUNT(*) FROM characters")
-    total_records = cursor.fetchone()[0]
-    log_message(f"Всего записей в базе: {total_records}")
-
-    # Получаем количество уникальных аккаунтов и гильдий
-    cursor.execute("SELECT COUNT(DISTINCT forum_name) FROM characters WHERE forum_name != ''")
-    total_accounts = cursor.fetchone()[0]
-    cursor.execute("SELECT COUNT(DISTINCT guild) FROM characters WHERE guild != ''")
-    total_guilds = cursor.fetchone()[0]
-    log_message(f"Уникальных аккаунтов: {total_accounts}")
-    log_message(f"Уникальных гильдий: {total_guilds}")
-
-    # Получаем все записи, группируем по аккаунту и сортируем по GS внутри каждого аккаунта
-    cursor.execute("""
-        SELECT forum_name, name, level, gs, class, guild, race
-        FROM characters
-        ORDER BY forum_name, gs DESC
-    """)
-    rows = cursor.fetchall()
-
-    # Создаем словарь для хранения данных
-    database_dict = {}
-    unknown_classes = set()  # Для отслеживания неизвестных классов
-    for row in rows:
-        forum_name, name, level, gs, class_str, guild, race_str = row
-        # Обрабатываем пустой forum_name
-        if not forum_name or forum_name.strip() == "":
-            forum_name = "NOFORUMNAME"
-        # Преобразуем class из строки в число
-        class_num = CLASSES.get(class_str, 0)
-        # Если класс не найден, попробуем найти игнорируя регистр
-        if class_num == 0 and class_str:
-            for class_key, class_id in CLASSES.items():
-                if class_str.lower() == class_key.lower():
-                    class_num = class_id
-                    break
-        # Если все еще не нашли, добавляем в список неизвестных
-        if class_num == 0 and class_str:
-            unknown_classes.add(class_str)
-            # log_message(f"Предупреждение: Неизвестный класс '{class_str}' для персонажа '{name}'")
-        # Преобразуем race из строки в число
-        race_num = RACES.get(race_str, 0)
-        # Если раса не найдена, попробуем найти по ключу в нижнем регистре
-        if race_num == 0 and race_str:
-            for race_key, race_id in RACES.items():
-                if race_str.lower() == race_key.lower():
-                    race_num = race_id
-                    break
-        # Определяем цвет GS
-        gs_color = get_gs_color(gs)
-
-        # Создаем запись персонажа: [name, level, gs, race, guild, class, gs_color]
-        char_data = [name, level, int(gs) if gs else 0, race_num, guild, class_num, gs_color]
-        # Добавляем персонажа в соответствующую группу forum_name
-        if forum_name not in database_dict:
-            database_dict[forum_name] = []
-        database_dict[forum_name].append(char_data)
-
-    # Выводим статистику по неизвестным классам
-    if unknown_classes:
-        log_message(f"\nПредупреждение: Найдены неизвестные классы: {unknown_classes}")
-        log_message("Пожалуйста, добавьте их в словарь CLASSES в скрипте")
-
-    # Генерируем код базы данных
-    log_message("Генерация LUA кода базы данных...")
-    db_code = generate_database_code(database_dict)
-
-    # Генерируем основной файл аддона со встроенной базой
-    log_message("Создание файла аддона...")
-    
-    # Формируем LUA код с правильным экранированием
-    main_code = f'''-- EzInfo Addon
--- Локальные ссылки для оптимизации
-local strlower, format, GetTime, UnitName, UnitIsPlayer, UnitExists = strlower, string.format, GetTime, UnitName, UnitIsPlayer, UnitExists
-local CreateFrame, print, ipairs, pairs, table_sort = CreateFrame, print, ipairs, pairs, table.sort
-
--- Таблицы цветов и рас
-local CLASSES = {{
-    [0] = "ffabd473", -- Охотник - зеленый
-    [1] = "ff8788ee", -- Чернокнижник - фиолетовый
-    [2] = "ffffffff", -- Жрец - белый
-    [3] = "fff58cba", -- Паладин - розовый
-    [4] = "ff3fc7eb", -- Маг - голубой
-    [5] = "fffff569", -- Разбойник - желтый
-    [6] = "ffff7d0a", -- Друид - оранжевый
-    [7] = "ff0070de", -- Шаман - синий
-    [8] = "ffc79c6e", -- Воин - коричневый
-    [9] = "ffc41f3b", -- Рыцарь смерти - красный
-    [10] = "ff00ff00", -- Светло-зеленый (для выделений и гильдий)
-    [11] = "ffff1919", -- Красный (Орда)
-    [12] = "ff3399ff", -- Синий (Альянс)
-    [13] = "ff00bfff"  -- Голубой (основной текст)
-}}
-
-local RACES = {{
-    [0] = "Человек",
-    [1] = "Дворф",
-    [2] = "Ночной эльф",
-    [3] = "Гном",
-    [4] = "Дреней",
-    [5] = "Орк",
-    [6] = "Нежить",
-    [7] = "Таурен",
-    [8] = "Тролль",
-    [9] = "Кровавый эльф"
-}}
-
--- Метаданные базы
-local DB_SOURCE = "{os.path.basename(db_path)}"
-local DB_BUILD_TIME = "{build_time}"
-local DB_TOTAL_CHARS = {total_records}
-local DB_TOTAL_ACCOUNTS = {total_accounts}
-local DB_TOTAL_GUILDS = {total_guilds}
-
--- База данных персонажей (встроенная)
-local DB = {db_code}
-
--- Настройки (автопоиск по умолчанию ВЫКЛЮЧЕН)
-local EzInfo_Config = {{
-    autoTargetMode = false    -- автопоиск для /qq ВЫКЛЮЧЕН по умолчанию
-}}
-
--- Оптимизированные функции
-local function TEXT_COLOR(TEXT, INDEX)
-    return ("|c%s%s|r"):format(CLASSES[INDEX], TEXT)
-end
-
-local function TEXT_CHARACTER(CHARACTER)
-    local name = TEXT_COLOR(CHARACTER[1], CHARACTER[6]) -- Имя цветом класса (индекс 6)
-    local level = TEXT_COLOR("["..CHARACTER[2].."]", 13) -- Уровень голубым
-    local gs = "|c"..CHARACTER[7]..CHARACTER[3].." GS|r" -- GS цветом из базы
-    local raceColor = CHARACTER[4] >= 5 and 11 or 12 -- Цвет фракции для расы
-    local race = TEXT_COLOR(RACES[CHARACTER[4]] or "Неизвестно", raceColor) -- Раса цветом фракции
-    local guild = CHARACTER[5] ~= "" and TEXT_COLOR(" <"..CHARACTER[5]..">", 10) or "" -- Гильдия светло-зеленым
-    print(level.." |Hplayer:"..CHARACTER[1].."|h"..name.."|h "..gs.." "..race..guild)
-end
-
-local function PRINT_ARRAY(CHARACTERS, ACCOUNT)
-    local COUNTER = 0
-    print(TEXT_COLOR("Все персонажи аккаунта: ", 13) .. TEXT_COLOR(ACCOUNT, 10))
-    for i = 1, #CHARACTERS do
-        TEXT_CHARACTER(CHARACTERS[i])
-        COUNTER = COUNTER + 1
-    end
-    print(TEXT_COLOR("Найдено персонажей: ", 13) .. TEXT_COLOR(COUNTER, 10))
-end
-
-local function FIND_CHARACTER_DATA(FIND)
-    local nameLower = strlower(FIND)
-    -- Сначала ищем по имени персонажа
-    for account, characters in pairs(DB) do
-        for i = 1, #characters do
-            local character = characters[i]
-            if character and character[1] and strlower(character[1]) == nameLower then
-                return characters, account
-            end
-        end
-    end
-    -- Если не нашли по имени персонажа, ищем по имени аккаунта
-    for account, characters in pairs(DB) do
-        if strlower(account) == nameLower then
-            return characters, account
-        end
-    end
-    return nil
-end
-
--- Основная функция поиска
-local function FIND_CHARACTER(FIND)
-    local startTime = GetTime()
-    local characters, account = FIND_CHARACTER_DATA(FIND)
-    return characters, account, GetTime() - startTime
-end
-
--- Автопоиск по цели (работает только если включен)
-local function SEARCH_TARGET()
-    if not EzInfo_Config.autoTargetMode then return end
-
-    local targetName = UnitName("target")
-    if not targetName or not UnitIsPlayer("target") then return end
-
-    local characters, account, searchTime = FIND_CHARACTER(targetName)
-    if characters and account then
-        print("|cFFc200c2АВТОПОИСК:|r " .. TEXT_COLOR(targetName, 10))
-        PRINT_ARRAY(characters, account)
-        print(TEXT_COLOR("Автопоиск выполнен за ", 13) .. TEXT_COLOR(format("%.3f", searchTime) .. " сек", 10))
-    else
-        print("|cFFc200c2АВТОПОИСК:|r " .. TEXT_COLOR(targetName, 10) .. TEXT_COLOR(" не найден", 13))
-    end
-end
-
--- Обработчик команд
-SLASH_EZINFO1, SLASH_EZINFO2 = '/qq', '/ezinfo'
-
-SlashCmdList["EZINFO"] = function(MESSAGE)
-    -- Обработка команд автопоиска
-    if MESSAGE == "on" then
-        EzInfo_Config.autoTargetMode = true
-        print(TEXT_COLOR("EzInfo: Автопоиск ", 13) .. TEXT_COLOR("ВКЛЮЧЕН", 10))
-        if UnitExists("target") and UnitIsPlayer("target") then
-            SEARCH_TARGET()
-        end
-        return
-    elseif MESSAGE == "off" then
-        EzInfo_Config.autoTargetMode = false
-        print(TEXT_COLOR("EzInfo: Автопоиск ", 13) .. TEXT_COLOR("ВЫКЛЮЧЕН", 10))
-        return
-    elseif MESSAGE == "status" then
-        local status = EzInfo_Config.autoTargetMode and TEXT_COLOR("ВКЛЮЧЕН", 10) or TEXT_COLOR("ВЫКЛЮЧЕН", 10)
-        print(TEXT_COLOR("EzInfo: Автопоиск: ", 13) .. status)
-        return
-    elseif MESSAGE == "memory" then
-        local memory = collectgarbage("count")
-        print(TEXT_COLOR("Использование памяти LUA: ", 13) .. TEXT_COLOR(format("%.2f MB", memory/1024), 10))
-        return
-    end
-
-    -- Поиск персонажа
-    local FIND = MESSAGE ~= "" and MESSAGE or UnitName("target")
-    if not FIND or FIND == "" then
-        -- Показываем справку и информацию о базе
-        print(TEXT_COLOR("EzInfo", 11))
-        print(TEXT_COLOR("База персонажей", 10))
-        print(TEXT_COLOR("На основе программ от Border, Jyn (janeblower)", 13))
-        print(TEXT_COLOR("Использование: /qq <имя_персонажа>", 10))
-        print(TEXT_COLOR("Или выберите цель и введите /qq", 10))
-        print(TEXT_COLOR("Так же: /qq <имя_аккаунта>", 10))
-        print(TEXT_COLOR("Дополнительные команды:", 10))
-        print(TEXT_COLOR("/qq on - включить автопоиск по цели", 12))
-        print(TEXT_COLOR("/qq off - выключить автопоиск по цели", 12))
-        print(TEXT_COLOR("/qq status - показать статус автопоиска", 12))
-        print(TEXT_COLOR("/qq memory - показать использование памяти", 12))
-        -- Показываем информацию о базе
-        print(TEXT_COLOR("Файл базы: " .. DB_SOURCE .. " от " .. DB_BUILD_TIME, 13))
-        print(TEXT_COLOR("Персонажи: " .. DB_TOTAL_CHARS .. ", Аккаунты: " .. DB_TOTAL_ACCOUNTS .. ", Гильдии: " .. DB_TOTAL_GUILDS, 10))
-        return
-    end
-
-    print(TEXT_COLOR("EzInfo", 10))
-
-    local characters, account, searchTime = FIND_CHARACTER(FIND)
-    print(TEXT_COLOR("Поиск выполнен за ", 13) .. TEXT_COLOR(format("%.3f", searchTime) .. " сек", 10))
-
-    if characters and account then
-        PRINT_ARRAY(characters, account)
-    else
-        print(TEXT_COLOR("Персонаж или аккаунт '", 13)..TEXT_COLOR(FIND, 10)..TEXT_COLOR("' не найден", 13))
-    end
-end
-
--- Обработчик смены цели (автопоиск работает только если включен)
-local frame = CreateFrame("Frame")
-frame:RegisterEvent("PLAYER_TARGET_CHANGED")
-frame:SetScript("OnEvent", SEARCH_TARGET)
-
--- Сообщение о загрузке аддона
-local loadFrame = CreateFrame("Frame")
-loadFrame:RegisterEvent("ADDON_LOADED")
-loadFrame:SetScript("OnEvent", function(self, event, addonName)
-    if addonName == "EzInfo" then
-        print(TEXT_COLOR("EzInfo загружен. ", 13) .. TEXT_COLOR("/qq", 10) .. TEXT_COLOR(" для поиска", 13))
-        print(TEXT_COLOR("Автопоиск по цели: ", 13) ..
-              (EzInfo_Config.autoTargetMode and TEXT_COLOR("ВКЛЮЧЕН", 10) or TEXT_COLOR("ВЫКЛЮЧЕН", 11)))
-        -- Показываем информацию о базе
-        print(TEXT_COLOR("Файл базы: " .. DB_SOURCE .. " от " .. DB_BUILD_TIME, 13))
-        print(TEXT_COLOR("Персонажи: " .. DB_TOTAL_CHARS .. ", Аккаунты: " .. DB_TOTAL_ACCOUNTS .. ", Гильдии: " .. DB_TOTAL_GUILDS, 10))
-    end
-end)
-'''
-
-    # Сохраняем основной файл аддона в текущей директории
-    with open('EzInfo.lua', 'w', encoding='utf-8') as f:
-        f.write(main_code)
-    log_message(f"Файл аддона сохранен как EzInfo.lua")
-    
-    # Копируем файл в папку интерфейса WoW, если путь указан
-    if WoW_InterfaceFolderPath and WoW_InterfaceFolderPath.strip():
-        try:
-            destination_path = os.path.join(WoW_InterfaceFolderPath, 'EzInfo.lua')
-            shutil.copy2('EzInfo.lua', destination_path)
-            log_message(f"Файл аддона скопирован в: {destination_path}")
-        except Exception as e:
-            log_message(f"Ошибка при копировании файла в {WoW_InterfaceFolderPath}: {e}")
-    
-    log_message(f"Генерация аддона завершена!")
-    log_message(f"Статистика базы:")
-    log_message(f"  Персонажи: {total_records}")
-    log_message(f"  Аккаунты: {total_accounts}")
-    log_message(f"  Гильдии: {total_guilds}")
-    
-    if unknown_classes:
-        log_message(f"Предупреждение: Обнаружены неизвестные классы: {unknown_classes}")
-    
-    conn.close()
-
-if __name__ == "__main__":
-    try:
-        setup_logging()
-        generate_addon_with_database()
-    except Exception as e:
-        log_message(f"Произошла ошибка: {e}")
-        import traceback
-        log_message(f"Трассировка ошибки: {traceback.format_exc()}")
-    finally:
-        close_logging()
-
+import hashlib
+import json
+import sqlite3
+import os
+import re
+import shutil
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from functools import partial
+from itertools import repeat
+
+from EzProfiler import PhaseProfiler
+
+# Конфигурационная переменная для пути к папке интерфейса WoW
+WoW_InterfaceFolderPath = "C:\GAMES\Isengard_WotLK_335a\Interface\AddOns\EzInfo"  # Укажите путь, например: "C:\Isengard_WotLK_335a\Interface\AddOns\EzInfo"
+
+# Режим генерации базы в LUA:
+#   "classic" - каждый персонаж отдельной таблицей (как раньше)
+#   "compact" - персонажи аккаунта упакованы в одну строку, гильдии вынесены в общую таблицу,
+#               цвет GS вычисляется в игре. Примерно на 40% меньше памяти LUA
+#   "prerendered" - для каждого персонажа хранится готовая цветная строка чата (со ссылкой |Hplayer:),
+#               вывод аккаунта в игре - только вызовы print. Файл больше, поиск в игре дешевле всего
+CODEGEN_MODE = "classic"
+
+# Базы нескольких миров (ezbase_final_YYMMDD_HHMM_r<номер>.db из DoubleScout с несколькими REALMS):
+#   None - общий аддон из баз всех миров последнего сканирования
+#   номер мира - аддон только из базы этого мира
+REALM = None
+
+# Фильтры сборки: в аддон попадают только подходящие персонажи. Фильтры применяются в SQL запросе,
+# статистика базы в игре (персонажи, аккаунты, гильдии) считается по отфильтрованным персонажам
+FILTER_MIN_LEVEL = 0             # Минимальный уровень (0 - без ограничения)
+FILTER_MIN_GS = 0                # Минимальный GS (0 - без ограничения)
+FILTER_CLASSES = []              # Только эти классы, как в базе (например ["Paladin", "Death Knight"]); пусто - все
+FILTER_GUILDS = []               # Только эти гильдии (регистр учитывается только для латиницы); пусто - все
+FILTER_SCANNED_DAYS = None       # Только персонажи, проверенные (scan_date) не раньше N дней назад; None - все
+FILTER_ONLINE_ONLY = False       # Только персонажи, которые были в сети при сканировании (персонаж или аккаунт)
+FILTER_DROP_NOFORUMNAME = False  # Не включать персонажей без аккаунта (NOFORUMNAME)
+
+# Количество шардов базы. 0 - вся база внутри EzInfo.lua.
+# Больше 0 - база разбивается по первой букве имени на аддоны EzInfo_Data01, EzInfo_Data02, ...
+# (LoadOnDemand), которые загружаются только при первом поиске по их буквам. Их папки
+# нужно положить рядом с папкой EzInfo в Interface\AddOns
+SHARD_COUNT = 0
+
+# Сборка стабильной базы и дельты (при SHARD_COUNT = 0):
+#   False - вся база внутри EzInfo.lua
+#   True - данные выносятся в аддоны EzInfo_Base (база, пересобирается редко) и EzInfo_Delta
+#          (добавленные, измененные и удаленные аккаунты относительно базы, накопительно), которые
+#          загружаются при первом поиске. Обычная сборка переписывает только EzInfo.lua и дельту
+DELTA_BUILD = False
+# Новая база (сжатие дельты в базу) собирается, если дельта затрагивает больше этой доли аккаунтов базы,
+DELTA_COMPACT_RATIO = 0.1
+# если база старше этого числа дней (None - не учитывать) или при запуске с ключом --new-base
+DELTA_COMPACT_DAYS = 7
+
+# Количество процессов для генерации LUA кода аккаунтов. 0 или 1 - в одном процессе.
+# Аккаунты делятся на непрерывные диапазоны по forum_name, результат идентичен однопроцессному
+CODEGEN_WORKERS = 0
+# Минимальное количество аккаунтов, начиная с которого имеет смысл запускать пул процессов
+CODEGEN_PARALLEL_MIN_ACCOUNTS = 20000
+
+# Максимум результатов поиска по началу имени в игре (/qq arth*)
+PREFIX_SEARCH_LIMIT = 15
+
+# Максимум выводимых в чат членов гильдии (/qq g:<название>), счетчики учитывают всех
+GUILD_SEARCH_LIMIT = 50
+
+# Автопоиск по цели (/qq on): размер LRU кэша результатов (включая "не найден"),
+# задержка в секундах, за которую быстрые смены цели схлопываются в один поиск,
+# и окно в секундах, в течение которого недавно показанная цель не выводится повторно
+TARGET_CACHE_SIZE = 64
+TARGET_DEBOUNCE = 0.3
+TARGET_REPEAT_WINDOW = 10
+
+# Глобальная переменная для файла лога
+log_file = None
+
+# Профилировщик (включается ключом --profile)
+profiler = PhaseProfiler('DataInfuser')
+
+def setup_logging():
+    """Настраивает логирование в файл с временной меткой"""
+    global log_file
+    logs_dir = "LOGS"
+    if not os.path.exists(logs_dir):
+        os.makedirs(logs_dir)
+    
+    # Создаем имя файла с текущей датой и временем
+    current_time = datetime.now().strftime("%d.%m.%Y-%H.%M.%S")
+    log_filename = f"DataInfuser_{current_time}.txt"  # Изменено на .txt
+    log_filepath = os.path.join(logs_dir, log_filename)
+    
+    try:
+        # Открываем файл для записи (используем 'a' для добавления, чтобы не потерять данные при ошибках)
+        log_file = open(log_filepath, 'a', encoding='utf-8')
+        
+        # Пишем начальную информацию
+        log_file.write(f"Логирование начато: {log_filepath}\n")
+        log_file.write(f"Время запуска: {datetime.now().strftime('%d.%m.%Y %H:%M:%S')}\n")
+        log_file.write("-" * 50 + "\n")
+        log_file.flush()
+        log_message(f"Лог-файл создан: {log_filepath}")
+    except Exception as e:
+        print(f"Ошибка создания лог-файла: {e}")
+
+def log_message(message):
+    """Записывает сообщение в лог файл и выводит в консоль
+
+    Файл не сбрасывается на диск после каждой строки: буфер дописывается при close_logging
+    (вызывается в finally, поэтому сообщения об ошибках тоже попадают в лог).
+    """
+    global log_file
+    print(message)  # Выводим в консоль
+    if log_file:
+        try:
+            log_file.write(message + "\n")
+        except Exception as e:
+            print(f"Ошибка записи в лог: {e}")
+
+def close_logging():
+    """Закрывает файл лога"""
+    global log_file
+    if log_file:
+        try:
+            log_file.write("-" * 50 + "\n")
+            log_file.write(f"Логирование завершено: {datetime.now().strftime('%d.%m.%Y %H:%M:%S')}\n")
+            log_file.close()
+            print("Лог-файл закрыт")
+        except Exception as e:
+            print(f"Ошибка закрытия лог-файла: {e}")
+        finally:
+            log_file = None
+
+# Таблицы для преобразования классов и рас
+CLASSES = {
+    "Hunter": 0,
+    "Warlock": 1,
+    "Priest": 2,
+    "Paladin": 3,
+    "Mage": 4,
+    "Rogue": 5,
+    "Druid": 6,
+    "Shaman": 7,
+    "Warrior": 8,
+    "Death Knight": 9,
+}
+
+RACES = {
+    "Human": 0,
+    "Dwarf": 1,
+    "Night Elf": 2,
+    "Gnome": 3,
+    "Draenei": 4,
+    "Orc": 5,
+    "Undead": 6,
+    "Tauren": 7,
+    "Troll": 8,
+    "Blood Elf": 9,
+}
+
+# Пороги GS и соответствующие цвета (верхняя граница не включается, None - без ограничения)
+GS_COLORS = [
+    (1000, "FFFAFAFA"),  # белый
+    (2000, "FFA1FA4F"),  # зеленый
+    (3000, "FF5763FB"),  # синий
+    (4000, "FF8A2BE2"),  # фиолетовый
+    (5000, "FFFF8C00"),  # ярко-оранжевый
+    (6000, "FFFF4500"),  # красно-оранжевый
+    (6200, "FFff8484"),  # темно-красный
+    (None, "FFFF1493"),  # глубокий розовый
+]
+
+# Цвета текста и названия рас в игре (совпадают с таблицами CLASSES и RACES шаблона аддона),
+# по ним строки персонажей рендерятся заранее в режиме "prerendered"
+TEXT_COLORS = {
+    0: "ffabd473", 1: "ff8788ee", 2: "ffffffff", 3: "fff58cba", 4: "ff3fc7eb",
+    5: "fffff569", 6: "ffff7d0a", 7: "ff0070de", 8: "ffc79c6e", 9: "ffc41f3b",
+    10: "ff00ff00", 11: "ffff1919", 12: "ff3399ff", 13: "ff00bfff",
+}
+RACE_NAMES = {
+    0: "Человек", 1: "Дворф", 2: "Ночной эльф", 3: "Гном", 4: "Дреней",
+    5: "Орк", 6: "Нежить", 7: "Таурен", 8: "Тролль", 9: "Кровавый эльф",
+}
+
+# Функция для определения цвета GS
+def get_gs_color(gs_value):
+    """Возвращает цветовой код для значения GS"""
+    if not gs_value or gs_value == 0:
+        return GS_COLORS[0][1]  # белый для пустых значений
+    for limit, color in GS_COLORS:
+        if limit is None or gs_value < limit:
+            return color
+
+def escape_lua_string(text):
+    """Экранирует строку для вставки в LUA литерал в двойных кавычках"""
+    if not text:
+        return ""
+    return text.replace('\\', '\\\\').replace('"', '\\"').replace("'", "\\'")
+
+# LUA код получения персонажей аккаунта для классического режима (данные уже в виде таблиц)
+LUA_CLASSIC_DECODE = '''local function ACCOUNT_CHARACTERS(CHARACTERS)
+    return CHARACTERS
+end'''
+
+# Вывод персонажа в чат: строка собирается из полей в игре
+LUA_TEXT_CHARACTER = '''local function TEXT_CHARACTER(CHARACTER, SUFFIX)
+    local name = TEXT_COLOR(CHARACTER[1], CHARACTER[6]) -- Имя цветом класса (индекс 6)
+    local level = TEXT_COLOR("["..CHARACTER[2].."]", 13) -- Уровень голубым
+    local gs = "|c"..CHARACTER[7]..CHARACTER[3].." GS|r" -- GS цветом из базы
+    local raceColor = CHARACTER[4] >= 5 and 11 or 12 -- Цвет фракции для расы
+    local race = TEXT_COLOR(RACES[CHARACTER[4]] or "Неизвестно", raceColor) -- Раса цветом фракции
+    local guild = CHARACTER[5] ~= "" and TEXT_COLOR(" <"..CHARACTER[5]..">", 10) or "" -- Гильдия светло-зеленым
+    print(level.." |Hplayer:"..CHARACTER[1].."|h"..name.."|h "..gs.." "..race..guild..(SUFFIX or ""))
+end'''
+
+# Вывод персонажа в чат для режима "prerendered": строка {"Имя", "готовая строка"} отрендерена при генерации
+LUA_PRERENDERED_TEXT_CHARACTER = '''local function TEXT_CHARACTER(CHARACTER, SUFFIX)
+    if SUFFIX then
+        print(CHARACTER[2]..SUFFIX)
+    else
+        print(CHARACTER[2])
+    end
+end'''
+
+# LUA код распаковки аккаунта для компактного режима
+LUA_COMPACT_DECODE = '''local gmatch, tonumber = string.gmatch, tonumber
+
+local function GS_COLOR(gs)
+    for i = 1, #GS_COLORS do
+        if gs < GS_COLORS[i][1] then
+            return GS_COLORS[i][2]
+        end
+    end
+    return GS_COLORS[#GS_COLORS][2]
+end
+
+-- Распаковка персонажей аккаунта (выполняется только при выводе аккаунта)
+local function ACCOUNT_CHARACTERS(PACKED)
+    local characters = {}
+    for name, level, gs, race, guild, class in gmatch(PACKED, ";([^,]*),(%d+),(%d+),(%d+),(%d+),(%d+)") do
+        gs = tonumber(gs)
+        characters[#characters + 1] = {name, tonumber(level), gs, tonumber(race), GUILDS[tonumber(guild)] or "", tonumber(class), GS_COLOR(gs)}
+    end
+    return characters
+end'''
+
+# LUA код доступа к базе, встроенной в EzInfo.lua
+LUA_MONOLITHIC = '''local function GET_INDEX(KEY)
+    return INDEX
+end
+
+local function GET_ACCOUNT(ACCOUNT)
+    return DB[ACCOUNT]
+end
+
+local function GET_GUILD(KEY)
+    return GUILD_INDEX[KEY]
+end'''
+
+# LUA код загрузки шардов по требованию (аддоны EzInfo_DataNN с LoadOnDemand)
+LUA_SHARDS = '''local LoadAddOn = LoadAddOn
+
+local SHARDS = {}
+
+-- Вызывается из файлов шардов при их загрузке
+function EzInfo_RegisterShard(INDEX, DATA)
+    SHARDS[INDEX] = DATA
+end
+
+-- Возвращает шард, содержащий ключ (первая буква ключа в нижнем регистре), загружая его при первом обращении
+local function GET_SHARD(KEY)
+    local index = SHARD_OF_LETTER[strmatch(KEY, "^[%z\\1-\\127\\192-\\255][\\128-\\191]*") or ""]
+    if not index then
+        return nil
+    end
+    if not SHARDS[index] then
+        LoadAddOn(format(SHARD_ADDON_FORMAT, index))
+    end
+    return SHARDS[index]
+end
+
+local function GET_INDEX(KEY)
+    return GET_SHARD(KEY)
+end
+
+local function GET_ACCOUNT(ACCOUNT)
+    local shard = GET_SHARD(strlower(ACCOUNT))
+    return shard and shard.db[ACCOUNT]
+end
+
+local function GET_GUILD(KEY)
+    local shard = GET_SHARD(KEY)
+    return shard and shard.guilds[KEY]
+end'''
+
+# LUA код поиска по отсортированным массивам имен и аккаунтов (бинарный поиск)
+LUA_LOWER_BOUND = '''-- Первая позиция в отсортированном массиве, где KEYS[i] >= KEY
+local function LOWER_BOUND(KEYS, KEY)
+    local low, high = 1, #KEYS + 1
+    while low < high do
+        local mid = floor((low + high) / 2)
+        if KEYS[mid] < KEY then
+            low = mid + 1
+        else
+            high = mid
+        end
+    end
+    return low
+end'''
+
+LUA_INDEX_LOOKUP = '''local function FIND_CHARACTER_DATA(FIND)
+    local nameLower = strlower(FIND)
+    local index = GET_INDEX(nameLower)
+    if not index then
+        return nil
+    end
+    -- Сначала ищем по имени персонажа, затем по имени аккаунта
+    local account
+    local i = LOWER_BOUND(index.nameKeys, nameLower)
+    if index.nameKeys[i] == nameLower then
+        account = index.nameAccounts[i]
+    else
+        i = LOWER_BOUND(index.accountKeys, nameLower)
+        if index.accountKeys[i] == nameLower then
+            account = index.accountNames[i]
+        end
+    end
+    local value = account and GET_ACCOUNT(account)
+    if not value then
+        return nil
+    end
+    return ACCOUNT_CHARACTERS(value), account
+end
+
+-- Поиск по началу имени: пары {имя, аккаунт} персонажей и список аккаунтов, не более PREFIX_SEARCH_LIMIT каждого
+local function FIND_PREFIX_DATA(PREFIX)
+    local prefix = strlower(PREFIX)
+    local names, accounts = {}, {}
+    local index = GET_INDEX(prefix)
+    if not index then
+        return names, accounts
+    end
+    local length = #prefix
+    local keys = index.nameKeys
+    local i = LOWER_BOUND(keys, prefix)
+    while keys[i] and strsub(keys[i], 1, length) == prefix and #names < PREFIX_SEARCH_LIMIT do
+        names[#names + 1] = {keys[i], index.nameAccounts[i]}
+        i = i + 1
+    end
+    keys = index.accountKeys
+    i = LOWER_BOUND(keys, prefix)
+    while keys[i] and strsub(keys[i], 1, length) == prefix and #accounts < PREFIX_SEARCH_LIMIT do
+        accounts[#accounts + 1] = index.accountNames[i]
+        i = i + 1
+    end
+    return names, accounts
+end
+
+-- Члены гильдии: {"Название", "аккаунт", номер персонажа, ...}, по убыванию GS
+local function FIND_GUILD_DATA(FIND)
+    return GET_GUILD(strlower(FIND))
+end'''
+
+# LUA код загрузки базы и дельты (аддоны EzInfo_Base и EzInfo_Delta с LoadOnDemand)
+LUA_DELTA_ACCESS = '''local LoadAddOn = LoadAddOn
+
+local BASE, DELTA
+
+-- Вызываются из аддонов базы и дельты при их загрузке
+function EzInfo_RegisterBase(DATA)
+    BASE = DATA
+end
+
+function EzInfo_RegisterDelta(DATA)
+    DELTA = DATA
+end
+
+-- Загружает базу при первом обращении и накладывает на нее дельту
+local function LOAD_DATA()
+    if DELTA then
+        return BASE
+    end
+    LoadAddOn(BASE_ADDON)
+    if not BASE then
+        return nil
+    end
+    LoadAddOn(DELTA_ADDON)
+    if DELTA and DELTA.base ~= BASE.id then
+        print(TEXT_COLOR("EzInfo: дельта собрана для другой базы и не применена, обновите " .. BASE_ADDON, 11))
+        DELTA = nil
+    end
+    DELTA = DELTA or {nameKeys = {}, nameAccounts = {}, accountKeys = {}, accountNames = {}, droppedNames = {}, droppedAccounts = {}, guilds = {}, db = {}}
+    -- Удаленные аккаунты и гильдии записаны в дельте как false
+    for account, value in pairs(DELTA.db) do
+        BASE.db[account] = value or nil
+    end
+    for key, entry in pairs(DELTA.guilds) do
+        BASE.guilds[key] = entry or nil
+    end
+    return BASE
+end
+
+local function GET_ACCOUNT(ACCOUNT)
+    local data = LOAD_DATA()
+    return data and data.db[ACCOUNT]
+end'''
+
+# LUA код поиска по индексам базы и дельты: ключи, изменившиеся после сборки базы, ищутся только в дельте
+LUA_DELTA_LOOKUP = '''local function FIND_KEY(KEY, BASE_KEYS, BASE_VALUES, DELTA_KEYS, DELTA_VALUES, DROPPED)
+    local keys, values = BASE_KEYS, BASE_VALUES
+    if DROPPED[KEY] then
+        keys, values = DELTA_KEYS, DELTA_VALUES
+    end
+    local i = LOWER_BOUND(keys, KEY)
+    if keys[i] == KEY then
+        return values[i]
+    end
+end
+
+local function FIND_CHARACTER_DATA(FIND)
+    local nameLower = strlower(FIND)
+    if not LOAD_DATA() then
+        return nil
+    end
+    -- Сначала ищем по имени персонажа, затем по имени аккаунта
+    local account = FIND_KEY(nameLower, BASE.nameKeys, BASE.nameAccounts, DELTA.nameKeys, DELTA.nameAccounts, DELTA.droppedNames)
+        or FIND_KEY(nameLower, BASE.accountKeys, BASE.accountNames, DELTA.accountKeys, DELTA.accountNames, DELTA.droppedAccounts)
+    local value = account and BASE.db[account]
+    if not value then
+        return nil
+    end
+    return ACCOUNT_CHARACTERS(value), account
+end
+
+-- Пары {ключ, значение} с началом PREFIX из базы (кроме измененных ключей) и дельты по порядку ключей, не более PREFIX_SEARCH_LIMIT
+local function COLLECT_PREFIX(PREFIX, BASE_KEYS, BASE_VALUES, DELTA_KEYS, DELTA_VALUES, DROPPED)
+    local result, length = {}, #PREFIX
+    local i, j = LOWER_BOUND(BASE_KEYS, PREFIX), LOWER_BOUND(DELTA_KEYS, PREFIX)
+    while #result < PREFIX_SEARCH_LIMIT do
+        while BASE_KEYS[i] and DROPPED[BASE_KEYS[i]] do
+            i = i + 1
+        end
+        local baseKey, deltaKey = BASE_KEYS[i], DELTA_KEYS[j]
+        if baseKey and strsub(baseKey, 1, length) ~= PREFIX then
+            baseKey = nil
+        end
+        if deltaKey and strsub(deltaKey, 1, length) ~= PREFIX then
+            deltaKey = nil
+        end
+        if not baseKey and not deltaKey then
+            break
+        end
+        if deltaKey and (not baseKey or deltaKey < baseKey) then
+            result[#result + 1] = {deltaKey, DELTA_VALUES[j]}
+            j = j + 1
+        else
+            result[#result + 1] = {baseKey, BASE_VALUES[i]}
+            i = i + 1
+        end
+    end
+    return result
+end
+
+-- Поиск по началу имени: пары {имя, аккаунт} персонажей и список аккаунтов, не более PREFIX_SEARCH_LIMIT каждого
+local function FIND_PREFIX_DATA(PREFIX)
+    local prefix = strlower(PREFIX)
+    if not LOAD_DATA() then
+        return {}, {}
+    end
+    local names = COLLECT_PREFIX(prefix, BASE.nameKeys, BASE.nameAccounts, DELTA.nameKeys, DELTA.nameAccounts, DELTA.droppedNames)
+    local accounts = COLLECT_PREFIX(prefix, BASE.accountKeys, BASE.accountNames, DELTA.accountKeys, DELTA.accountNames, DELTA.droppedAccounts)
+    for i = 1, #accounts do
+        accounts[i] = accounts[i][2]
+    end
+    return names, accounts
+end
+
+-- Члены гильдии: {"Название", "аккаунт", номер персонажа, ...}, по убыванию GS
+local function FIND_GUILD_DATA(FIND)
+    return LOAD_DATA() and BASE.guilds[strlower(FIND)]
+end'''
+
+# Имена аддонов базы и дельты, шаблон их TOC файлов и файл с описанием собранной базы (для вычисления дельты)
+BASE_ADDON = "EzInfo_Base"
+DELTA_ADDON = "EzInfo_Delta"
+DATA_TOC_TEMPLATE = """## Interface: 30300
+## Title: |cFF800080EzInfo|r {title}
+## Notes: {notes}
+## Dependencies: EzInfo
+## LoadOnDemand: 1
+
+{addon_name}.lua
+"""
+BASE_MANIFEST = "EzInfo_Base.json"
+
+# Имя аддона-шарда и шаблон его TOC файла
+SHARD_ADDON_FORMAT = "EzInfo_Data%02d"
+SHARD_TOC_TEMPLATE = """## Interface: 30300
+## Title: |cFF800080EzInfo|r Data {index:02d}
+## Notes: EzInfo database shard (loaded on demand)
+## Dependencies: EzInfo
+## LoadOnDemand: 1
+
+{addon_name}.lua
+"""
+
+def find_database_file():
+    """Находит последний файл базы данных в каталоге BASES или текущем каталоге"""
+    bases_dir = "BASES"
+    # Ищем в каталоге BASES
+    if os.path.exists(bases_dir) and os.path.isdir(bases_dir):
+        db_files = []
+        for file in os.listdir(bases_dir):
+            if file.startswith('ezbase_') and file.endswith('.db'):
+                file_path = os.path.join(bases_dir, file)
+                db_files.append((file_path, os.path.getmtime(file_path)))
+        if db_files:
+            # Сортируем по дате изменения (последний первый)
+            db_files.sort(key=lambda x: x[1], reverse=True)
+            log_message(f"Найдена база в BASES: {os.path.basename(db_files[0][0])}")
+            return db_files[0][0]
+    # Ищем в текущем каталоге
+    for file in os.listdir('.'):
+        if file.startswith('ezbase_') and file.endswith('.db'):
+            log_message(f"Найдена база в текущем каталоге: {file}")
+            return file
+    return None
+
+# Имя финальной базы: метка запуска и необязательный номер мира
+REALM_DB_PATTERN = re.compile(r'^(ezbase_final_\d{6}_\d{4})(?:_r(\d+))?\.db$')
+
+def find_realm_databases(db_path):
+    """Для базы мира - базы всех миров того же сканирования (или только мира REALM), иначе [db_path]"""
+    match = REALM_DB_PATTERN.match(os.path.basename(db_path))
+    if not match or not match.group(2):
+        return [db_path]
+    folder = os.path.dirname(db_path)
+    realm_dbs = []
+    for file in os.listdir(folder or '.'):
+        file_match = REALM_DB_PATTERN.match(file)
+        if file_match and file_match.group(1) == match.group(1) and file_match.group(2):
+            realm = int(file_match.group(2))
+            if REALM is None or realm == REALM:
+                realm_dbs.append((realm, os.path.join(folder, file)))
+    return [path for _, path in sorted(realm_dbs)]
+
+def open_databases(db_paths):
+    """Открывает одну или несколько финальных баз как одну таблицу characters (только чтение)
+
+    Базы подключаются через ATTACH, а временное представление characters объединяет их
+    через UNION ALL, поэтому дальнейшие запросы не зависят от количества миров.
+    """
+    conn = sqlite3.connect(':memory:')
+    selects = []
+    for index, path in enumerate(db_paths):
+        conn.execute(f"ATTACH DATABASE ? AS realm{index}", (path,))
+        selects.append(f"SELECT * FROM realm{index}.characters")
+    conn.execute(f"CREATE TEMP VIEW characters AS {' UNION ALL '.join(selects)}")
+    return conn
+
+def build_filter_conditions():
+    """SQL условия фильтров сборки (FILTER_*), их параметры и описание для лога и аддона"""
+    conditions, params, descriptions = [], [], []
+    if FILTER_MIN_LEVEL:
+        conditions.append("level >= ?")
+        params.append(FILTER_MIN_LEVEL)
+        descriptions.append(f"уровень от {FILTER_MIN_LEVEL}")
+    if FILTER_MIN_GS:
+        conditions.append("gs >= ?")
+        params.append(FILTER_MIN_GS)
+        descriptions.append(f"GS от {FILTER_MIN_GS}")
+    if FILTER_CLASSES:
+        conditions.append(f"class COLLATE NOCASE IN ({', '.join('?' * len(FILTER_CLASSES))})")
+        params.extend(FILTER_CLASSES)
+        descriptions.append(f"классы: {', '.join(FILTER_CLASSES)}")
+    if FILTER_GUILDS:
+        conditions.append(f"guild COLLATE NOCASE IN ({', '.join('?' * len(FILTER_GUILDS))})")
+        params.extend(FILTER_GUILDS)
+        descriptions.append(f"гильдии: {', '.join(FILTER_GUILDS)}")
+    if FILTER_SCANNED_DAYS is not None:
+        conditions.append("scan_date >= ?")
+        params.append((datetime.now() - timedelta(days=FILTER_SCANNED_DAYS)).strftime('%Y-%m-%d %H:%M:%S'))
+        descriptions.append(f"проверены за {FILTER_SCANNED_DAYS} дн.")
+    if FILTER_ONLINE_ONLY:
+        conditions.append("(pers_online OR forum_online)")
+        descriptions.append("были в сети")
+    if FILTER_DROP_NOFORUMNAME:
+        conditions.append("TRIM(COALESCE(forum_name, '')) != ''")
+        descriptions.append("без NOFORUMNAME")
+    return conditions, params, ", ".join(descriptions)
+
+def where_clause(conditions, *extra):
+    """WHERE из условий фильтров и дополнительных условий запроса (пустая строка, если условий нет)"""
+    conditions = list(conditions) + list(extra)
+    return f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+def generate_account_code(chars_list):
+    """Генерирует LUA таблицу персонажей одного аккаунта с разбивкой по строкам"""
+    # Создаем список всех персонажей для этого аккаунта
+    char_lines = []
+    for char_data in chars_list:
+        name, lvl, gs, race, guild, class_num, gs_color = char_data
+        # Экранируем специальные символы в имени и гильдии
+        escaped_name = escape_lua_string(name)
+        escaped_guild = escape_lua_string(guild)
+        char_line = f'{{"{escaped_name}",{lvl},{gs},{race},"{escaped_guild}",{class_num},"{gs_color}"}}'
+        char_lines.append(char_line)
+    # Объединяем персонажей в строки, разбивая если слишком длинные
+    current_line = ""
+    account_parts = []
+    for char_line in char_lines:
+        # Если добавление следующего персонажа превысит 4000 символов, начинаем новую строку
+        if len(current_line) + len(char_line) + 2 > 4000 and current_line:
+            account_parts.append(current_line.rstrip(','))
+            current_line = char_line + ","
+        else:
+            current_line += char_line + ","
+    # Добавляем последнюю часть
+    if current_line:
+        account_parts.append(current_line.rstrip(','))
+    # Формируем окончательный код для аккаунта
+    if len(account_parts) == 1:
+        return f'{{{account_parts[0]}}}'
+    return '{\n    ' + ',\n    '.join(account_parts) + '\n  }'
+
+def text_color(text, index):
+    """Аналог TEXT_COLOR из шаблона аддона"""
+    return f"|c{TEXT_COLORS[index]}{text}|r"
+
+def render_character_line(char_data):
+    """Строка персонажа для чата, побайтно совпадающая с выводом TEXT_CHARACTER в игре"""
+    name, lvl, gs, race, guild, class_num, gs_color = char_data
+    name = name or ""
+    race_text = text_color(RACE_NAMES.get(race, "Неизвестно"), 11 if race >= 5 else 12)
+    guild_text = text_color(f" <{guild}>", 10) if guild else ""
+    return (f"{text_color(f'[{lvl or 0}]', 13)} |Hplayer:{name}|h{text_color(name, class_num)}|h "
+            f"|c{gs_color}{gs} GS|r {race_text}{guild_text}")
+
+def generate_prerendered_account_code(chars_list):
+    """Генерирует LUA таблицу аккаунта из пар {"Имя", "готовая строка чата"}
+
+    Имя нужно для поиска по началу имени, остальные поля в игре не используются.
+    """
+    records = [f'{{"{escape_lua_string(char_data[0])}","{escape_lua_string(render_character_line(char_data))}"}}'
+               for char_data in chars_list]
+    return "{\n    " + ",\n    ".join(records) + "\n  }"
+
+def render_account_chunk(chars_lists, render_account):
+    """Генерирует LUA код для части аккаунтов (выполняется в процессе пула)"""
+    return [render_account(chars_list) for chars_list in chars_lists]
+
+def render_accounts(chars_lists, render_account):
+    """Генерирует LUA код для списка аккаунтов, сохраняя порядок
+
+    При CODEGEN_WORKERS > 1 список делится на непрерывные диапазоны, которые рендерятся
+    в пуле процессов, а результаты склеиваются в исходном порядке.
+    """
+    if CODEGEN_WORKERS <= 1 or len(chars_lists) < CODEGEN_PARALLEL_MIN_ACCOUNTS:
+        return render_account_chunk(chars_lists, render_account)
+    # Несколько диапазонов на процесс, чтобы выровнять нагрузку при неравных аккаунтах
+    chunk_size = -(-len(chars_lists) // (CODEGEN_WORKERS * 4))
+    chunks = [chars_lists[i:i + chunk_size] for i in range(0, len(chars_lists), chunk_size)]
+    with ProcessPoolExecutor(max_workers=CODEGEN_WORKERS) as pool:
+        results = pool.map(render_account_chunk, chunks, repeat(render_account))
+        return [code for chunk_codes in results for code in chunk_codes]
+
+def generate_database_code(database_dict, render_account=generate_account_code):
+    """Генерирует LUA код базы данных с разбивкой по строкам"""
+    lines = []
+    lines.append("{")
+    # Сортируем по forum_name для сохранения алфавитного порядка
+    sorted_items = sorted(database_dict.items(), key=lambda x: x[0])
+    account_codes = render_accounts([chars_list for _, chars_list in sorted_items], render_account)
+    account_lines = []
+    for (forum_name, _), account_code in zip(sorted_items, account_codes):
+        # Экранируем специальные символы в forum_name
+        escaped_forum_name = escape_lua_string(forum_name)
+        account_lines.append(f'["{escaped_forum_name}"] = {account_code}')
+    # Объединяем все аккаунты с переносами строк
+    lines.append(',\n  '.join(account_lines))
+    lines.append("}")
+    return '\n'.join(lines)
+
+def build_guild_table(database_dict, base_guilds=()):
+    """Интернирует гильдии: возвращает LUA таблицу гильдий и словарь гильдия -> индекс
+
+    Самые частые гильдии получают самые короткие индексы, 0 - без гильдии. base_guilds - порядок
+    гильдий стабильной базы: их индексы сохраняются, новые гильдии добавляются в конец.
+    """
+    guild_counts = {}
+    for chars_list in database_dict.values():
+        for char_data in chars_list:
+            guild = char_data[4]
+            if guild:
+                guild_counts[guild] = guild_counts.get(guild, 0) + 1
+    known = set(base_guilds)
+    guilds = list(base_guilds) + sorted((g for g in guild_counts if g not in known), key=lambda g: (-guild_counts[g], g))
+    guild_index = {guild: i + 1 for i, guild in enumerate(guilds)}
+    guild_lines = []
+    for i in range(0, len(guilds), 20):
+        guild_lines.append(",".join(f'"{escape_lua_string(g)}"' for g in guilds[i:i + 20]))
+    guilds_code = "{\n  " + ",\n  ".join(guild_lines) + "\n}" if guild_lines else "{}"
+    return guilds_code, guild_index
+
+def generate_compact_account_code(chars_list, guild_index):
+    """Генерирует упакованную строку персонажей одного аккаунта"""
+    records = []
+    for char_data in chars_list:
+        name, lvl, gs, race, guild, class_num, gs_color = char_data
+        # Имена персонажей WoW не содержат разделителей "," и ";"
+        records.append(f";{escape_lua_string(name)},{lvl or 0},{gs},{race},{guild_index.get(guild, 0)},{class_num}")
+    return f'"{"".join(records)}"'
+
+def generate_compact_database_code(database_dict, render_account):
+    """Генерирует компактный LUA код базы: упакованные строки аккаунтов
+
+    Каждый персонаж хранится как ";Имя,уровень,GS,раса,индекс_гильдии,класс" внутри одной
+    строки аккаунта. Гильдии интернированы в общую таблицу (см. build_guild_table), цвет GS
+    не хранится и вычисляется в игре по значению GS.
+    """
+    sorted_items = sorted(database_dict.items(), key=lambda x: x[0])
+    account_codes = render_accounts([chars_list for _, chars_list in sorted_items], render_account)
+    account_lines = []
+    for (forum_name, _), account_code in zip(sorted_items, account_codes):
+        account_lines.append(f'["{escape_lua_string(forum_name)}"] = {account_code}')
+    return "{\n  " + ",\n  ".join(account_lines) + "\n}"
+
+def generate_gs_colors_code():
+    """Генерирует LUA таблицу порогов GS для вычисления цвета в игре"""
+    entries = []
+    for limit, color in GS_COLORS:
+        if limit is None:
+            entries.append(f'{{math.huge, "{color}"}}')
+        else:
+            entries.append(f'{{{limit}, "{color}"}}')
+    return "{" + ", ".join(entries) + "}"
+
+def lua_lower(text):
+    """Переводит в нижний регистр так же, как strlower в клиенте WoW (только латиница)"""
+    return ''.join(ch.lower() if 'A' <= ch <= 'Z' else ch for ch in text)
+
+def shard_letter(key):
+    """Первая буква ключа в нижнем регистре - по ней выбирается шард"""
+    return lua_lower(key[:1]) if key else ""
+
+def build_search_index(database_dict):
+    """Возвращает отсортированные пары (ключ в нижнем регистре, аккаунт) для имен персонажей и аккаунтов
+
+    Порядок сортировки совпадает со сравнением строк в LUA (побайтно UTF-8).
+    """
+    name_pairs = sorted(
+        (lua_lower(char_data[0]), forum_name)
+        for forum_name, chars_list in database_dict.items()
+        for char_data in chars_list
+        if char_data[0]
+    )
+    account_pairs = sorted((lua_lower(forum_name), forum_name) for forum_name in database_dict)
+    return name_pairs, account_pairs
+
+def generate_lua_array(values):
+    """Генерирует LUA массив строк, по 20 значений в строке"""
+    lines = []
+    for i in range(0, len(values), 20):
+        lines.append(",".join(f'"{escape_lua_string(v)}"' for v in values[i:i + 20]))
+    return "{\n  " + ",\n  ".join(lines) + "\n}" if lines else "{}"
+
+def generate_index_fields(name_pairs, account_pairs):
+    """Генерирует поля LUA таблицы индекса: отсортированные ключи и параллельные массивы аккаунтов"""
+    return [
+        f"nameKeys = {generate_lua_array([key for key, _ in name_pairs])}",
+        f"nameAccounts = {generate_lua_array([account for _, account in name_pairs])}",
+        f"accountKeys = {generate_lua_array([key for key, _ in account_pairs])}",
+        f"accountNames = {generate_lua_array([account for _, account in account_pairs])}",
+    ]
+
+def build_guild_index(database_dict):
+    """Строит обратный индекс гильдий: ключ в нижнем регистре -> (название, [(аккаунт, номер персонажа)])
+
+    Номер персонажа - позиция (с 1) в списке аккаунта, члены гильдии упорядочены по убыванию GS.
+    """
+    members = {}
+    for forum_name, chars_list in database_dict.items():
+        for position, char_data in enumerate(chars_list, start=1):
+            guild = char_data[4]
+            if not guild:
+                continue
+            key = lua_lower(guild)
+            if key not in members:
+                members[key] = (guild, [])
+            members[key][1].append((char_data[2], char_data[0] or "", forum_name, position))
+    guild_index = {}
+    for key, (guild, guild_members) in members.items():
+        guild_members.sort(key=lambda m: (-m[0], m[1]))
+        guild_index[key] = (guild, [(forum_name, position) for _, _, forum_name, position in guild_members])
+    return guild_index
+
+def generate_guild_entry_code(guild, guild_members):
+    """Генерирует LUA таблицу одной гильдии: {"Название", "аккаунт", номер, "аккаунт", номер, ...}"""
+    values = [f'"{escape_lua_string(guild)}"']
+    for forum_name, position in guild_members:
+        values.append(f'"{escape_lua_string(forum_name)}",{position}')
+    return f'{{{",".join(values)}}}'
+
+def generate_guild_index_code(guild_index):
+    """Генерирует LUA таблицу индекса гильдий: ключ -> {"Название", "аккаунт", номер, "аккаунт", номер, ...}"""
+    lines = []
+    for key in sorted(guild_index):
+        lines.append(f'["{escape_lua_string(key)}"] = {generate_guild_entry_code(*guild_index[key])}')
+    return "{\n  " + ",\n  ".join(lines) + "\n}" if lines else "{}"
+
+def assign_shards(database_dict, shard_count):
+    """Распределяет первые буквы имен, аккаунтов и гильдий по шардам примерно поровну
+
+    Буквы идут в алфавитном порядке, каждый шард получает непрерывный диапазон букв.
+    """
+    letter_counts = {}
+    for forum_name, chars_list in database_dict.items():
+        letter = shard_letter(forum_name)
+        letter_counts[letter] = letter_counts.get(letter, 0) + len(chars_list)
+        for char_data in chars_list:
+            letter = shard_letter(char_data[0] or "")
+            letter_counts[letter] = letter_counts.get(letter, 0) + 1
+            if char_data[4]:
+                letter = shard_letter(char_data[4])
+                letter_counts[letter] = letter_counts.get(letter, 0) + 1
+    total = sum(letter_counts.values())
+    target = total / shard_count if shard_count else total
+    shard_of_letter = {}
+    index, filled = 1, 0
+    for letter in sorted(letter_counts):
+        if filled >= target and index < shard_count:
+            index, filled = index + 1, 0
+        shard_of_letter[letter] = index
+        filled += letter_counts[letter]
+    return shard_of_letter
+
+def generate_sharded_database(database_dict, shard_count, render_account):
+    """Генерирует LUA код карты шардов и код каждого шарда
+
+    Шард содержит отсортированный индекс имен персонажей и аккаунтов, чья первая буква
+    ему назначена, индекс гильдий и данные аккаунтов с такой первой буквой. Поэтому все совпадения
+    с любым префиксом находятся в одном шарде.
+    """
+    shard_of_letter = assign_shards(database_dict, shard_count)
+    shards = [{'names': [], 'accounts': [], 'guilds': {}, 'db': []} for _ in range(max(shard_of_letter.values(), default=0))]
+    name_pairs, account_pairs = build_search_index(database_dict)
+    for key, forum_name in name_pairs:
+        shards[shard_of_letter[shard_letter(key)] - 1]['names'].append((key, forum_name))
+    account_codes = render_accounts([database_dict[forum_name] for _, forum_name in account_pairs], render_account)
+    for (key, forum_name), account_code in zip(account_pairs, account_codes):
+        shard = shards[shard_of_letter[shard_letter(key)] - 1]
+        shard['accounts'].append((key, forum_name))
+        shard['db'].append(f'["{escape_lua_string(forum_name)}"] = {account_code}')
+    for key, entry in build_guild_index(database_dict).items():
+        shards[shard_of_letter[shard_letter(key)] - 1]['guilds'][key] = entry
+
+    shard_map_code = "{" + ", ".join(f'["{escape_lua_string(letter)}"]={index}'
+                                     for letter, index in sorted(shard_of_letter.items())) + "}"
+    shard_codes = []
+    for index, shard in enumerate(shards, start=1):
+        fields = generate_index_fields(shard['names'], shard['accounts'])
+        fields.append(f"guilds = {generate_guild_index_code(shard['guilds'])}")
+        fields.append("db = {\n  " + ",\n  ".join(shard['db']) + "\n}")
+        shard_codes.append(
+            f"-- EzInfo: шард базы данных {index}\n"
+            f"EzInfo_RegisterShard({index}, {{\n"
+            + ",\n".join(fields) +
+            "\n})\n"
+        )
+    return shard_map_code, shard_codes
+
+def prepare_codegen(database_dict, base_guilds=()):
+    """Общий для всех способов размещения базы код режима CODEGEN_MODE
+
+    Возвращает (LUA код таблиц режима, код ACCOUNT_CHARACTERS, функция рендера аккаунта,
+    код TEXT_CHARACTER, порядок гильдий компактного режима). base_guilds - см. build_guild_table.
+    """
+    if CODEGEN_MODE == "compact":
+        guilds_code, guild_index = build_guild_table(database_dict, base_guilds)
+        data_code = (
+            "-- Таблица гильдий (индекс 0 - без гильдии)\n"
+            f"local GUILDS = {guilds_code}\n\n"
+            "-- Пороги GS для вычисления цвета в игре\n"
+            f"local GS_COLORS = {generate_gs_colors_code()}\n\n"
+        )
+        render_account = partial(generate_compact_account_code, guild_index=guild_index)
+        return data_code, LUA_COMPACT_DECODE, render_account, LUA_TEXT_CHARACTER, list(guild_index)
+    if CODEGEN_MODE == "prerendered":
+        return "", LUA_CLASSIC_DECODE, generate_prerendered_account_code, LUA_PRERENDERED_TEXT_CHARACTER, []
+    return "", LUA_CLASSIC_DECODE, generate_account_code, LUA_TEXT_CHARACTER, []
+
+def code_hash(code):
+    """Короткий хэш LUA кода аккаунта или гильдии для сравнения с базой"""
+    return hashlib.blake2b(code.encode('utf-8'), digest_size=8).hexdigest()
+
+def generate_lua_set(keys):
+    """Генерирует LUA таблицу-множество {["ключ"]=true, ...}"""
+    entries = [f'["{escape_lua_string(key)}"]=true' for key in sorted(keys)]
+    lines = [",".join(entries[i:i + 20]) for i in range(0, len(entries), 20)]
+    return "{\n  " + ",\n  ".join(lines) + "\n}" if lines else "{}"
+
+def generate_lua_overlay(entries):
+    """Генерирует LUA таблицу изменений {["ключ"] = код или false (удален), ...}"""
+    lines = [f'["{escape_lua_string(key)}"] = {"false" if code is None else code}' for key, code in sorted(entries.items())]
+    return "{\n  " + ",\n  ".join(lines) + "\n}" if lines else "{}"
+
+def load_base_manifest(output_dir, new_base=False):
+    """Описание стабильной базы из output_dir, если дельту можно строить относительно нее, иначе None"""
+    manifest_path = os.path.join(output_dir, BASE_MANIFEST)
+    if new_base:
+        log_message("Новая база: запрошена явно")
+        return None
+    if not os.path.exists(manifest_path) or not os.path.exists(os.path.join(output_dir, BASE_ADDON, f'{BASE_ADDON}.lua')):
+        log_message("Новая база: предыдущая база не найдена")
+        return None
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError) as e:
+        log_message(f"Новая база: описание базы не читается ({e})")
+        return None
+    if manifest.get('codegen_mode') != CODEGEN_MODE:
+        log_message(f"Новая база: база собрана в режиме {manifest.get('codegen_mode')}")
+        return None
+    age_days = (datetime.now() - datetime.fromisoformat(manifest['created'])).total_seconds() / 86400
+    if DELTA_COMPACT_DAYS is not None and age_days > DELTA_COMPACT_DAYS:
+        log_message(f"Новая база: база старше {DELTA_COMPACT_DAYS} дн. ({age_days:.1f})")
+        return None
+    return manifest
+
+def build_delta(manifest, account_codes, name_pairs, account_pairs, guild_codes):
+    """Изменения относительно базы: аккаунты и гильдии (None - удалены) и ключи индекса, изменившиеся после базы
+
+    Для измененного ключа дельта содержит все его текущие пары, поэтому в игре он ищется только в дельте.
+    """
+    base_accounts, base_guilds = manifest['accounts'], manifest['guilds']
+    db = {account: code for account, code in account_codes.items() if base_accounts.get(account) != code_hash(code)}
+    db.update((account, None) for account in base_accounts if account not in account_codes)
+    guilds = {key: code for key, code in guild_codes.items() if base_guilds.get(key) != code_hash(code)}
+    guilds.update((key, None) for key in base_guilds if key not in guild_codes)
+    base_names = {tuple(pair) for pair in manifest['names']}
+    dropped_names = {key for key, _ in base_names.symmetric_difference(name_pairs)}
+    base_account_pairs = {(lua_lower(account), account) for account in base_accounts}
+    dropped_accounts = {key for key, _ in base_account_pairs.symmetric_difference(account_pairs)}
+    return {
+        'db': db,
+        'guilds': guilds,
+        'names': [pair for pair in name_pairs if pair[0] in dropped_names],
+        'dropped_names': dropped_names,
+        'accounts': [pair for pair in account_pairs if pair[0] in dropped_accounts],
+        'dropped_accounts': dropped_accounts,
+    }
+
+def generate_delta_database(database_dict, output_dir, new_base=False):
+    """Генерирует данные для аддонов стабильной базы и дельты
+
+    Дельта строится относительно базы, описанной в output_dir (BASE_MANIFEST). Если базы нет или
+    она устарела (см. load_base_manifest, DELTA_COMPACT_RATIO), собирается новая база и пустая дельта.
+    Возвращает (результат prepare_codegen, [(аддон, TOC, LUA код)] для записи, описание новой базы или None).
+    """
+    manifest = load_base_manifest(output_dir, new_base)
+    while True:
+        codegen = prepare_codegen(database_dict, manifest['guild_order'] if manifest else ())
+        sorted_accounts = sorted(database_dict)
+        account_codes = dict(zip(sorted_accounts, render_accounts([database_dict[a] for a in sorted_accounts], codegen[2])))
+        guild_index = build_guild_index(database_dict)
+        guild_codes = {key: generate_guild_entry_code(*entry) for key, entry in guild_index.items()}
+        name_pairs, account_pairs = build_search_index(database_dict)
+        if manifest is None:
+            break
+        delta = build_delta(manifest, account_codes, name_pairs, account_pairs, guild_codes)
+        if len(delta['db']) <= DELTA_COMPACT_RATIO * max(len(manifest['accounts']), 1):
+            break
+        log_message(f"Новая база: дельта затрагивает {len(delta['db'])} из {len(manifest['accounts'])} аккаунтов базы")
+        manifest = None
+
+    addons = []
+    new_manifest = None
+    if manifest is None:
+        fields = generate_index_fields(name_pairs, account_pairs)
+        fields.append(f"guilds = {generate_guild_index_code(guild_index)}")
+        fields.append("db = {\n  " + ",\n  ".join(f'["{escape_lua_string(account)}"] = {code}'
+                                                     for account, code in account_codes.items()) + "\n}")
+        # Id базы - время сборки и хеш ее содержимого: две разные базы, собранные в одну секунду, не совпадут
+        now = datetime.now()
+        new_manifest = {
+            'id': f"{now.strftime('%Y%m%d%H%M%S')}_{code_hash(','.join(fields))}",
+            'created': now.isoformat(timespec='seconds'),
+            'codegen_mode': CODEGEN_MODE,
+            'guild_order': codegen[4],
+            'accounts': {account: code_hash(code) for account, code in account_codes.items()},
+            'guilds': {key: code_hash(code) for key, code in guild_codes.items()},
+            'names': name_pairs,
+        }
+        addons.append((BASE_ADDON, DATA_TOC_TEMPLATE.format(title="Base", notes="EzInfo stable database (loaded on demand)", addon_name=BASE_ADDON),
+                       f"-- EzInfo: стабильная база данных {new_manifest['id']}\n"
+                       f'EzInfo_RegisterBase({{\nid = "{new_manifest["id"]}",\n' + ",\n".join(fields) + "\n})\n"))
+        base_id = new_manifest['id']
+        delta = {'db': {}, 'guilds': {}, 'names': [], 'dropped_names': set(), 'accounts': [], 'dropped_accounts': set()}
+    else:
+        base_id = manifest['id']
+    log_message(f"Дельта к базе {base_id}: аккаунтов {len(delta['db'])}, гильдий {len(delta['guilds'])}, "
+                f"ключей имен {len(delta['dropped_names'])}, ключей аккаунтов {len(delta['dropped_accounts'])}")
+    fields = generate_index_fields(delta['names'], delta['accounts'])
+    fields.append(f"droppedNames = {generate_lua_set(delta['dropped_names'])}")
+    fields.append(f"droppedAccounts = {generate_lua_set(delta['dropped_accounts'])}")
+    fields.append(f"guilds = {generate_lua_overlay(delta['guilds'])}")
+    fields.append(f"db = {generate_lua_overlay(delta['db'])}")
+    addons.append((DELTA_ADDON, DATA_TOC_TEMPLATE.format(title="Delta", notes="EzInfo changes since the stable database (loaded on demand)", addon_name=DELTA_ADDON),
+                   f"-- EzInfo: изменения относительно базы {base_id}\n"
+                   f'EzInfo_RegisterDelta({{\nbase = "{base_id}",\n' + ",\n".join(fields) + "\n})\n"))
+    return codegen, addons, new_manifest
+
+def remove_stale_data_addons(folder, current):
+    """Удаляет из folder папки аддонов данных (шарды, база, дельта), не входящие в текущую сборку current"""
+    removed = []
+    for entry in os.listdir(folder):
+        if entry in current or not (entry.startswith('EzInfo_Data') or entry in (BASE_ADDON, DELTA_ADDON)):
+            continue
+        if os.path.isdir(os.path.join(folder, entry)):
+            shutil.rmtree(os.path.join(folder, entry))
+            removed.append(entry)
+    # Описание базы без самой базы дало бы дельту к несуществующей базе
+    if BASE_ADDON in removed and os.path.exists(os.path.join(folder, BASE_MANIFEST)):
+        os.remove(os.path.join(folder, BASE_MANIFEST))
+    return removed
+
+def generate_addon_with_database(db_path=None, output_dir='.', install=True, new_base=False):
+    """Основная функция генерации аддона
+
+    db_path - файл базы или список баз нескольких миров (по умолчанию ищется последняя в BASES,
+    для баз миров - вместе с базами остальных миров того же сканирования), output_dir - папка для
+    EzInfo.lua и шардов, install - копировать ли результат в WoW_InterfaceFolderPath,
+    new_base - при DELTA_BUILD собрать новую стабильную базу вместо дельты.
+    Возвращает путь к сгенерированному EzInfo.lua или None при ошибке.
+    """
+    log_message("Запуск генерации аддона...")
+    # Находим базу данных автоматически, если она не передана явно
+    profiler.switch_phase('find_database')
+    if not db_path:
+        db_path = find_database_file()
+        db_paths = find_realm_databases(db_path) if db_path else []
+    else:
+        db_paths = list(db_path) if isinstance(db_path, (list, tuple)) else [db_path]
+    if not db_paths:
+        log_message("Ошибка: Файл базы данных не найден!")
+        log_message("Убедитесь, что файл с именем ezbase_*.db находится в папке BASES или в текущей папке.")
+        return None
+    log_message(f"Используется база данных: {', '.join(db_paths)}")
+    db_source = ", ".join(os.path.basename(path) for path in db_paths)
+    # Получаем дату изменения файла как дату сборки (для нескольких миров - самой свежей базы)
+    build_time = datetime.fromtimestamp(max(os.path.getmtime(path) for path in db_paths)).strftime('%d.%m.%Y %H:%M')
+    profiler.switch_phase('query')
+    conn = open_databases(db_paths)
+    cursor = conn.cursor()
+    filter_conditions, filter_params, filter_description = build_filter_conditions()
+    # Получаем общее количество записей
+    cursor.execute("SELECT COUNT(*) FROM characters")
+    total_records = cursor.fetchone()[0]
+    log_message(f"Всего записей в базе: {total_records}")
+    if filter_conditions:
+        cursor.execute(f"SELECT COUNT(*) FROM characters {where_clause(filter_conditions)}", filter_params)
+        filtered_records = cursor.fetchone()[0]
+        log_message(f"Фильтры сборки ({filter_description}): в аддон попадет {filtered_records} из {total_records} записей")
+        total_records = filtered_records
+
+    # Получаем количество уникальных аккаунтов и гильдий
+    cursor.execute("SELECT COUNT(DISTINCT forum_name) FROM characters " + where_clause(filter_conditions, "forum_name != ''"), filter_params)
+    total_accounts = cursor.fetchone()[0]
+    cursor.execute("SELECT COUNT(DISTINCT guild) FROM characters " + where_clause(filter_conditions, "guild != ''"), filter_params)
+    total_guilds = cursor.fetchone()[0]
+    log_message(f"Уникальных аккаунтов: {total_accounts}")
+    log_message(f"Уникальных гильдий: {total_guilds}")
+
+    # Получаем все записи, группируем по аккаунту и сортируем по GS внутри каждого аккаунта
+    cursor.execute(f"""
+        SELECT forum_name, name, level, gs, class, guild, race
+        FROM characters
+        {where_clause(filter_conditions)}
+        ORDER BY forum_name, gs DESC
+    """, filter_params)
+    rows = cursor.fetchall()
+
+    # Создаем словарь для хранения данных
+    profiler.switch_phase('transform_rows')
+    database_dict = {}
+    unknown_classes = set()  # Для отслеживания неизвестных классов
+    for row in rows:
+        forum_name, name, level, gs, class_str, guild, race_str = row
+        # Обрабатываем пустой forum_name
+        if not forum_name or forum_name.strip() == "":
+            forum_name = "NOFORUMNAME"
+        # Преобразуем class из строки в число
+        class_num = CLASSES.get(class_str, 0)
+        # Если класс не найден, попробуем найти игнорируя регистр
+        if class_num == 0 and class_str:
+            for class_key, class_id in CLASSES.items():
+                if class_str.lower() == class_key.lower():
+                    class_num = class_id
+                    break
+        # Если все еще не нашли, добавляем в список неизвестных
+        if class_num == 0 and class_str:
+            unknown_classes.add(class_str)
+            # log_message(f"Предупреждение: Неизвестный класс '{class_str}' для персонажа '{name}'")
+        # Преобразуем race из строки в число
+        race_num = RACES.get(race_str, 0)
+        # Если раса не найдена, попробуем найти по ключу в нижнем регистре
+        if race_num == 0 and race_str:
+            for race_key, race_id in RACES.items():
+                if race_str.lower() == race_key.lower():
+                    race_num = race_id
+                    break
+        # Определяем цвет GS
+        gs_color = get_gs_color(gs)
+
+        # Создаем запись персонажа: [name, level, gs, race, guild, class, gs_color]
+        char_data = [name, level, int(gs) if gs else 0, race_num, guild, class_num, gs_color]
+        # Добавляем персонажа в соответствующую группу forum_name
+        if forum_name not in database_dict:
+            database_dict[forum_name] = []
+        database_dict[forum_name].append(char_data)
+
+    # Выводим статистику по неизвестным классам
+    if unknown_classes:
+        log_message(f"\nПредупреждение: Найдены неизвестные классы: {unknown_classes}")
+        log_message("Пожалуйста, добавьте их в словарь CLASSES в скрипте")
+
+    # Генерируем код базы данных
+    profiler.switch_phase('generate_database_code')
+    log_message(f"Генерация LUA кода базы данных (режим {CODEGEN_MODE})...")
+    # Аддоны с данными: (имя, TOC, LUA код); new_manifest - описание новой стабильной базы
+    data_addons = []
+    new_manifest = None
+    index_lookup_code = LUA_INDEX_LOOKUP
+    if DELTA_BUILD and SHARD_COUNT == 0:
+        codegen, data_addons, new_manifest = generate_delta_database(database_dict, output_dir, new_base)
+        data_code, decode_code, render_account, text_character_code, _ = codegen
+    else:
+        if DELTA_BUILD:
+            log_message("Сборка базы и дельты не поддерживается вместе с шардами (SHARD_COUNT > 0), собираются шарды")
+        data_code, decode_code, render_account, text_character_code, _ = prepare_codegen(database_dict)
+
+    if SHARD_COUNT > 0:
+        shard_map_code, shard_codes = generate_sharded_database(database_dict, SHARD_COUNT, render_account)
+        log_message(f"База разбита на {len(shard_codes)} шардов")
+        data_code += (
+            "-- Карта шардов: первая буква имени/аккаунта -> номер аддона-шарда, загружаемого по требованию\n"
+            f'local SHARD_ADDON_FORMAT = "{SHARD_ADDON_FORMAT}"\n'
+            f"local SHARD_OF_LETTER = {shard_map_code}"
+        )
+        access_code = LUA_SHARDS
+        for index, shard_code in enumerate(shard_codes, start=1):
+            addon_name = SHARD_ADDON_FORMAT % index
+            data_addons.append((addon_name, SHARD_TOC_TEMPLATE.format(index=index, addon_name=addon_name), shard_code))
+    elif DELTA_BUILD:
+        data_code += (
+            "-- База и дельта в аддонах, загружаемых при первом поиске\n"
+            f'local BASE_ADDON, DELTA_ADDON = "{BASE_ADDON}", "{DELTA_ADDON}"'
+        )
+        access_code = LUA_DELTA_ACCESS
+        index_lookup_code = LUA_DELTA_LOOKUP
+    else:
+        if CODEGEN_MODE == "compact":
+            db_code = generate_compact_database_code(database_dict, render_account)
+            data_code += "-- База данных персонажей (упакованная): \";Имя,уровень,GS,раса,гильдия,класс\" подряд\n"
+        elif CODEGEN_MODE == "prerendered":
+            db_code = generate_database_code(database_dict, render_account)
+            data_code += "-- База данных персонажей (встроенная): {\"Имя\", \"готовая строка чата\"}\n"
+        else:
+            db_code = generate_database_code(database_dict)
+            data_code += "-- База данных персонажей (встроенная)\n"
+        name_pairs, account_pairs = build_search_index(database_dict)
+        data_code += (
+            f"local DB = {db_code}\n\n"
+            "-- Отсортированные имена персонажей и аккаунтов в нижнем регистре для бинарного поиска\n"
+            "local INDEX = {\n" + ",\n".join(generate_index_fields(name_pairs, account_pairs)) + "\n}\n\n"
+            "-- Обратный индекс гильдий: гильдия в нижнем регистре -> {\"Название\", \"аккаунт\", номер персонажа, ...} по убыванию GS\n"
+            f"local GUILD_INDEX = {generate_guild_index_code(build_guild_index(database_dict))}"
+        )
+        access_code = LUA_MONOLITHIC
+    lookup_code = "\n\n".join([decode_code, access_code, LUA_LOWER_BOUND, index_lookup_code])
+
+    # Генерируем основной файл аддона со встроенной базой
+    log_message("Создание файла аддона...")
+    profiler.switch_phase('render_template')
+    
+    # Формируем LUA код с правильным экранированием
+    main_code = f'''-- EzInfo Addon
+-- Локальные ссылки для оптимизации
+local strlower, format, GetTime, UnitName, UnitIsPlayer, UnitExists = strlower, string.format, GetTime, UnitName, UnitIsPlayer, UnitExists
+local CreateFrame, print, ipairs, pairs, table_sort = CreateFrame, print, ipairs, pairs, table.sort
+local strsub, strmatch, floor = strsub, strmatch, math.floor
+
+-- Таблицы цветов и рас
+local CLASSES = {{
+    [0] = "ffabd473", -- Охотник - зеленый
+    [1] = "ff8788ee", -- Чернокнижник - фиолетовый
+    [2] = "ffffffff", -- Жрец - белый
+    [3] = "fff58cba", -- Паладин - розовый
+    [4] = "ff3fc7eb", -- Маг - голубой
+    [5] = "fffff569", -- Разбойник - желтый
+    [6] = "ffff7d0a", -- Друид - оранжевый
+    [7] = "ff0070de", -- Шаман - синий
+    [8] = "ffc79c6e", -- Воин - коричневый
+    [9] = "ffc41f3b", -- Рыцарь смерти - красный
+    [10] = "ff00ff00", -- Светло-зеленый (для выделений и гильдий)
+    [11] = "ffff1919", -- Красный (Орда)
+    [12] = "ff3399ff", -- Синий (Альянс)
+    [13] = "ff00bfff"  -- Голубой (основной текст)
+}}
+
+local RACES = {{
+    [0] = "Человек",
+    [1] = "Дворф",
+    [2] = "Ночной эльф",
+    [3] = "Гном",
+    [4] = "Дреней",
+    [5] = "Орк",
+    [6] = "Нежить",
+    [7] = "Таурен",
+    [8] = "Тролль",
+    [9] = "Кровавый эльф"
+}}
+
+-- Метаданные базы
+local DB_SOURCE = "{escape_lua_string(db_source)}"
+local DB_BUILD_TIME = "{build_time}"
+local DB_TOTAL_CHARS = {total_records}
+local DB_TOTAL_ACCOUNTS = {total_accounts}
+local DB_TOTAL_GUILDS = {total_guilds}
+local DB_FILTERS = "{escape_lua_string(filter_description)}"
+
+{data_code}
+
+-- Настройки (автопоиск по умолчанию ВЫКЛЮЧЕН)
+local EzInfo_Config = {{
+    autoTargetMode = false    -- автопоиск для /qq ВЫКЛЮЧЕН по умолчанию
+}}
+
+-- Максимум результатов поиска по началу имени (/qq arth*)
+local PREFIX_SEARCH_LIMIT = {PREFIX_SEARCH_LIMIT}
+-- Максимум выводимых членов гильдии (/qq g:<название>)
+local GUILD_SEARCH_LIMIT = {GUILD_SEARCH_LIMIT}
+
+-- Автопоиск: размер кэша, задержка после смены цели (сек) и окно, в котором цель не выводится повторно (сек)
+local TARGET_CACHE_SIZE = {TARGET_CACHE_SIZE}
+local TARGET_DEBOUNCE = {TARGET_DEBOUNCE}
+local TARGET_REPEAT_WINDOW = {TARGET_REPEAT_WINDOW}
+
+-- Оптимизированные функции
+local function TEXT_COLOR(TEXT, INDEX)
+    return ("|c%s%s|r"):format(CLASSES[INDEX], TEXT)
+end
+
+{text_character_code}
+
+local function PRINT_ARRAY(CHARACTERS, ACCOUNT)
+    local COUNTER = 0
+    print(TEXT_COLOR("Все персонажи аккаунта: ", 13) .. TEXT_COLOR(ACCOUNT, 10))
+    for i = 1, #CHARACTERS do
+        TEXT_CHARACTER(CHARACTERS[i])
+        COUNTER = COUNTER + 1
+    end
+    print(TEXT_COLOR("Найдено персонажей: ", 13) .. TEXT_COLOR(COUNTER, 10))
+end
+
+{lookup_code}
+-- Основная функция поиска
+local function FIND_CHARACTER(FIND)
+    local startTime = GetTime()
+    local characters, account = FIND_CHARACTER_DATA(FIND)
+    return characters, account, GetTime() - startTime
+end
+
+-- Поиск по началу имени персонажа или аккаунта
+local function FIND_PREFIX(PREFIX)
+    local startTime = GetTime()
+    local names, accounts = FIND_PREFIX_DATA(PREFIX)
+    return names, accounts, GetTime() - startTime
+end
+
+local function PRINT_PREFIX(NAMES, ACCOUNTS)
+    -- Каждый аккаунт распаковываем не более одного раза
+    local decoded = {{}}
+    for i = 1, #NAMES do
+        local nameLower, account = NAMES[i][1], NAMES[i][2]
+        if not decoded[account] then
+            local value = GET_ACCOUNT(account)
+            decoded[account] = value and ACCOUNT_CHARACTERS(value) or {{}}
+        end
+        local characters = decoded[account]
+        for j = 1, #characters do
+            if strlower(characters[j][1]) == nameLower then
+                TEXT_CHARACTER(characters[j], TEXT_COLOR(" - " .. account, 13))
+                break
+            end
+        end
+    end
+    for i = 1, #ACCOUNTS do
+        print(TEXT_COLOR("Аккаунт: ", 13) .. TEXT_COLOR(ACCOUNTS[i], 10))
+    end
+end
+
+-- Поиск членов гильдии по обратному индексу
+local function FIND_GUILD(FIND)
+    local startTime = GetTime()
+    local guild = FIND_GUILD_DATA(FIND)
+    return guild, GetTime() - startTime
+end
+
+local function PRINT_GUILD(GUILD)
+    local decoded = {{}}
+    local characterCount, accountCount = 0, 0
+    print(TEXT_COLOR("Члены гильдии: ", 13) .. TEXT_COLOR(GUILD[1], 10))
+    for i = 2, #GUILD, 2 do
+        local account, position = GUILD[i], GUILD[i + 1]
+        if not decoded[account] then
+            local value = GET_ACCOUNT(account)
+            decoded[account] = value and ACCOUNT_CHARACTERS(value) or {{}}
+            accountCount = accountCount + 1
+        end
+        characterCount = characterCount + 1
+        local character = decoded[account][position]
+        if character and characterCount <= GUILD_SEARCH_LIMIT then
+            TEXT_CHARACTER(character, TEXT_COLOR(" - " .. account, 13))
+        end
+    end
+    print(TEXT_COLOR("Найдено персонажей: ", 13) .. TEXT_COLOR(characterCount, 10) .. TEXT_COLOR(", аккаунтов: ", 13) .. TEXT_COLOR(accountCount, 10))
+    if characterCount > GUILD_SEARCH_LIMIT then
+        print(TEXT_COLOR("Показаны первые " .. GUILD_SEARCH_LIMIT .. " по GS", 13))
+    end
+end
+
+-- Кэш результатов автопоиска (LRU, включая "не найден"), ключ - имя цели
+local TARGET_CACHE = {{}}
+local TARGET_CACHE_COUNT, TARGET_CACHE_TICK = 0, 0
+local TARGET_CACHE_HITS, TARGET_CACHE_MISSES = 0, 0
+
+local function CACHED_FIND(NAME)
+    TARGET_CACHE_TICK = TARGET_CACHE_TICK + 1
+    local entry = TARGET_CACHE[NAME]
+    if entry then
+        TARGET_CACHE_HITS = TARGET_CACHE_HITS + 1
+        entry.tick = TARGET_CACHE_TICK
+        return entry, 0
+    end
+    TARGET_CACHE_MISSES = TARGET_CACHE_MISSES + 1
+    local characters, account, searchTime = FIND_CHARACTER(NAME)
+    -- Вытесняем самую давно использованную запись
+    if TARGET_CACHE_COUNT >= TARGET_CACHE_SIZE then
+        local oldestName, oldestTick
+        for name, cached in pairs(TARGET_CACHE) do
+            if not oldestTick or cached.tick < oldestTick then
+                oldestName, oldestTick = name, cached.tick
+            end
+        end
+        TARGET_CACHE[oldestName] = nil
+        TARGET_CACHE_COUNT = TARGET_CACHE_COUNT - 1
+    end
+    entry = {{characters = characters, account = account, tick = TARGET_CACHE_TICK}}
+    TARGET_CACHE[NAME] = entry
+    TARGET_CACHE_COUNT = TARGET_CACHE_COUNT + 1
+    return entry, searchTime
+end
+
+-- Автопоиск по цели (работает только если включен); force - показать даже недавно показанную цель
+local function SEARCH_TARGET(force)
+    if not EzInfo_Config.autoTargetMode then return end
+
+    local targetName = UnitName("target")
+    if not targetName or not UnitIsPlayer("target") then return end
+
+    local entry, searchTime = CACHED_FIND(targetName)
+    -- Цель, показанная несколько секунд назад, повторно не выводится (кроме явного /qq on)
+    local now = GetTime()
+    if not force and entry.shownAt and now - entry.shownAt < TARGET_REPEAT_WINDOW then return end
+    entry.shownAt = now
+
+    if entry.characters and entry.account then
+        print("|cFFc200c2АВТОПОИСК:|r " .. TEXT_COLOR(targetName, 10))
+        PRINT_ARRAY(entry.characters, entry.account)
+        print(TEXT_COLOR("Автопоиск выполнен за ", 13) .. TEXT_COLOR(format("%.3f", searchTime) .. " сек", 10))
+    else
+        print("|cFFc200c2АВТОПОИСК:|r " .. TEXT_COLOR(targetName, 10) .. TEXT_COLOR(" не найден", 13))
+    end
+end
+
+-- Отложенный автопоиск: быстрая смена целей (Tab) схлопывается в один поиск по последней цели
+local targetChangedAt = 0
+local debounceFrame = CreateFrame("Frame")
+debounceFrame:Hide()
+debounceFrame:SetScript("OnUpdate", function(self)
+    if GetTime() - targetChangedAt >= TARGET_DEBOUNCE then
+        self:Hide()
+        SEARCH_TARGET()
+    end
+end)
+
+local function QUEUE_SEARCH_TARGET()
+    if not EzInfo_Config.autoTargetMode then return end
+    targetChangedAt = GetTime()
+    debounceFrame:Show()
+end
+
+-- Обработчик команд
+SLASH_EZINFO1, SLASH_EZINFO2 = '/qq', '/ezinfo'
+
+SlashCmdList["EZINFO"] = function(MESSAGE)
+    -- Обработка команд автопоиска
+    if MESSAGE == "on" then
+        EzInfo_Config.autoTargetMode = true
+        print(TEXT_COLOR("EzInfo: Автопоиск ", 13) .. TEXT_COLOR("ВКЛЮЧЕН", 10))
+        if UnitExists("target") and UnitIsPlayer("target") then
+            SEARCH_TARGET(true)
+        end
+        return
+    elseif MESSAGE == "off" then
+        EzInfo_Config.autoTargetMode = false
+        debounceFrame:Hide()
+        print(TEXT_COLOR("EzInfo: Автопоиск ", 13) .. TEXT_COLOR("ВЫКЛЮЧЕН", 10))
+        return
+    elseif MESSAGE == "status" then
+        local status = EzInfo_Config.autoTargetMode and TEXT_COLOR("ВКЛЮЧЕН", 10) or TEXT_COLOR("ВЫКЛЮЧЕН", 10)
+        print(TEXT_COLOR("EzInfo: Автопоиск: ", 13) .. status)
+        print(TEXT_COLOR("Кэш автопоиска: попаданий ", 13) .. TEXT_COLOR(TARGET_CACHE_HITS, 10) ..
+              TEXT_COLOR(", промахов ", 13) .. TEXT_COLOR(TARGET_CACHE_MISSES, 10) ..
+              TEXT_COLOR(", записей ", 13) .. TEXT_COLOR(TARGET_CACHE_COUNT .. "/" .. TARGET_CACHE_SIZE, 10))
+        return
+    elseif MESSAGE == "memory" then
+        local memory = collectgarbage("count")
+        print(TEXT_COLOR("Использование памяти LUA: ", 13) .. TEXT_COLOR(format("%.2f MB", memory/1024), 10))
+        return
+    end
+
+    -- Поиск по гильдии: /qq g:<название> (двоеточия не бывает в имени персонажа)
+    local GUILD_NAME = strmatch(MESSAGE, "^[gG]:%s*(.-)%s*$")
+    if GUILD_NAME then
+        if GUILD_NAME == "" then
+            print(TEXT_COLOR("Укажите название гильдии, например: /qq g:<название>", 13))
+            return
+        end
+        print(TEXT_COLOR("EzInfo", 10))
+        local guild, searchTime = FIND_GUILD(GUILD_NAME)
+        print(TEXT_COLOR("Поиск выполнен за ", 13) .. TEXT_COLOR(format("%.3f", searchTime) .. " сек", 10))
+        if guild then
+            PRINT_GUILD(guild)
+        else
+            print(TEXT_COLOR("Гильдия '", 13)..TEXT_COLOR(GUILD_NAME, 10)..TEXT_COLOR("' не найдена", 13))
+        end
+        return
+    end
+
+    -- Поиск по началу имени: /qq arth*
+    local PREFIX = strmatch(MESSAGE, "^(.-)%*$")
+    if PREFIX then
+        if PREFIX == "" then
+            print(TEXT_COLOR("Укажите начало имени перед *, например: /qq arth*", 13))
+            return
+        end
+        print(TEXT_COLOR("EzInfo", 10))
+        local names, accounts, searchTime = FIND_PREFIX(PREFIX)
+        print(TEXT_COLOR("Поиск выполнен за ", 13) .. TEXT_COLOR(format("%.3f", searchTime) .. " сек", 10))
+        if #names == 0 and #accounts == 0 then
+            print(TEXT_COLOR("Ничего не найдено по началу '", 13)..TEXT_COLOR(PREFIX, 10)..TEXT_COLOR("'", 13))
+            return
+        end
+        PRINT_PREFIX(names, accounts)
+        print(TEXT_COLOR("Найдено персонажей: ", 13) .. TEXT_COLOR(#names, 10) .. TEXT_COLOR(", аккаунтов: ", 13) .. TEXT_COLOR(#accounts, 10) ..
+              TEXT_COLOR(" (не более " .. PREFIX_SEARCH_LIMIT .. " каждого)", 13))
+        return
+    end
+
+    -- Поиск персонажа
+    local FIND = MESSAGE ~= "" and MESSAGE or UnitName("target")
+    if not FIND or FIND == "" then
+        -- Показываем справку и информацию о базе
+        print(TEXT_COLOR("EzInfo", 11))
+        print(TEXT_COLOR("База персонажей", 10))
+        print(TEXT_COLOR("На основе программ от Border, Jyn (janeblower)", 13))
+        print(TEXT_COLOR("Использование: /qq <имя_персонажа>", 10))
+        print(TEXT_COLOR("Или выберите цель и введите /qq", 10))
+        print(TEXT_COLOR("Так же: /qq <имя_аккаунта>", 10))
+        print(TEXT_COLOR("Поиск по началу имени: /qq <начало_имени>*", 10))
+        print(TEXT_COLOR("Члены гильдии: /qq g:<название>", 10))
+        print(TEXT_COLOR("Дополнительные команды:", 10))
+        print(TEXT_COLOR("/qq on - включить автопоиск по цели", 12))
+        print(TEXT_COLOR("/qq off - выключить автопоиск по цели", 12))
+        print(TEXT_COLOR("/qq status - показать статус автопоиска", 12))
+        print(TEXT_COLOR("/qq memory - показать использование памяти", 12))
+        -- Показываем информацию о базе
+        print(TEXT_COLOR("Файл базы: " .. DB_SOURCE .. " от " .. DB_BUILD_TIME, 13))
+        print(TEXT_COLOR("Персонажи: " .. DB_TOTAL_CHARS .. ", Аккаунты: " .. DB_TOTAL_ACCOUNTS .. ", Гильдии: " .. DB_TOTAL_GUILDS, 10))
+        if DB_FILTERS ~= "" then
+            print(TEXT_COLOR("Фильтры сборки: " .. DB_FILTERS, 13))
+        end
+        return
+    end
+
+    print(TEXT_COLOR("EzInfo", 10))
+
+    local characters, account, searchTime = FIND_CHARACTER(FIND)
+    print(TEXT_COLOR("Поиск выполнен за ", 13) .. TEXT_COLOR(format("%.3f", searchTime) .. " сек", 10))
+
+    if characters and account then
+        PRINT_ARRAY(characters, account)
+    else
+        print(TEXT_COLOR("Персонаж или аккаунт '", 13)..TEXT_COLOR(FIND, 10)..TEXT_COLOR("' не найден", 13))
+    end
+end
+
+-- Обработчик смены цели (автопоиск работает только если включен)
+local frame = CreateFrame("Frame")
+frame:RegisterEvent("PLAYER_TARGET_CHANGED")
+frame:SetScript("OnEvent", QUEUE_SEARCH_TARGET)
+
+-- Сообщение о загрузке аддона
+local loadFrame = CreateFrame("Frame")
+loadFrame:RegisterEvent("ADDON_LOADED")
+loadFrame:SetScript("OnEvent", function(self, event, addonName)
+    if addonName == "EzInfo" then
+        print(TEXT_COLOR("EzInfo загружен. ", 13) .. TEXT_COLOR("/qq", 10) .. TEXT_COLOR(" для поиска", 13))
+        print(TEXT_COLOR("Автопоиск по цели: ", 13) ..
+              (EzInfo_Config.autoTargetMode and TEXT_COLOR("ВКЛЮЧЕН", 10) or TEXT_COLOR("ВЫКЛЮЧЕН", 11)))
+        -- Показываем информацию о базе
+        print(TEXT_COLOR("Файл базы: " .. DB_SOURCE .. " от " .. DB_BUILD_TIME, 13))
+        print(TEXT_COLOR("Персонажи: " .. DB_TOTAL_CHARS .. ", Аккаунты: " .. DB_TOTAL_ACCOUNTS .. ", Гильдии: " .. DB_TOTAL_GUILDS, 10))
+        if DB_FILTERS ~= "" then
+            print(TEXT_COLOR("Фильтры сборки: " .. DB_FILTERS, 13))
+        end
+    end
+end)
+'''
+
+    # Сохраняем основной файл аддона в выходной директории
+    profiler.switch_phase('write_files')
+    os.makedirs(output_dir, exist_ok=True)
+    addon_path = os.path.join(output_dir, 'EzInfo.lua')
+    with open(addon_path, 'w', encoding='utf-8') as f:
+        f.write(main_code)
+    log_message(f"Файл аддона сохранен как {addon_path}")
+
+    # Сохраняем шарды (или базу и дельту) как отдельные аддоны с LoadOnDemand, удаляя аддоны данных
+    # предыдущей сборки, которых нет в текущей. Неизменившаяся стабильная база не переписывается
+    current_addons = {addon_name for addon_name, _, _ in data_addons}
+    if DELTA_BUILD and SHARD_COUNT == 0:
+        current_addons.add(BASE_ADDON)
+    remove_stale_data_addons(output_dir, current_addons)
+    data_addon_names = []
+    for addon_name, toc_code, addon_code in data_addons:
+        addon_dir = os.path.join(output_dir, addon_name)
+        os.makedirs(addon_dir, exist_ok=True)
+        with open(os.path.join(addon_dir, f'{addon_name}.toc'), 'w', encoding='utf-8') as f:
+            f.write(toc_code)
+        with open(os.path.join(addon_dir, f'{addon_name}.lua'), 'w', encoding='utf-8') as f:
+            f.write(addon_code)
+        data_addon_names.append(addon_name)
+    if data_addon_names:
+        log_message(f"Данные сохранены как аддоны: {', '.join(data_addon_names)}")
+    if new_manifest:
+        with open(os.path.join(output_dir, BASE_MANIFEST), 'w', encoding='utf-8') as f:
+            json.dump(new_manifest, f, ensure_ascii=False)
+        log_message(f"Собрана новая стабильная база {new_manifest['id']}")
+    
+    # Копируем файл в папку интерфейса WoW, если путь указан
+    profiler.switch_phase('install')
+    if install and WoW_InterfaceFolderPath and WoW_InterfaceFolderPath.strip():
+        try:
+            destination_path = os.path.join(WoW_InterfaceFolderPath, 'EzInfo.lua')
+            shutil.copy2(addon_path, destination_path)
+            log_message(f"Файл аддона скопирован в: {destination_path}")
+            # Шарды, база и дельта - соседние аддоны в папке AddOns (неизменившаяся база копируется, только если ее там нет)
+            addons_folder = os.path.dirname(os.path.normpath(WoW_InterfaceFolderPath))
+            copy_addons = list(data_addon_names)
+            if DELTA_BUILD and SHARD_COUNT == 0 and BASE_ADDON not in copy_addons \
+                    and not os.path.isdir(os.path.join(addons_folder, BASE_ADDON)):
+                copy_addons.append(BASE_ADDON)
+            for addon_name in copy_addons:
+                shutil.copytree(os.path.join(output_dir, addon_name), os.path.join(addons_folder, addon_name), dirs_exist_ok=True)
+            if copy_addons:
+                log_message(f"Аддоны данных скопированы в: {addons_folder}")
+            # Шарды и база/дельта прошлых сборок (меньше SHARD_COUNT, другой режим) иначе остались бы в AddOns
+            removed = remove_stale_data_addons(addons_folder, current_addons)
+            if removed:
+                log_message(f"Удалены устаревшие аддоны данных: {', '.join(removed)}")
+        except Exception as e:
+            log_message(f"Ошибка при копировании файла в {WoW_InterfaceFolderPath}: {e}")
+    
+    log_message(f"Генерация аддона завершена!")
+    log_message(f"Статистика базы:")
+    log_message(f"  Персонажи: {total_records}")
+    log_message(f"  Аккаунты: {total_accounts}")
+    log_message(f"  Гильдии: {total_guilds}")
+    
+    if unknown_classes:
+        log_message(f"Предупреждение: Обнаружены неизвестные классы: {unknown_classes}")
+    
+    conn.close()
+    profiler.switch_phase(None)
+    return addon_path
+
+if __name__ == "__main__":
+    profiler.enabled = '--profile' in sys.argv
+    profiler.start()
+    try:
+        setup_logging()
+        profiler.run_profiled(generate_addon_with_database, new_base='--new-base' in sys.argv)
+    except Exception as e:
+        log_message(f"Произошла ошибка: {e}")
+        import traceback
+        log_message(f"Трассировка ошибки: {traceback.format_exc()}")
+    finally:
+        profile_path = profiler.save("LOGS")
+        if profile_path:
+            log_message(f"Отчет профилирования: {profile_path}")
+        close_logging()
+
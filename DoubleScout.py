@@ -2,6 +2,7 @@ from bs4 import BeautifulSoup
 from datetime import datetime, date
 import os
 import re
+import shutil
 import sqlite3
 import time
 from tqdm import tqdm
@@ -11,6 +12,15 @@ import signal
 import sys
 import random
 import logging
+import queue
+import atexit
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from itertools import repeat
+from logging.handlers import QueueHandler, QueueListener
+
+from EzFreshness import describe_plan, history_databases, plan_revisits
+from EzProfiler import PhaseProfiler
 
 # ==================== КОНФИГУРАЦИЯ ====================
 PLAYTIME_ONLY = False  # Если True - парсит только по времени игры, если False - также по имени
@@ -22,10 +32,18 @@ DELAY_SECONDS = 0.5    # Фиксированная задержка в секу
 RANDOM_DELAY = False   # Использовать случайные задержки вместо фиксированных
 MIN_DELAY = 0.3        # Минимальная случайная задержка в секундах (если RANDOM_DELAY=True)
 MAX_DELAY = 1.2        # Максимальная случайная задержка в секундах (если RANDOM_DELAY=True)
+REQUESTS_PER_SECOND = 0  # Общий лимит запросов в секунду на все потоки и миры (0 - без ограничения)
+DISCOVERY_WORKERS = 4    # Параллельных проверок st= при поиске последней страницы, если сайт не переадресует
+TAIL_RECHECK_SECONDS = 600  # Как часто во время обхода проверять появление новых страниц в конце рейтинга (0 - не проверять)
+REVISIT_BUDGET = 0       # Страниц playtime за запуск при выборочном обходе по свежести (0 - полный обход всех страниц)
+
+# Миры армори (параметр realm= в URL). Миры сканируются одновременно, каждый в свои базы;
+# при нескольких мирах к именам баз добавляется _r<номер>: ezbase_final_YYMMDD_HHMM_r1.db
+REALMS = [1]
 
-PLAYTIME_URL = "https://ezwow.org/index.php?app=isengard&module=core&tab=armory&section=characters&realm=1&sort%5Bkey%5D=playtime&sort%5Border%5D=desc&st="
-NAME_URL = "https://ezwow.org/index.php?app=isengard&module=core&tab=armory&section=characters&realm=1&sort%5Bkey%5D=name&sort%5Border%5D=desc&st="
-LAST_PAGE_URL = 'https://ezwow.org/index.php?app=isengard&module=core&tab=armory&section=characters&realm=1&sort%5Bkey%5D=playtime&sort%5Border%5D=desc&st=9999999999999999999'
+PLAYTIME_URL = "https://ezwow.org/index.php?app=isengard&module=core&tab=armory&section=characters&realm={realm}&sort%5Bkey%5D=playtime&sort%5Border%5D=desc&st="
+NAME_URL = "https://ezwow.org/index.php?app=isengard&module=core&tab=armory&section=characters&realm={realm}&sort%5Bkey%5D=name&sort%5Border%5D=desc&st="
+LAST_PAGE_URL = 'https://ezwow.org/index.php?app=isengard&module=core&tab=armory&section=characters&realm={realm}&sort%5Bkey%5D=playtime&sort%5Border%5D=desc&st=9999999999999999999'
 
 CLASS_TRANSLATION = {
     'Hunter (Охотник)': 'Hunter',
@@ -58,22 +76,31 @@ CONFIG = {
     'max_attempts': 3,
     'retry_delay': 2,
     'logs_folder': 'LOGS',
-    'bases_folder': 'BASES'
+    'bases_folder': 'BASES',
+    # Уровень логов: 'DEBUG' - каждая страница и каждая ошибка отдельной записи,
+    # 'INFO' - ход работы, 'WARNING' - только повторы и ошибки
+    'log_level': 'INFO'
 }
 
 download_active = True
 
 # ==================== СИСТЕМА ЛОГГИРОВАНИЯ ====================
 
+class DeferredQueueHandler(QueueHandler):
+    """Кладет запись в очередь как есть: форматирование выполняет фоновый слушатель"""
+    def prepare(self, record):
+        return record
+
 class ThreadSafeLogger:
     def __init__(self):
         self.logger = None
-        self.lock = threading.Lock()
+        self.listener = None
         
-    def setup(self, log_file):
-        """Настройка логгера"""
+    def setup(self, log_file, level=None):
+        """Настройка логгера: потоки только ставят записи в очередь, запись в файл и консоль - в фоновом потоке"""
+        self.shutdown()
         self.logger = logging.getLogger('parser')
-        self.logger.setLevel(logging.INFO)
+        self.logger.setLevel(level or CONFIG['log_level'])
         
         # Форматтер
         formatter = logging.Formatter(
@@ -89,29 +116,75 @@ class ThreadSafeLogger:
         console_handler = logging.StreamHandler()
         console_handler.setFormatter(formatter)
         
-        # Очистка существующих обработчиков и добавление новых
+        # Единственный обработчик логгера - очередь, которую разбирает слушатель
+        log_queue = queue.SimpleQueue()
+        self.listener = QueueListener(log_queue, file_handler, console_handler)
         self.logger.handlers.clear()
-        self.logger.addHandler(file_handler)
-        self.logger.addHandler(console_handler)
+        self.logger.addHandler(DeferredQueueHandler(log_queue))
         
         # Запрет распространения на корневой логгер
         self.logger.propagate = False
+        self.listener.start()
+    
+    def log(self, message, *args, level=logging.INFO):
+        """Потокобезопасное логирование; сообщения ниже уровня отбрасываются до форматирования"""
+        if self.logger and self.logger.isEnabledFor(level):
+            self.logger.log(level, message, *args)
+    
+    def debug(self, message, *args):
+        self.log(message, *args, level=logging.DEBUG)
+    
+    def warning(self, message, *args):
+        self.log(message, *args, level=logging.WARNING)
+    
+    def error(self, message, *args):
+        self.log(message, *args, level=logging.ERROR)
     
-    def log(self, message):
-        """Потокобезопасное логирование"""
-        if self.logger:
-            with self.lock:
-                self.logger.info(message)
+    def shutdown(self):
+        """Остановка слушателя: дописывает оставшиеся в очереди записи и закрывает файл лога"""
+        if self.listener:
+            self.listener.stop()
+            for handler in self.listener.handlers:
+                handler.close()
+            self.listener = None
 
 # Глобальный экземпляр логгера
 logger = ThreadSafeLogger()
+atexit.register(logger.shutdown)
+
+# Профилировщик (включается ключом --profile)
+profiler = PhaseProfiler('DoubleScout')
+
+class RateLimiter:
+    """Общий для всех потоков лимит запросов: каждый запрос занимает следующий свободный интервал"""
+    def __init__(self, requests_per_second):
+        self.interval = 1.0 / requests_per_second if requests_per_second else 0
+        self.lock = threading.Lock()
+        self.next_slot = 0.0
+    
+    def acquire(self):
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot)
+            self.next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+# Создается в run_scan, чтобы учитывать REQUESTS_PER_SECOND, заданный после импорта (EzPipeline)
+rate_limiter = RateLimiter(0)
 
 # ==================== РАБОТА С БАЗАМИ ДАННЫХ ====================
 
-def init_technical_db():
+def database_suffix(tag, realm):
+    """Суффикс имени баз сканирования: время запуска и, при нескольких мирах, номер мира"""
+    return f"{tag}_r{realm}" if len(REALMS) > 1 else tag
+
+def init_technical_db(suffix=None):
     """Инициализация технической базы данных"""
     os.makedirs(CONFIG['bases_folder'], exist_ok=True)
-    db_filename = f"{CONFIG['bases_folder']}/tech_base_{datetime.now().strftime('%y%m%d_%H%M')}.db"
+    db_filename = f"{CONFIG['bases_folder']}/tech_base_{suffix or datetime.now().strftime('%y%m%d_%H%M')}.db"
     conn = sqlite3.connect(db_filename)
     cursor = conn.cursor()
     
@@ -172,9 +245,9 @@ def init_technical_db():
     logger.log(f"Техническая база инициализирована: {db_filename}")
     return db_filename
 
-def init_final_db():
+def init_final_db(suffix=None):
     """Инициализация финальной базы данных"""
-    db_filename = f"{CONFIG['bases_folder']}/ezbase_final_{datetime.now().strftime('%y%m%d_%H%M')}.db"
+    db_filename = f"{CONFIG['bases_folder']}/ezbase_final_{suffix or datetime.now().strftime('%y%m%d_%H%M')}.db"
     conn = sqlite3.connect(db_filename)
     cursor = conn.cursor()
     
@@ -217,7 +290,7 @@ def save_scan_progress(db_filename, data_type, last_page, total_pages, char_coun
         conn.commit()
         conn.close()
     except Exception as e:
-        logger.log(f"Ошибка сохранения прогресса: {str(e)}")
+        logger.error(f"Ошибка сохранения прогресса: {str(e)}")
 
 def get_scan_progress(db_filename, data_type):
     """Получение прогресса сканирования"""
@@ -240,130 +313,130 @@ def get_scan_progress(db_filename, data_type):
             }
         return {'last_page': 0, 'total_pages': 0, 'char_count': 0, 'status': 'active'}
     except Exception as e:
-        logger.log(f"Ошибка получения прогресса: {str(e)}")
+        logger.error(f"Ошибка получения прогресса: {str(e)}")
         return {'last_page': 0, 'total_pages': 0, 'char_count': 0, 'status': 'active'}
 
-def save_characters_batch(db_filename, data_type, characters_data, page_number):
-    """Сохранение пачки персонажей в техническую базу"""
-    if not characters_data:
+def load_saved_ez_ids(db_filename, data_type):
+    """ez_id персонажей, уже сохраненных потоком data_type в техническую базу (при продолжении сканирования)"""
+    conn = sqlite3.connect(db_filename)
+    try:
+        return EzIdSet(ez_id for (ez_id,) in conn.execute(f"SELECT ez_id FROM {data_type}_data"))
+    finally:
+        conn.close()
+
+def save_characters_batch(db_filename, data_type, batch):
+    """Сохранение пачки персонажей страницы в техническую базу одним executemany
+    
+    Если пачка не записалась целиком, персонажи сохраняются по одному: ошибочная строка теряет только себя.
+    """
+    if not batch:
         return 0
     
+    insert_sql = f"""
+    INSERT OR REPLACE INTO {data_type}_data
+    (ez_id, forum_name, name, level, gs, ilvl, class, race, guild, kills, ap, pers_online, forum_online, page_number)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """
     try:
         conn = sqlite3.connect(db_filename)
-        cursor = conn.cursor()
-        saved_count = 0
-        
-        if data_type == "playtime":
-            for char_data in characters_data:
-                try:
-                    char_data_with_page = char_data + (page_number,)
-                    cursor.execute("""
-                    INSERT OR REPLACE INTO playtime_data
-                    (ez_id, forum_name, name, level, gs, ilvl, class, race, guild, kills, ap, pers_online, forum_online, page_number)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    """, char_data_with_page)
-                    saved_count += 1
-                except Exception as e:
-                    logger.log(f"Ошибка сохранения персонажа {char_data[0]}: {str(e)}")
-        else:
-            for char_data in characters_data:
+        try:
+            conn.executemany(insert_sql, batch.rows())
+            saved_count = len(batch)
+        except sqlite3.Error as e:
+            conn.rollback()
+            logger.debug("Ошибка сохранения пачки страницы %d, сохраняем по одному: %s", batch.page_number, e)
+            saved_count = 0
+            for row in batch.rows():
                 try:
-                    char_data_with_page = char_data + (page_number,)
-                    cursor.execute("""
-                    INSERT OR REPLACE INTO name_data
-                    (ez_id, forum_name, name, level, gs, ilvl, class, race, guild, kills, ap, pers_online, forum_online, page_number)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    """, char_data_with_page)
+                    conn.execute(insert_sql, row)
                     saved_count += 1
-                except Exception as e:
-                    logger.log(f"Ошибка сохранения персонажа {char_data[0]}: {str(e)}")
-        
+                except sqlite3.Error as e:
+                    logger.debug("Ошибка сохранения персонажа %s: %s", row[0], e)
         conn.commit()
         conn.close()
         return saved_count
     except Exception as e:
-        logger.log(f"Ошибка сохранения батча: {str(e)}")
+        logger.error(f"Ошибка сохранения батча: {str(e)}")
         return 0
 
-def merge_databases(tech_db, final_db):
-    """Объединение данных из технической базы в финальную"""
+def merge_databases(tech_db, final_db, base_db=None):
+    """Объединение данных из технической базы в финальную
+
+    Данные переносятся запросами INSERT ... SELECT внутри SQLite, без выгрузки строк в Python.
+    base_db - прошлая финальная база при выборочном обходе: ее персонажи переносятся
+    с прежними scan_date, перепроверенные страницы их обновляют.
+    Объединение идет во временной копии одной транзакцией, на место final_db она ставится
+    только готовой: история, следующий цикл и EzLookup не увидят наполовину объединенную базу.
+    """
     logger.log("Начинаем объединение данных в финальную базу...")
     
+    merge_db = f"{final_db}.tmp"
+    final_conn = None
     try:
-        tech_conn = sqlite3.connect(tech_db)
-        final_conn = sqlite3.connect(final_db)
-        tech_cursor = tech_conn.cursor()
+        shutil.copyfile(final_db, merge_db)
+        final_conn = sqlite3.connect(merge_db)
         final_cursor = final_conn.cursor()
+        final_cursor.execute("ATTACH DATABASE ? AS tech", (tech_db,))
         
         # Получаем статистику
-        tech_cursor.execute("SELECT COUNT(*) FROM playtime_data")
-        playtime_count = tech_cursor.fetchone()[0]
-        tech_cursor.execute("SELECT COUNT(*) FROM name_data")
-        name_count = tech_cursor.fetchone()[0]
+        final_cursor.execute("SELECT COUNT(*) FROM tech.playtime_data")
+        playtime_count = final_cursor.fetchone()[0]
+        final_cursor.execute("SELECT COUNT(*) FROM tech.name_data")
+        name_count = final_cursor.fetchone()[0]
         
         logger.log(f"Данные для объединения: Playtime - {playtime_count}, Name - {name_count}")
         
         if playtime_count == 0 and name_count == 0:
-            logger.log("ОШИБКА: В технической базе нет данных для объединения!")
+            logger.error("ОШИБКА: В технической базе нет данных для объединения!")
+            final_conn.close()
+            os.remove(merge_db)
             return 0
         
         scan_date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        total_inserted = 0
         
-        # Вставка данных из Playtime
-        if playtime_count > 0:
-            tech_cursor.execute("""
-            SELECT ez_id, forum_name, name, level, gs, ilvl, class, race, guild, kills, ap, pers_online, forum_online, playtime_id
-            FROM playtime_data
+        # Перенос прошлой финальной базы (выборочный обход)
+        if base_db:
+            final_cursor.execute("ATTACH DATABASE ? AS base", (base_db,))
+            final_cursor.execute("""
+            INSERT OR REPLACE INTO characters
+            (ez_id, forum_name, name, level, gs, ilvl, class, race, guild, kills, ap, pers_online, forum_online, source, scan_date, playtime)
+            SELECT ez_id, forum_name, name, level, gs, ilvl, class, race, guild, kills, ap, pers_online, forum_online, source, scan_date, playtime
+            FROM base.characters
             """)
-            playtime_chars = tech_cursor.fetchall()
-            
-            for char in playtime_chars:
-                try:
-                    ez_id, forum_name, name, level, gs, ilvl, class_, race, guild, kills, ap, pers_online, forum_online, playtime_id = char
-                    final_cursor.execute("""
-                    INSERT OR REPLACE INTO characters
-                    (ez_id, forum_name, name, level, gs, ilvl, class, race, guild, kills, ap, pers_online, forum_online, source, scan_date, playtime)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    """, (ez_id, forum_name, name, level, gs, ilvl, class_, race, guild, kills, ap, pers_online, forum_online, 'playtime', scan_date, playtime_id))
-                    total_inserted += 1
-                except Exception as e:
-                    logger.log(f"Ошибка вставки персонажа {char[0]} из playtime: {str(e)}")
-            
-            logger.log(f"Добавлено {len(playtime_chars)} персонажей из playtime_data")
+            carried_count = final_cursor.rowcount
+            logger.log(f"Перенесено {carried_count} персонажей из {base_db}")
         
-        # Вставка данных из Name
+        # Вставка данных из Playtime (playtime - позиция в рейтинге: смещение страницы + порядок на странице)
+        if playtime_count > 0:
+            final_cursor.execute("""
+            INSERT OR REPLACE INTO characters
+            (ez_id, forum_name, name, level, gs, ilvl, class, race, guild, kills, ap, pers_online, forum_online, source, scan_date, playtime)
+            SELECT ez_id, forum_name, name, level, gs, ilvl, class, race, guild, kills, ap, pers_online, forum_online, 'playtime', ?,
+                   page_number + ROW_NUMBER() OVER (PARTITION BY page_number ORDER BY playtime_id)
+            FROM tech.playtime_data
+            """, (scan_date,))
+            logger.log(f"Добавлено {final_cursor.rowcount} персонажей из playtime_data")
+        
+        # Вставка данных из Name (только персонажи, которых нет в playtime)
         if name_count > 0:
-            tech_cursor.execute("""
-            SELECT ez_id, forum_name, name, level, gs, ilvl, class, race, guild, kills, ap, pers_online, forum_online
-            FROM name_data
-            """)
-            name_chars = tech_cursor.fetchall()
-            name_inserted = 0
-            
-            for char in name_chars:
-                try:
-                    final_cursor.execute("SELECT ez_id FROM characters WHERE ez_id = ?", (char[0],))
-                    if not final_cursor.fetchone():
-                        final_cursor.execute("""
-                        INSERT INTO characters
-                        (ez_id, forum_name, name, level, gs, ilvl, class, race, guild, kills, ap, pers_online, forum_online, source, scan_date, playtime)
-                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                        """, char + ('name', scan_date, None))
-                        total_inserted += 1
-                        name_inserted += 1
-                except Exception as e:
-                    logger.log(f"Ошибка вставки персонажа {char[0]} из name: {str(e)}")
-            
-            logger.log(f"Добавлено {name_inserted} персонажей из name_data")
+            final_cursor.execute("""
+            INSERT OR IGNORE INTO characters
+            (ez_id, forum_name, name, level, gs, ilvl, class, race, guild, kills, ap, pers_online, forum_online, source, scan_date, playtime)
+            SELECT ez_id, forum_name, name, level, gs, ilvl, class, race, guild, kills, ap, pers_online, forum_online, 'name', ?, NULL
+            FROM tech.name_data
+            """, (scan_date,))
+            logger.log(f"Добавлено {final_cursor.rowcount} персонажей из name_data")
         
         # Финальная статистика
         final_cursor.execute("SELECT COUNT(*) FROM characters")
         total_final = final_cursor.fetchone()[0]
         
         final_conn.commit()
-        tech_conn.close()
+        final_cursor.execute("DETACH DATABASE tech")
+        if base_db:
+            final_cursor.execute("DETACH DATABASE base")
         final_conn.close()
+        os.replace(merge_db, final_db)
         
         logger.log("=" * 50)
         logger.log("РЕЗУЛЬТАТЫ ОБЪЕДИНЕНИЯ:")
@@ -373,13 +446,90 @@ def merge_databases(tech_db, final_db):
         
         return total_final
     except Exception as e:
-        logger.log(f"Ошибка при объединении баз: {str(e)}")
+        logger.error(f"Ошибка при объединении баз: {str(e)}")
         import traceback
-        logger.log(f"Трассировка: {traceback.format_exc()}")
+        logger.error(f"Трассировка: {traceback.format_exc()}")
+        try:
+            if final_conn:
+                final_conn.close()
+            if os.path.exists(merge_db):
+                os.remove(merge_db)
+        except Exception:
+            pass
         return 0
 
 # ==================== ПАРСИНГ ДАННЫХ ====================
 
+# Поля персонажа в порядке parse_character и колонок технической базы
+CHARACTER_FIELDS = ('ez_id', 'forum_name', 'name', 'level', 'gs', 'ilvl', 'class', 'race', 'guild',
+                    'kills', 'ap', 'pers_online', 'forum_online')
+# Тип колонки пачки: числа и флаги в компактных array, строки в списках
+CHARACTER_COLUMN_TYPES = ('q', None, None, 'q', 'q', 'q', None, None, None, 'q', 'q', 'b', 'b')
+
+class CharacterBatch:
+    """Персонажи одной страницы по колонкам (по массиву на поле) вместо кортежа на персонажа
+    
+    Числа хранятся в array без отдельного объекта int на значение, номер страницы - один на пачку.
+    """
+    __slots__ = ('page_number', 'columns')
+    
+    def __init__(self, page_number):
+        self.page_number = page_number
+        self.columns = tuple(array(type_code) if type_code else [] for type_code in CHARACTER_COLUMN_TYPES)
+    
+    def append(self, values):
+        for column, value in zip(self.columns, values):
+            column.append(value)
+    
+    def __len__(self):
+        return len(self.columns[0])
+    
+    def rows(self):
+        """Строки для executemany: значения колонок и номер страницы, без промежуточного списка кортежей"""
+        return zip(*self.columns, repeat(self.page_number, len(self)))
+    
+    def exclude(self, ez_ids):
+        """Новая пачка без персонажей, чьи ez_id входят в ez_ids"""
+        batch = CharacterBatch(self.page_number)
+        for values in zip(*self.columns):
+            if values[0] not in ez_ids:
+                batch.append(values)
+        return batch
+
+class EzIdSet:
+    """Множество ez_id в виде битовой карты: ez_id идут плотно, один бит на персонажа (1 млн id - 125 КБ)
+    
+    Пополняется потоком playtime под блокировкой, поток name проверяет ez_id без блокировки:
+    бит только добавляется, а карта только растет, каждое изменение атомарно под GIL.
+    """
+    __slots__ = ('bits', 'count', 'lock')
+    
+    def __init__(self, ez_ids=()):
+        self.bits = bytearray()
+        self.count = 0
+        self.lock = threading.Lock()
+        self.update(ez_ids)
+    
+    def update(self, ez_ids):
+        with self.lock:
+            for ez_id in ez_ids:
+                if ez_id < 0:
+                    continue
+                byte, bit = ez_id >> 3, 1 << (ez_id & 7)
+                if byte >= len(self.bits):
+                    # Растим с запасом, чтобы не расширять карту на каждой странице
+                    self.bits.extend(bytes(max(byte + 1, 2 * len(self.bits)) - len(self.bits)))
+                if not self.bits[byte] & bit:
+                    self.bits[byte] |= bit
+                    self.count += 1
+    
+    def __contains__(self, ez_id):
+        byte = ez_id >> 3
+        return 0 <= byte < len(self.bits) and bool(self.bits[byte] & (1 << (ez_id & 7)))
+    
+    def __len__(self):
+        return self.count
+
 def clean_text(element):
     """Очистка текста от лишних пробелов"""
     return re.sub(r'\s+', '', element.get_text(strip=True)) if element else ''
@@ -443,25 +593,25 @@ def parse_character(character):
             forum_acc_online
         )
     except Exception as e:
-        logger.log(f"Ошибка парсинга персонажа: {str(e)}")
+        logger.debug("Ошибка парсинга персонажа: %s", e)
         return None
 
-def parse_html_content(html_content):
-    """Парсинг HTML контента и извлечение персонажей"""
+def parse_html_content(html_content, page_number):
+    """Парсинг HTML контента и извлечение персонажей страницы в CharacterBatch"""
+    batch = CharacterBatch(page_number)
     try:
         soup = BeautifulSoup(html_content, 'lxml')
         characters = soup.find_all('tr', class_='character')
-        parsed_characters = []
         
         for character in characters:
             char_data = parse_character(character)
             if char_data:
-                parsed_characters.append(char_data)
+                batch.append(char_data)
                 
-        return parsed_characters, len(characters)
+        return batch, len(characters)
     except Exception as e:
-        logger.log(f"Ошибка парсинга HTML: {str(e)}")
-        return [], 0
+        logger.error(f"Ошибка парсинга HTML: {str(e)}")
+        return CharacterBatch(page_number), 0
 
 # ==================== СКАЧИВАНИЕ И ОБРАБОТКА ====================
 
@@ -494,35 +644,173 @@ def initialize_session(cookies_dict):
         session.cookies.set(name, value)
     return session
 
-def get_last_page(session):
-    """Определение общего количества страниц для сканирования"""
+def page_has_characters(session, base_url, page_index):
+    """Есть ли персонажи на странице page_index (st = page_index * 20)
+    
+    Переадресация на другую st (сайт отправляет за конец рейтинга на последнюю страницу) значит, что страницы нет.
+    """
+    st = page_index * 20
+    response = download_page_with_retry(session, base_url, st, 'discovery')
+    if response is None:
+        raise ConnectionError(f"не удалось скачать страницу {st}")
+    if response.url.split('&st=')[-1] != str(st):
+        return False
+    return parse_html_content(response.content, st)[1] > 0
+
+def search_last_page_index(session, base_url, known=0):
+    """Индекс последней непустой страницы, known - индекс заведомо существующей страницы
+    
+    Сначала граница ищется экспоненциально (known + 1, 2, 4, ...), затем сужается многоточечным
+    бинарным поиском; за раунд параллельно проверяется DISCOVERY_WORKERS страниц.
+    """
+    with ThreadPoolExecutor(max_workers=DISCOVERY_WORKERS, thread_name_prefix='Discovery') as pool:
+        def first_missing(indexes):
+            """Последняя существующая и первая отсутствующая из проверенных (страницы идут по возрастанию)"""
+            last_found = None
+            for index, exists in zip(indexes, pool.map(lambda i: page_has_characters(session, base_url, i), indexes)):
+                if not exists:
+                    return last_found, index
+                last_found = index
+            return last_found, None
+        
+        lo, hi, exponent = known, None, 0
+        while hi is None:
+            found, hi = first_missing([known + 2 ** k for k in range(exponent, exponent + DISCOVERY_WORKERS)])
+            lo = found if found is not None else lo
+            exponent += DISCOVERY_WORKERS
+        
+        while hi - lo > 1:
+            count = min(DISCOVERY_WORKERS, hi - lo - 1)
+            found, missing = first_missing(sorted({lo + (hi - lo) * (n + 1) // (count + 1) for n in range(count)}))
+            lo = found if found is not None else lo
+            hi = missing if missing is not None else hi
+    return lo
+
+def get_last_page(session, realm):
+    """Определение общего количества страниц мира для сканирования
+    
+    Обычно сайт переадресует st=9999999999999999999 на последнюю страницу; если переадресации
+    нет, граница ищется перебором st= (search_last_page_index).
+    """
+    url = LAST_PAGE_URL.format(realm=realm)
+    try:
+        rate_limiter.acquire()
+        response = session.get(url, timeout=CONFIG['timeout'])
+        if response.url != url:
+            last_st = int(response.url.split('&st=')[1])
+            last_page = (last_st // 20) * 20
+            total_pages = (last_st // 20) + 1
+            logger.log(f"Мир {realm}: определена последняя страница: {last_page} (всего страниц: {total_pages})")
+            return last_page, total_pages
+        logger.warning("Мир %s: нет переадресации на последнюю страницу, ищем ее перебором st=", realm)
+    except Exception as e:
+        logger.warning("Мир %s: ошибка получения последней страницы (%s), ищем ее перебором st=", realm, e)
+    
     try:
-        response = session.get(LAST_PAGE_URL, timeout=CONFIG['timeout'])
-        last_st = int(response.url.split('&st=')[1])
-        last_page = (last_st // 20) * 20
-        total_pages = (last_st // 20) + 1
-        logger.log(f"Определена последняя страница: {last_page} (всего страниц: {total_pages})")
-        return last_page, total_pages
+        base_url = PLAYTIME_URL.format(realm=realm)
+        if not page_has_characters(session, base_url, 0):
+            logger.error(f"Мир {realm}: первая страница рейтинга пуста")
+            return 0, 0
+        last_index = search_last_page_index(session, base_url)
+        logger.log(f"Мир {realm}: найдена последняя страница: {last_index * 20} (всего страниц: {last_index + 1})")
+        return last_index * 20, last_index + 1
     except Exception as e:
-        logger.log(f"Ошибка получения последней страницы: {str(e)}")
+        logger.error(f"Ошибка получения последней страницы: {str(e)}")
         return 0, 0
 
+class TailTracker:
+    """Отслеживание роста рейтинга во время обхода мира
+    
+    Раз в TAIL_RECHECK_SECONDS (и когда поток доходит до конца своих страниц) проверяется страница
+    за последней; найденные новые страницы дописываются в конец списков страниц потоков. Поток,
+    обошедший свои страницы, ждет остальных (wait_for_pages): обход заканчивается, только когда
+    все потоки дошли до конца и последняя проверка не нашла новых страниц, поэтому рост рейтинга,
+    найденный другим потоком, не теряется.
+    """
+    def __init__(self, session, realm, progress_data):
+        self.session = session
+        self.realm = realm
+        self.base_url = PLAYTIME_URL.format(realm=realm)
+        self.progress_data = progress_data
+        self.lock = threading.Lock()
+        self.checked_at = time.monotonic()
+        # Потоки обхода, их списки страниц растут; idle - дошедшие до конца, done - обход завершен
+        self.streams = {data_type for data_type, pages in progress_data['pages'].items() if pages}
+        self.idle = set()
+        self.done = False
+        self.condition = threading.Condition()
+    
+    def refresh(self, force=False):
+        if not TAIL_RECHECK_SECONDS:
+            return
+        # Плановую проверку пропускаем, если ее уже выполняет другой поток; перед завершением ждем
+        if not self.lock.acquire(blocking=force):
+            return
+        try:
+            if not force and time.monotonic() - self.checked_at < TAIL_RECHECK_SECONDS:
+                return
+            self.checked_at = time.monotonic()
+            last_index = self.progress_data['last_page'] // 20
+            if not page_has_characters(self.session, self.base_url, last_index + 1):
+                return
+            new_last_index = search_last_page_index(self.session, self.base_url, last_index + 1)
+            new_pages = range((last_index + 1) * 20, new_last_index * 20 + 1, 20)
+            with self.condition:
+                if self.done:
+                    return
+                for data_type in self.streams:
+                    self.progress_data['pages'][data_type].extend(new_pages)
+                self.progress_data['last_page'] = new_last_index * 20
+                self.progress_data['total_pages'] = new_last_index + 1
+                self.condition.notify_all()
+            logger.log(f"Мир {self.realm}: рейтинг вырос на {len(new_pages)} стр., последняя страница: {new_last_index * 20}")
+        except Exception as e:
+            logger.warning("Мир %s: ошибка проверки конца рейтинга: %s", self.realm, e)
+        finally:
+            self.lock.release()
+    
+    def wait_for_pages(self, data_type, pages, index):
+        """Вызывается потоком, обошедшим свои страницы. True - в pages появились новые страницы,
+        False - все потоки закончили обход (или скачивание остановлено)"""
+        self.refresh(force=True)
+        with self.condition:
+            self.idle.add(data_type)
+            while len(pages) <= index and not self.done and download_active:
+                if self.idle >= self.streams:
+                    # Последний поток, и проверка конца рейтинга ничего не нашла
+                    self.done = True
+                    self.condition.notify_all()
+                    break
+                self.condition.wait(1)
+            if len(pages) > index:
+                self.idle.discard(data_type)
+                return True
+            return False
+    
+    def finish(self, data_type):
+        """Поток завершился (в том числе с ошибкой): его список страниц больше не пополняется и его не ждут"""
+        with self.condition:
+            self.streams.discard(data_type)
+            self.idle.discard(data_type)
+            self.condition.notify_all()
+
 def download_page_with_retry(session, url, page_number, data_type):
     """Скачивание страницы с повторными попытками"""
     for attempt in range(CONFIG['max_attempts']):
         try:
+            rate_limiter.acquire()
             response = session.get(f"{url}{page_number}", timeout=CONFIG['timeout'])
             if response.status_code == 200:
                 return response
             else:
-                logger.log(f"Поток {data_type}: ошибка {response.status_code} на странице {page_number}, попытка {attempt+1}")
+                logger.warning("Поток %s: ошибка %s на странице %s, попытка %d", data_type, response.status_code, page_number, attempt + 1)
         except Exception as e:
-            logger.log(f"Поток {data_type}: ошибка соединения на странице {page_number}, попытка {attempt+1}: {str(e)}")
+            logger.warning("Поток %s: ошибка соединения на странице %s, попытка %d: %s", data_type, page_number, attempt + 1, e)
         
         if attempt < CONFIG['max_attempts'] - 1:
             time.sleep(CONFIG['retry_delay'])
     
-    logger.log(f"Поток {data_type}: не удалось скачать страницу {page_number} после {CONFIG['max_attempts']} попыток")
+    logger.error(f"Поток {data_type}: не удалось скачать страницу {page_number} после {CONFIG['max_attempts']} попыток")
     return None
 
 def get_delay():
@@ -543,56 +831,92 @@ def download_and_process_thread(base_url, data_type, session, tech_db, progress_
     progress = get_scan_progress(tech_db, data_type)
     start_page = progress['last_page']
     total_characters = progress['char_count']
-    last_page, total_pages = progress_data['last_page'], progress_data['total_pages']
+    # Список страниц может расти во время обхода (TailTracker дописывает новые страницы в конец)
+    pages = progress_data['pages'][data_type]
+    tail_tracker = progress_data['tail_tracker']
+    # Персонажи, сохраненные потоком playtime: поток name их считает, но не пишет (при объединении они отбрасываются)
+    seen_ids = progress_data['seen_ids']
+    skipped_characters = 0
+    index = sum(1 for page in pages if page < start_page)
     
     if progress['status'] == 'completed':
         logger.log(f"Поток {data_type} уже завершен ранее")
+        tail_tracker.finish(data_type)
         return
     
     logger.log(f"Поток {data_type} начинается со страницы {start_page}")
     
     pbar = tqdm(
-        total=total_pages,
-        initial=start_page // 20,
-        desc=f"{data_type:>8}",
-        position=0 if data_type == "playtime" else 1,
+        total=len(pages),
+        initial=index,
+        desc=f"{progress_data['label']}{data_type:>8}",
+        position=progress_data['bar_position'] + (0 if data_type == "playtime" else 1),
         bar_format='{l_bar}{bar}| {n_fmt}/{total_fmt} [{elapsed}<{remaining}]'
     )
     
     current_page = start_page
-    while current_page <= last_page and download_active:
-        response = download_page_with_retry(session, base_url, current_page, data_type)
+    completed = False
+    while download_active:
+        if index >= len(pages):
+            # Перед завершением проверяем конец рейтинга и ждем, пока свои страницы обойдут остальные потоки
+            if not tail_tracker.wait_for_pages(data_type, pages, index):
+                completed = download_active
+                break
+        if pbar.total != len(pages):
+            pbar.total = len(pages)
+            pbar.refresh()
+        
+        current_page = pages[index]
+        with profiler.phase(f'{data_type}.download'):
+            response = download_page_with_retry(session, base_url, current_page, data_type)
         if not response:
-            logger.log(f"Поток {data_type}: КРИТИЧЕСКАЯ ОШИБКА - не удалось скачать страницу {current_page}")
-            save_scan_progress(tech_db, data_type, current_page, total_pages, total_characters, 'error')
+            logger.error(f"Поток {data_type}: КРИТИЧЕСКАЯ ОШИБКА - не удалось скачать страницу {current_page}")
+            save_scan_progress(tech_db, data_type, current_page, progress_data['total_pages'], total_characters, 'error')
             break
         
-        characters, char_count = parse_html_content(response.content)
+        with profiler.phase(f'{data_type}.parse'):
+            characters, char_count = parse_html_content(response.content, current_page)
         if char_count == 0:
-            logger.log(f"Поток {data_type}: КРИТИЧЕСКАЯ ОШИБКА - страница {current_page} не содержит персонажей!")
-            save_scan_progress(tech_db, data_type, current_page, total_pages, total_characters, 'error')
+            logger.error(f"Поток {data_type}: КРИТИЧЕСКАЯ ОШИБКА - страница {current_page} не содержит персонажей!")
+            save_scan_progress(tech_db, data_type, current_page, progress_data['total_pages'], total_characters, 'error')
             break
         
-        saved_count = save_characters_batch(tech_db, data_type, characters, current_page)
-        if saved_count > 0:
-            total_characters += saved_count
-        
-        save_scan_progress(tech_db, data_type, current_page + 20, total_pages, total_characters, 'active')
-        current_page += 20
+        with profiler.phase(f'{data_type}.save'):
+            if data_type == "playtime":
+                saved_count = save_characters_batch(tech_db, data_type, characters)
+                # При частичном сохранении страницу не отмечаем: ее персонажей запишет поток name
+                if saved_count == len(characters):
+                    seen_ids.update(characters.columns[0])
+            else:
+                new_characters = characters.exclude(seen_ids)
+                skipped_characters += len(characters) - len(new_characters)
+                total_characters += len(characters) - len(new_characters)
+                saved_count = save_characters_batch(tech_db, data_type, new_characters)
+            if saved_count > 0:
+                total_characters += saved_count
+            
+            save_scan_progress(tech_db, data_type, current_page + 20, progress_data['total_pages'], total_characters, 'active')
+        logger.debug("Поток %s: страница %d, персонажей %d, сохранено %d", data_type, current_page, char_count, saved_count)
+        index += 1
         pbar.update(1)
+        tail_tracker.refresh()
         
         delay = get_delay()
         if delay > 0:
-            time.sleep(delay)
+            with profiler.phase(f'{data_type}.delay'):
+                time.sleep(delay)
     
-    if current_page > last_page:
+    if completed:
         status = 'completed'
         logger.log(f"Поток {data_type} УСПЕШНО ЗАВЕРШЕН")
     else:
         status = 'stopped' if download_active else 'interrupted'
         logger.log(f"Поток {data_type} ОСТАНОВЛЕН")
+    if skipped_characters:
+        logger.log(f"Поток {data_type}: пропущено {skipped_characters} персонажей, уже сохраненных потоком playtime")
     
-    save_scan_progress(tech_db, data_type, min(current_page, last_page), total_pages, total_characters, status)
+    tail_tracker.finish(data_type)
+    save_scan_progress(tech_db, data_type, min(current_page, progress_data['last_page']), progress_data['total_pages'], total_characters, status)
     pbar.close()
 
 def signal_handler(sig, frame):
@@ -603,6 +927,123 @@ def signal_handler(sig, frame):
 
 # ==================== ОСНОВНАЯ ФУНКЦИЯ ====================
 
+def create_sessions():
+    """Загрузка cookies и создание HTTP-сессий для потоков каждого мира
+
+    Возвращает {мир: (session1, session2)} или None.
+    """
+    cookies_dict = load_cookies_from_file(COOKIES_FILE)
+    if not cookies_dict:
+        logger.error("ОШИБКА: Не удалось загрузить cookies!")
+        return None
+    sessions = {}
+    for realm in REALMS:
+        session1 = initialize_session(cookies_dict)
+        session2 = initialize_session(cookies_dict) if not PLAYTIME_ONLY else None
+        sessions[realm] = (session1, session2)
+    return sessions
+
+def scan_realm(realm, realm_sessions, suffix, bar_position, results):
+    """Сканирование одного мира: свои техническая и финальная базы, потоки скачивания и объединение"""
+    session1, session2 = realm_sessions
+    thread_suffix = f"_r{realm}" if len(REALMS) > 1 else ""
+    
+    # Инициализация баз данных
+    with profiler.phase('init_databases'):
+        tech_db = init_technical_db(suffix)
+        final_db = init_final_db(suffix)
+    
+    # Определение последней страницы
+    logger.log(f"Мир {realm}: определение количества страниц...")
+    with profiler.phase('get_last_page'):
+        last_page, total_pages = get_last_page(session1, realm)
+    if last_page == 0:
+        logger.error(f"ОШИБКА: Не удалось определить количество страниц мира {realm}!")
+        return
+    
+    # План обхода: все страницы или выборочно по свежести в пределах REVISIT_BUDGET
+    all_pages = list(range(0, last_page + 1, 20))
+    pages = {'playtime': all_pages, 'name': list(all_pages) if not PLAYTIME_ONLY else []}
+    base_db = None
+    if REVISIT_BUDGET:
+        with profiler.phase('plan_revisits'):
+            history = history_databases(CONFIG['bases_folder'], realm if thread_suffix else None, exclude=(final_db,))
+            plan = plan_revisits(history, total_pages, REVISIT_BUDGET)
+        for line in describe_plan(plan):
+            logger.log(f"Мир {realm}: {line}")
+        if not plan['full']:
+            # Персонажи, сместившиеся между страницами, остаются из прошлой базы, поэтому поток name не нужен
+            pages = {'playtime': plan['pages'], 'name': []}
+            base_db = plan['base_db']
+    
+    progress_data = {'last_page': last_page, 'total_pages': total_pages, 'pages': pages,
+                     'bar_position': bar_position, 'label': f"r{realm} " if thread_suffix else ""}
+    progress_data['tail_tracker'] = TailTracker(session1, realm, progress_data)
+    progress_data['seen_ids'] = load_saved_ez_ids(tech_db, 'playtime')
+    
+    # Запуск потоков
+    threads = []
+    playtime_thread = threading.Thread(
+        target=profiler.run_profiled,
+        args=(download_and_process_thread, PLAYTIME_URL.format(realm=realm), "playtime", session1, tech_db, progress_data),
+        name=f"Playtime_Thread{thread_suffix}"
+    )
+    threads.append(playtime_thread)
+    
+    if pages['name']:
+        name_thread = threading.Thread(
+            target=profiler.run_profiled,
+            args=(download_and_process_thread, NAME_URL.format(realm=realm), "name", session2, tech_db, progress_data),
+            name=f"Name_Thread{thread_suffix}"
+        )
+        threads.append(name_thread)
+    
+    with profiler.phase('crawl'):
+        for thread in threads:
+            thread.start()
+        
+        for thread in threads:
+            thread.join()
+    
+    # Объединение данных
+    logger.log("\n" + "=" * 60)
+    logger.log(f"НАЧИНАЕМ ОБЪЕДИНЕНИЕ ДАННЫХ (мир {realm})")
+    logger.log("=" * 60)
+    
+    with profiler.phase('merge_databases'):
+        total_final = merge_databases(tech_db, final_db, base_db)
+    logger.log(f'Техническая база: {tech_db}')
+    results[realm] = (final_db, total_final)
+
+def run_scan(sessions):
+    """Один цикл сканирования всех миров из REALMS (одновременно, под общим лимитом запросов)
+
+    Возвращает список (мир, путь к финальной базе, количество персонажей) для успешно
+    отсканированных миров в порядке REALMS; пустой список при ошибке.
+    """
+    global rate_limiter
+    
+    rate_limiter = RateLimiter(REQUESTS_PER_SECOND)
+    # Общая метка времени, чтобы базы всех миров одного запуска находились вместе
+    tag = datetime.now().strftime('%y%m%d_%H%M')
+    results = {}
+    if len(REALMS) == 1:
+        scan_realm(REALMS[0], sessions[REALMS[0]], database_suffix(tag, REALMS[0]), 0, results)
+    else:
+        realm_threads = [
+            threading.Thread(
+                target=scan_realm,
+                args=(realm, sessions[realm], database_suffix(tag, realm), index * 2, results),
+                name=f"Realm_{realm}"
+            )
+            for index, realm in enumerate(REALMS)
+        ]
+        for thread in realm_threads:
+            thread.start()
+        for thread in realm_threads:
+            thread.join()
+    return [(realm, *results[realm]) for realm in REALMS if realm in results]
+
 def main():
     """Основная функция"""
     global download_active
@@ -622,61 +1063,20 @@ def main():
     logger.log('ЗАПУСК ПРЯМОГО ПАРСЕРА (ПАМЯТЬ → БАЗА)')
     logger.log(f'Дата: {date.today().strftime("%Y.%m.%d")}')
     logger.log(f'Режим PLAYTIME_ONLY: {"ДА" if PLAYTIME_ONLY else "НЕТ"}')
+    logger.log(f'Миры: {", ".join(str(realm) for realm in REALMS)}')
+    if profiler.enabled:
+        logger.log('Профилирование: ВКЛЮЧЕНО')
     logger.log('=' * 60)
     
     try:
-        # Инициализация баз данных
-        tech_db = init_technical_db()
-        final_db = init_final_db()
-        
-        # Загрузка cookies
-        cookies_dict = load_cookies_from_file(COOKIES_FILE)
-        if not cookies_dict:
-            logger.log("ОШИБКА: Не удалось загрузить cookies!")
-            return
-        
         # Инициализация сессий
-        session1 = initialize_session(cookies_dict)
-        session2 = initialize_session(cookies_dict) if not PLAYTIME_ONLY else None
-        
-        # Определение последней страницы
-        logger.log("Определение количества страниц...")
-        last_page, total_pages = get_last_page(session1)
-        if last_page == 0:
-            logger.log("ОШИБКА: Не удалось определить количество страниц!")
+        sessions = create_sessions()
+        if not sessions:
             return
         
-        progress_data = {'last_page': last_page, 'total_pages': total_pages}
-        
-        # Запуск потоков
-        threads = []
-        playtime_thread = threading.Thread(
-            target=download_and_process_thread,
-            args=(PLAYTIME_URL, "playtime", session1, tech_db, progress_data),
-            name="Playtime_Thread"
-        )
-        threads.append(playtime_thread)
-        
-        if not PLAYTIME_ONLY:
-            name_thread = threading.Thread(
-                target=download_and_process_thread,
-                args=(NAME_URL, "name", session2, tech_db, progress_data),
-                name="Name_Thread"
-            )
-            threads.append(name_thread)
-        
-        for thread in threads:
-            thread.start()
-        
-        for thread in threads:
-            thread.join()
-        
-        # Объединение данных
-        logger.log("\n" + "=" * 60)
-        logger.log("НАЧИНАЕМ ОБЪЕДИНЕНИЕ ДАННЫХ")
-        logger.log("=" * 60)
-        
-        total_final = merge_databases(tech_db, final_db)
+        results = profiler.run_profiled(run_scan, sessions)
+        if not results:
+            return
         
         # Итоговая статистика
         total_duration = time.time() - start_time
@@ -686,15 +1086,21 @@ def main():
         logger.log('=' * 60)
         logger.log('РАБОТА ЗАВЕРШЕНА')
         logger.log(f'Общее время: {minutes:02d}:{seconds:02d}')
-        logger.log(f'Итоговых персонажей: {total_final}')
-        logger.log(f'Техническая база: {tech_db}')
-        logger.log(f'Финальная база: {final_db}')
+        logger.log(f'Итоговых персонажей: {sum(total for _, _, total in results)}')
+        for realm, final_db, total_final in results:
+            logger.log(f'Финальная база мира {realm}: {final_db} ({total_final} персонажей)')
         logger.log('=' * 60)
         
     except Exception as e:
-        logger.log(f'КРИТИЧЕСКАЯ ОШИБКА: {str(e)}')
+        logger.error(f'КРИТИЧЕСКАЯ ОШИБКА: {str(e)}')
         import traceback
-        logger.log(traceback.format_exc())
+        logger.error(traceback.format_exc())
+    finally:
+        profile_path = profiler.save(CONFIG['logs_folder'])
+        if profile_path:
+            logger.log(f'Отчет профилирования: {profile_path}')
 
 if __name__ == "__main__":
+    profiler.enabled = '--profile' in sys.argv
+    profiler.start()
     main()
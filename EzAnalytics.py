@@ -0,0 +1,365 @@
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import time
+from datetime import datetime
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# ==================== КОНФИГУРАЦИЯ ====================
+BASES_FOLDER = 'BASES'
+ANALYTICS_FOLDER = 'ANALYTICS'  # Колоночные выгрузки: ANALYTICS/<имя базы>/<колонка>.npy
+OUTPUT_FOLDER = 'LOGS'
+EXPORT_BATCH = 50000            # Строк за одно чтение из SQLite при выгрузке
+
+# Числовые колонки таблицы characters и их типы в выгрузке
+NUMERIC_COLUMNS = {
+    'ez_id': 'int64',
+    'level': 'int16',
+    'gs': 'int32',
+    'ilvl': 'int32',
+    'kills': 'int64',
+    'ap': 'int64',
+    'playtime': 'int64',
+    'pers_online': 'bool',
+    'forum_online': 'bool',
+}
+# Строковые колонки хранятся словарем: <колонка>.npy - коды, <колонка>.dict.json - отсортированные значения
+STRING_COLUMNS = ('forum_name', 'name', 'class', 'race', 'guild')
+
+# Параметры отчета
+GS_LEVEL = 80            # GS-статистика считается по персонажам этого уровня и выше (None - по всем)
+GS_BIN_WIDTH = 500       # Ширина корзины гистограммы GS
+LEVEL_BINS = [1, 10, 20, 30, 40, 50, 60, 70, 80]  # Левые границы корзин гистограммы уровней
+PERCENTILES = (50, 90, 99)
+TOP_GUILDS = 20
+TOP_ACCOUNTS = 20
+GUILD_MIN_MEMBERS = 10   # Минимум персонажей с GS для рейтинга гильдий по среднему GS
+
+
+def require_numpy():
+    if np is None:
+        print("Ошибка: для аналитики нужен пакет numpy (pip install numpy)")
+        return False
+    return True
+
+# ==================== ВЫГРУЗКА ====================
+
+def snapshot_folder(db_path):
+    """Папка колоночной выгрузки для базы"""
+    return os.path.join(ANALYTICS_FOLDER, os.path.splitext(os.path.basename(db_path))[0])
+
+
+def is_exported(db_path):
+    """Есть ли актуальная выгрузка (время изменения базы совпадает с записанным при выгрузке)"""
+    meta_path = os.path.join(snapshot_folder(db_path), 'meta.json')
+    if not os.path.exists(meta_path):
+        return False
+    with open(meta_path, 'r', encoding='utf-8') as f:
+        meta = json.load(f)
+    return meta.get('source_mtime') == os.path.getmtime(db_path)
+
+
+def export_database(db_path, force=False):
+    """Выгружает таблицу characters в колоночный формат NumPy, читая базу пачками
+
+    Строки кодируются словарем (коды int32 в порядке сортировки значений), NULL
+    становится 0 или пустой строкой. Выгрузка пишется во временную папку и
+    подменяет старую целиком. Возвращает путь к папке выгрузки.
+    """
+    folder = snapshot_folder(db_path)
+    if not force and is_exported(db_path):
+        return folder
+
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    cursor.execute("SELECT COUNT(*) FROM characters")
+    total = cursor.fetchone()[0]
+
+    numeric = {column: np.zeros(total, dtype=dtype) for column, dtype in NUMERIC_COLUMNS.items()}
+    codes = {column: np.zeros(total, dtype=np.int32) for column in STRING_COLUMNS}
+    dictionaries = {column: {} for column in STRING_COLUMNS}
+
+    columns = list(NUMERIC_COLUMNS) + list(STRING_COLUMNS)
+    cursor.execute(f"SELECT {', '.join(columns)} FROM characters ORDER BY ez_id")
+    offset = 0
+    while True:
+        rows = cursor.fetchmany(EXPORT_BATCH)
+        if not rows:
+            break
+        batch = list(zip(*rows))
+        end = offset + len(rows)
+        for index, column in enumerate(NUMERIC_COLUMNS):
+            numeric[column][offset:end] = [value or 0 for value in batch[index]]
+        for index, column in enumerate(STRING_COLUMNS, start=len(NUMERIC_COLUMNS)):
+            dictionary = dictionaries[column]
+            codes[column][offset:end] = [dictionary.setdefault(value or '', len(dictionary)) for value in batch[index]]
+        offset = end
+    conn.close()
+
+    tmp_folder = folder + '.tmp'
+    shutil.rmtree(tmp_folder, ignore_errors=True)
+    os.makedirs(tmp_folder)
+    for column, values in numeric.items():
+        np.save(os.path.join(tmp_folder, f'{column}.npy'), values[:offset])
+    for column in STRING_COLUMNS:
+        # Перенумерация кодов в порядке сортировки значений: коды можно сравнивать как строки
+        values = list(dictionaries[column])
+        order = sorted(range(len(values)), key=values.__getitem__)
+        rank = np.empty(len(values), dtype=np.int32)
+        rank[order] = np.arange(len(values), dtype=np.int32)
+        np.save(os.path.join(tmp_folder, f'{column}.npy'), rank[codes[column][:offset]] if values else codes[column][:offset])
+        with open(os.path.join(tmp_folder, f'{column}.dict.json'), 'w', encoding='utf-8') as f:
+            json.dump([values[i] for i in order], f, ensure_ascii=False)
+    with open(os.path.join(tmp_folder, 'meta.json'), 'w', encoding='utf-8') as f:
+        json.dump({'source': os.path.basename(db_path), 'source_mtime': os.path.getmtime(db_path),
+                   'rows': offset, 'exported_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S')}, f, ensure_ascii=False)
+
+    shutil.rmtree(folder, ignore_errors=True)
+    os.replace(tmp_folder, folder)
+    return folder
+
+
+def load_snapshot(folder):
+    """Открывает выгрузку: массивы отображаются в память (mmap), словари читаются целиком"""
+    snapshot = {}
+    for column in list(NUMERIC_COLUMNS) + list(STRING_COLUMNS):
+        snapshot[column] = np.load(os.path.join(folder, f'{column}.npy'), mmap_mode='r')
+    for column in STRING_COLUMNS:
+        with open(os.path.join(folder, f'{column}.dict.json'), 'r', encoding='utf-8') as f:
+            snapshot[f'{column}_dict'] = json.load(f)
+    with open(os.path.join(folder, 'meta.json'), 'r', encoding='utf-8') as f:
+        snapshot['meta'] = json.load(f)
+    return snapshot
+
+# ==================== ВЕКТОРНЫЕ АГРЕГАТЫ ====================
+
+def group_percentiles(groups, values, group_count, percentiles=PERCENTILES):
+    """Перцентили values внутри каждой группы (линейная интерполяция, как np.percentile)
+
+    Одна сортировка по (группа, значение) вместо цикла по группам. Пустые группы - NaN.
+    """
+    order = np.lexsort((values, groups))
+    sorted_values = np.asarray(values)[order].astype(np.float64)
+    counts = np.bincount(groups, minlength=group_count)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    last = np.maximum(counts - 1, 0)
+    result = {}
+    for q in percentiles:
+        position = q / 100 * last
+        low = np.floor(position).astype(np.int64)
+        high = np.minimum(low + 1, last)
+        weight = position - low
+        if len(sorted_values):
+            # Пустые группы в конце указывают за край массива: их значения все равно заменяются на NaN
+            tail = len(sorted_values) - 1
+            value = (sorted_values[np.minimum(starts + low, tail)] * (1 - weight)
+                     + sorted_values[np.minimum(starts + high, tail)] * weight)
+        else:
+            value = np.zeros(group_count)
+        result[q] = np.where(counts > 0, value, np.nan)
+    return result
+
+
+def group_histogram(groups, values, bins, group_count):
+    """Гистограмма values для каждой группы: массив [группа, корзина] через один bincount"""
+    bin_index = np.clip(np.searchsorted(bins, values, side='right') - 1, 0, len(bins) - 1)
+    flat = np.bincount(groups.astype(np.int64) * len(bins) + bin_index, minlength=group_count * len(bins))
+    return flat.reshape(group_count, len(bins))
+
+
+def summarize_groups(snapshot, column, gs_mask, gs_bins):
+    """Количество, гистограммы уровней и GS, перцентили и средний GS для всех значений колонки"""
+    groups = np.asarray(snapshot[column])
+    group_count = len(snapshot[f'{column}_dict'])
+    level = np.asarray(snapshot['level'])
+    gs = np.asarray(snapshot['gs'])
+    gs_groups, gs_values = groups[gs_mask], gs[gs_mask]
+    gs_counts = np.bincount(gs_groups, minlength=group_count)
+    gs_sums = np.bincount(gs_groups, weights=gs_values, minlength=group_count)
+    return {
+        'count': np.bincount(groups, minlength=group_count),
+        'level_hist': group_histogram(groups, level, LEVEL_BINS, group_count),
+        'gs_count': gs_counts,
+        'gs_mean': np.divide(gs_sums, gs_counts, out=np.full(group_count, np.nan), where=gs_counts > 0),
+        'gs_hist': group_histogram(gs_groups, gs_values, gs_bins, group_count),
+        'gs_percentiles': group_percentiles(gs_groups, gs_values, group_count),
+    }
+
+
+def group_rows(snapshot, column, summary, indexes):
+    """Строки отчета для выбранных значений колонки"""
+    names = snapshot[f'{column}_dict']
+    rows = []
+    for i in indexes:
+        rows.append({
+            column: names[i],
+            'count': int(summary['count'][i]),
+            'level_hist': summary['level_hist'][i].tolist(),
+            'gs_count': int(summary['gs_count'][i]),
+            'gs_mean': None if np.isnan(summary['gs_mean'][i]) else round(float(summary['gs_mean'][i]), 1),
+            'gs_hist': summary['gs_hist'][i].tolist(),
+            'gs_percentiles': {str(q): None if np.isnan(values[i]) else round(float(values[i]), 1)
+                               for q, values in summary['gs_percentiles'].items()},
+        })
+    return rows
+
+
+def top_indexes(keys, count, exclude=None):
+    """Индексы count наибольших значений (argpartition + сортировка только отобранных)"""
+    keys = np.asarray(keys, dtype=np.float64).copy()
+    if exclude is not None:
+        keys[exclude] = -np.inf
+    keys[np.isnan(keys)] = -np.inf
+    count = min(count, int(np.isfinite(keys).sum()))
+    if count <= 0:
+        return []
+    candidates = np.argpartition(-keys, count - 1)[:count]
+    return candidates[np.argsort(-keys[candidates], kind='stable')].tolist()
+
+
+def build_report(snapshot):
+    """Полный отчет по одной выгрузке"""
+    level = np.asarray(snapshot['level'])
+    gs = np.asarray(snapshot['gs'])
+    gs_mask = gs > 0
+    if GS_LEVEL is not None:
+        gs_mask &= level >= GS_LEVEL
+    gs_max = int(gs[gs_mask].max()) if gs_mask.any() else 0
+    gs_bins = list(range(0, gs_max + GS_BIN_WIDTH, GS_BIN_WIDTH))
+
+    report = {
+        'source': snapshot['meta']['source'],
+        'characters': int(len(level)),
+        'accounts': len(snapshot['forum_name_dict']) - (1 if '' in snapshot['forum_name_dict'] else 0),
+        'guilds': len(snapshot['guild_dict']) - (1 if '' in snapshot['guild_dict'] else 0),
+        'level_bins': LEVEL_BINS,
+        'gs_bins': gs_bins,
+        'gs_level': GS_LEVEL,
+    }
+    for column in ('class', 'race'):
+        summary = summarize_groups(snapshot, column, gs_mask, gs_bins)
+        report[column] = group_rows(snapshot, column, summary, range(len(snapshot[f'{column}_dict'])))
+
+    # Пустая строка в словаре - персонажи без гильдии/аккаунта, в рейтинги не попадает
+    guild_summary = summarize_groups(snapshot, 'guild', gs_mask, gs_bins)
+    no_guild = snapshot['guild_dict'].index('') if '' in snapshot['guild_dict'] else None
+    report['top_guilds_by_members'] = group_rows(snapshot, 'guild', guild_summary,
+                                                 top_indexes(guild_summary['count'], TOP_GUILDS, no_guild))
+    small = guild_summary['gs_count'] < GUILD_MIN_MEMBERS
+    if no_guild is not None:
+        small[no_guild] = True
+    report['top_guilds_by_gs'] = group_rows(snapshot, 'guild', guild_summary,
+                                            top_indexes(guild_summary['gs_mean'], TOP_GUILDS, small))
+
+    account_summary = summarize_groups(snapshot, 'forum_name', gs_mask, gs_bins)
+    no_account = snapshot['forum_name_dict'].index('') if '' in snapshot['forum_name_dict'] else None
+    report['top_accounts_by_characters'] = group_rows(snapshot, 'forum_name', account_summary,
+                                                      top_indexes(account_summary['count'], TOP_ACCOUNTS, no_account))
+    return report
+
+
+def history_report(folders):
+    """Сводка по нескольким выгрузкам: изменение общих показателей от снимка к снимку"""
+    history = []
+    for folder in folders:
+        snapshot = load_snapshot(folder)
+        level = np.asarray(snapshot['level'])
+        gs = np.asarray(snapshot['gs'])
+        gs_mask = gs > 0
+        if GS_LEVEL is not None:
+            gs_mask &= level >= GS_LEVEL
+        history.append({
+            'source': snapshot['meta']['source'],
+            'characters': int(len(level)),
+            'max_level': int((level >= 80).sum()),
+            'gs_median': round(float(np.median(gs[gs_mask])), 1) if gs_mask.any() else None,
+            'gs_p90': round(float(np.percentile(gs[gs_mask], 90)), 1) if gs_mask.any() else None,
+        })
+    return history
+
+# ==================== ВЫВОД ====================
+
+def print_report(report, elapsed_ms):
+    """Выводит основные таблицы отчета"""
+    print("=" * 90)
+    print(f"База: {report['source']}  персонажей: {report['characters']}, аккаунтов: {report['accounts']}, "
+          f"гильдий: {report['guilds']}  (расчет {elapsed_ms:.1f} мс)")
+    gs_title = f"GS (ур. {report['gs_level']}+)" if report['gs_level'] else "GS"
+    for column, title in (('class', 'Класс'), ('race', 'Раса')):
+        print("-" * 90)
+        print(f"{title:<16}{'Персонажей':>12}{gs_title + ', кол-во':>22}{'Среднее':>10}"
+              + "".join(f"{'p' + str(q):>8}" for q in PERCENTILES))
+        for row in sorted(report[column], key=lambda r: -r['count']):
+            print(f"{row[column] or '-':<16}{row['count']:>12}{row['gs_count']:>22}{row['gs_mean'] or 0:>10}"
+                  + "".join(f"{row['gs_percentiles'][str(q)] or 0:>8}" for q in PERCENTILES))
+    print("-" * 90)
+    print(f"{'Гильдия (по составу)':<32}{'Персонажей':>12}{'Ср. GS':>10}   "
+          f"{'Гильдия (по ср. GS)':<32}{'Ср. GS':>10}")
+    for left, right in zip(report['top_guilds_by_members'] + [None] * TOP_GUILDS,
+                           report['top_guilds_by_gs'] + [None] * TOP_GUILDS):
+        if not left and not right:
+            break
+        line = f"{left['guild'][:31]:<32}{left['count']:>12}{left['gs_mean'] or 0:>10}   " if left else " " * 57
+        if right:
+            line += f"{right['guild'][:31]:<32}{right['gs_mean']:>10}"
+        print(line)
+    print("=" * 90)
+
+
+def print_history(history):
+    print(f"{'Снимок':<36}{'Персонажей':>12}{'80 ур.':>10}{'Медиана GS':>12}{'p90 GS':>10}")
+    for row in history:
+        print(f"{row['source']:<36}{row['characters']:>12}{row['max_level']:>10}"
+              f"{row['gs_median'] or 0:>12}{row['gs_p90'] or 0:>10}")
+
+
+def final_databases():
+    """Все финальные базы в BASES по времени изменения"""
+    if not os.path.isdir(BASES_FOLDER):
+        return []
+    paths = [os.path.join(BASES_FOLDER, file) for file in os.listdir(BASES_FOLDER)
+             if file.startswith('ezbase_final_') and file.endswith('.db')]
+    return sorted(paths, key=os.path.getmtime)
+
+
+def main():
+    """Выгрузка последней (или указанной) финальной базы и отчет; --all - выгрузка всех баз и история"""
+    if not require_numpy():
+        return
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    if '--all' in sys.argv:
+        db_paths = final_databases()
+    elif args:
+        db_paths = args
+    else:
+        db_paths = final_databases()[-1:]
+    if not db_paths:
+        print("Ошибка: Файл базы данных не найден!")
+        return
+
+    start = time.perf_counter()
+    folders = [export_database(db_path) for db_path in db_paths]
+    print(f"Выгрузок: {len(folders)} ({(time.perf_counter() - start) * 1000:.0f} мс, папка {ANALYTICS_FOLDER})")
+
+    start = time.perf_counter()
+    report = build_report(load_snapshot(folders[-1]))
+    print_report(report, (time.perf_counter() - start) * 1000)
+    if len(folders) > 1:
+        report['history'] = history_report(folders)
+        print_history(report['history'])
+
+    os.makedirs(OUTPUT_FOLDER, exist_ok=True)
+    report_path = os.path.join(OUTPUT_FOLDER, f"EzAnalytics_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    with open(report_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"Отчет сохранен: {report_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+import json
+import os
+import sqlite3
+import sys
+import time
+from collections import Counter
+
+# ==================== КОНФИГУРАЦИЯ ====================
+BASES_FOLDER = 'BASES'
+OUTPUT_FOLDER = 'LOGS'
+FETCH_BATCH = 20000       # Строк за одно чтение из каждой базы
+GS_JUMP_THRESHOLD = 200   # Изменение GS меньше порога не считается скачком
+
+# Сравниваемые поля (онлайн, дата сканирования и источник меняются каждый запуск и не сравниваются)
+DIFF_FIELDS = ('forum_name', 'name', 'level', 'gs', 'class', 'race', 'guild')
+
+# Тип изменения для каждого поля
+FIELD_CHANGES = {
+    'forum_name': 'account_relink',
+    'name': 'renamed',
+    'class': 'class_change',
+    'race': 'race_change',
+    'guild': 'guild_change',
+}
+
+
+def iterate_characters(db_path):
+    """Персонажи базы по возрастанию ez_id, пачками (ez_id - INTEGER PRIMARY KEY, сортировка бесплатна)"""
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        cursor = conn.execute(f"SELECT ez_id, {', '.join(DIFF_FIELDS)} FROM characters ORDER BY ez_id")
+        while True:
+            rows = cursor.fetchmany(FETCH_BATCH)
+            if not rows:
+                break
+            yield from rows
+    finally:
+        conn.close()
+
+
+def character_changes(old, new):
+    """Изменения одного персонажа между снимками (может быть несколько)"""
+    ez_id, name = new[0], new[2]
+    changes = []
+    for index, field in enumerate(DIFF_FIELDS, start=1):
+        before, after = old[index], new[index]
+        if before == after:
+            continue
+        if field == 'level':
+            change_type = 'level_up' if (after or 0) > (before or 0) else 'level_down'
+        elif field == 'gs':
+            if abs((after or 0) - (before or 0)) < GS_JUMP_THRESHOLD:
+                continue
+            change_type = 'gs_jump'
+        else:
+            change_type = FIELD_CHANGES[field]
+        changes.append({'type': change_type, 'ez_id': ez_id, 'name': name, 'from': before, 'to': after})
+    return changes
+
+
+def snapshot_record(row):
+    return dict(zip(('ez_id',) + DIFF_FIELDS, row))
+
+
+def diff_snapshots(old_db, new_db, counts=None):
+    """Слияние двух баз, отсортированных по ez_id: генератор изменений, в памяти по одной пачке каждой базы
+
+    counts (Counter) получает количество изменений по типам, а также old/new/unchanged.
+    """
+    counts = counts if counts is not None else Counter()
+    old_rows, new_rows = iterate_characters(old_db), iterate_characters(new_db)
+    old, new = next(old_rows, None), next(new_rows, None)
+    while old is not None or new is not None:
+        if new is None or (old is not None and old[0] < new[0]):
+            counts['old'] += 1
+            counts['deleted'] += 1
+            yield {'type': 'deleted', **snapshot_record(old)}
+            old = next(old_rows, None)
+        elif old is None or new[0] < old[0]:
+            counts['new'] += 1
+            counts['added'] += 1
+            yield {'type': 'added', **snapshot_record(new)}
+            new = next(new_rows, None)
+        else:
+            counts['old'] += 1
+            counts['new'] += 1
+            changes = character_changes(old, new) if old != new else None
+            if changes:
+                counts['changed'] += 1
+                for change in changes:
+                    counts[change['type']] += 1
+                    yield change
+            else:
+                counts['unchanged'] += 1
+            old, new = next(old_rows, None), next(new_rows, None)
+
+
+def write_diff(old_db, new_db, output_folder=OUTPUT_FOLDER):
+    """Пишет изменения в JSONL (одно изменение в строке) и сводку в JSON, возвращает сводку"""
+    start = time.perf_counter()
+    os.makedirs(output_folder, exist_ok=True)
+    old_name = os.path.splitext(os.path.basename(old_db))[0]
+    new_name = os.path.splitext(os.path.basename(new_db))[0]
+    changes_path = os.path.join(output_folder, f"EzDiff_{old_name}__{new_name}.jsonl")
+    counts = Counter()
+    with open(changes_path, 'w', encoding='utf-8') as f:
+        for change in diff_snapshots(old_db, new_db, counts):
+            f.write(json.dumps(change, ensure_ascii=False))
+            f.write('\n')
+    summary = {
+        'old': os.path.basename(old_db),
+        'new': os.path.basename(new_db),
+        'gs_jump_threshold': GS_JUMP_THRESHOLD,
+        'counts': dict(sorted(counts.items())),
+        'changes_file': changes_path,
+        'seconds': round(time.perf_counter() - start, 3),
+    }
+    with open(os.path.join(output_folder, f"EzDiff_{old_name}__{new_name}.json"), 'w', encoding='utf-8') as f:
+        json.dump(summary, f, ensure_ascii=False, indent=2)
+    return summary
+
+
+def print_summary(summary):
+    counts = summary['counts']
+    print("=" * 60)
+    print(f"{summary['old']} → {summary['new']} ({summary['seconds']} с)")
+    print(f"Персонажей: было {counts.get('old', 0)}, стало {counts.get('new', 0)}, "
+          f"без изменений {counts.get('unchanged', 0)}")
+    for change_type in ('added', 'deleted', 'level_up', 'level_down', 'gs_jump', 'guild_change',
+                        'account_relink', 'renamed', 'class_change', 'race_change'):
+        print(f"  {change_type:<16}{counts.get(change_type, 0):>10}")
+    print(f"Изменения: {summary['changes_file']}")
+    print("=" * 60)
+
+
+def latest_final_databases(count=2, realm=None):
+    """count последних финальных баз в BASES, от старой к новой (realm - только базы мира, *_r<номер>.db)"""
+    if not os.path.isdir(BASES_FOLDER):
+        return []
+    ending = f'_r{realm}.db' if realm is not None else '.db'
+    paths = [os.path.join(BASES_FOLDER, file) for file in os.listdir(BASES_FOLDER)
+             if file.startswith('ezbase_final_') and file.endswith(ending)]
+    return sorted(paths, key=os.path.getmtime)[-count:]
+
+
+def main():
+    """Сравнение двух финальных баз: указанных аргументами или двух последних в BASES"""
+    db_paths = sys.argv[1:3] if len(sys.argv) > 2 else latest_final_databases()
+    if len(db_paths) < 2:
+        print("Ошибка: для сравнения нужны две финальные базы")
+        return
+    print_summary(write_diff(*db_paths))
+
+
+if __name__ == "__main__":
+    main()
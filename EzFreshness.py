@@ -0,0 +1,206 @@
+import math
+import os
+import sqlite3
+import sys
+from datetime import datetime
+
+# ==================== КОНФИГУРАЦИЯ ====================
+BASES_FOLDER = 'BASES'
+PAGE_SIZE = 20              # Персонажей на странице рейтинга (шаг параметра st=)
+HISTORY_SIZE = 5            # Сколько последних финальных баз мира использовать для оценки частоты изменений
+PRIOR_WEIGHT = 50           # Вес априорной оценки (персонажо-часов): при малой истории страница оценивается по онлайну
+MAX_RECORD_AGE_HOURS = 168  # Если самая старая запись базы старше, назначается полный обход (None - никогда)
+
+# Изменение этих полей считается изменением персонажа (онлайн меняется постоянно и сам по себе не считается)
+CHANGE_FIELDS = ('forum_name', 'name', 'level', 'gs', 'class', 'race', 'guild')
+
+# Страница рейтинга по времени игры (st=) по позиции персонажа (колонка playtime, начиная с 1)
+PAGE_EXPRESSION = f"((n.playtime - 1) / {PAGE_SIZE}) * {PAGE_SIZE}"
+
+
+def history_databases(bases_folder=BASES_FOLDER, realm=None, exclude=(), count=HISTORY_SIZE):
+    """count последних непустых финальных баз (от старой к новой), realm - только базы мира *_r<номер>.db"""
+    if not os.path.isdir(bases_folder):
+        return []
+    ending = f'_r{realm}.db' if realm is not None else '.db'
+    excluded = {os.path.abspath(path) for path in exclude}
+    paths = []
+    for file in os.listdir(bases_folder):
+        path = os.path.join(bases_folder, file)
+        if file.startswith('ezbase_final_') and file.endswith(ending) and os.path.abspath(path) not in excluded:
+            paths.append(path)
+    result = []
+    for path in sorted(paths, key=os.path.getmtime, reverse=True):
+        try:
+            conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+            has_rows = conn.execute("SELECT 1 FROM characters LIMIT 1").fetchone() is not None
+            conn.close()
+        except sqlite3.Error:
+            continue
+        if has_rows:
+            result.append(path)
+        if len(result) == count:
+            break
+    return result[::-1]
+
+
+def observed_changes(old_db, new_db):
+    """Наблюдения за изменениями между двумя снимками, сгруппированные по странице и онлайну
+
+    Учитываются только персонажи, перепроверенные в новом снимке (scan_date изменилась), и новые
+    персонажи. Возвращает строки (страница, онлайн в старом снимке, изменений, персонажо-часов).
+    """
+    conn = sqlite3.connect(':memory:')
+    try:
+        conn.execute("ATTACH DATABASE ? AS old", (old_db,))
+        conn.execute("ATTACH DATABASE ? AS new", (new_db,))
+        old_scan = conn.execute("SELECT MAX(scan_date) FROM old.characters").fetchone()[0]
+        changed = " OR ".join(f"n.{field} IS NOT o.{field}" for field in CHANGE_FIELDS)
+        return conn.execute(f"""
+        SELECT {PAGE_EXPRESSION} AS page,
+               COALESCE(o.pers_online OR o.forum_online, 0) AS online,
+               SUM(CASE WHEN o.ez_id IS NULL OR {changed} THEN 1 ELSE 0 END),
+               SUM((julianday(n.scan_date) - julianday(COALESCE(o.scan_date, ?))) * 24)
+        FROM new.characters n LEFT JOIN old.characters o ON o.ez_id = n.ez_id
+        WHERE n.source = 'playtime' AND n.playtime IS NOT NULL
+          AND (o.ez_id IS NULL OR n.scan_date != o.scan_date)
+        GROUP BY page, online
+        """, (old_scan,)).fetchall()
+    finally:
+        conn.close()
+
+
+def estimate_rates(history):
+    """Частота изменений (на персонажа в час) по страницам и по онлайну из последовательных снимков
+
+    Возвращает (page_stats {страница: [изменений, персонажо-часов]}, group_rates {онлайн: частота}, общая частота).
+    """
+    page_stats = {}
+    group_stats = {0: [0, 0.0], 1: [0, 0.0]}
+    for old_db, new_db in zip(history, history[1:]):
+        for page, online, changes, hours in observed_changes(old_db, new_db):
+            if not hours or hours <= 0:
+                continue
+            page_entry = page_stats.setdefault(page, [0, 0.0])
+            page_entry[0] += changes
+            page_entry[1] += hours
+            group_stats[1 if online else 0][0] += changes
+            group_stats[1 if online else 0][1] += hours
+    total_changes = sum(changes for changes, _ in group_stats.values())
+    total_hours = sum(hours for _, hours in group_stats.values())
+    overall = total_changes / total_hours if total_hours else 0.0
+    group_rates = {online: (changes / hours if hours else overall) for online, (changes, hours) in group_stats.items()}
+    return page_stats, group_rates, overall
+
+
+def current_pages(db_path, now):
+    """Состав страниц последнего снимка: {страница: [(онлайн, возраст записи в часах, персонажей), ...]}"""
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        rows = conn.execute(f"""
+        SELECT {PAGE_EXPRESSION} AS page, COALESCE(n.pers_online OR n.forum_online, 0) AS online,
+               (julianday(?) - julianday(n.scan_date)) * 24 AS age, COUNT(*)
+        FROM characters n
+        WHERE n.source = 'playtime' AND n.playtime IS NOT NULL
+        GROUP BY page, online, n.scan_date
+        """, (now.strftime('%Y-%m-%d %H:%M:%S'),)).fetchall()
+    finally:
+        conn.close()
+    pages = {}
+    for page, online, age, count in rows:
+        pages.setdefault(page, []).append((online, max(age or 0.0, 0.0), count))
+    return pages
+
+
+def plan_revisits(history, total_pages, budget, now=None):
+    """План обхода страниц рейтинга по времени игры в пределах budget запросов
+
+    Для каждой страницы частота изменений λ оценивается по истории снимков и сглаживается к
+    априорной оценке по онлайну ее персонажей. Ожидаемое число устаревших записей страницы -
+    сумма 1 - exp(-λ * возраст записи) (пуассоновская модель). Берутся страницы без истории
+    (хвост рейтинга с новыми персонажами), затем страницы с наибольшим ожиданием: горячие
+    страницы попадают в план почти каждый запуск, холодные - когда накопят возраст.
+
+    Возвращает словарь плана; full=True означает, что нужен полный обход (причина в reason).
+    """
+    now = now or datetime.now()
+    all_pages = list(range(0, total_pages * PAGE_SIZE, PAGE_SIZE))
+    if budget <= 0 or budget >= len(all_pages):
+        return {'full': True, 'reason': 'бюджет покрывает все страницы', 'pages': all_pages}
+    if len(history) < 2:
+        return {'full': True, 'reason': 'недостаточно истории (нужно две финальные базы)', 'pages': all_pages}
+
+    base_db = history[-1]
+    pages = current_pages(base_db, now)
+    oldest_age = max((age for groups in pages.values() for _, age, _ in groups), default=0.0)
+    if MAX_RECORD_AGE_HOURS is not None and oldest_age > MAX_RECORD_AGE_HOURS:
+        return {'full': True, 'reason': f'самая старая запись старше {MAX_RECORD_AGE_HOURS} ч', 'pages': all_pages}
+
+    page_stats, group_rates, overall = estimate_rates(history)
+    characters = 0
+    stale_by_page = {}
+    for page, groups in pages.items():
+        count = sum(group_count for _, _, group_count in groups)
+        prior = sum(group_rates[1 if online else 0] * group_count for online, _, group_count in groups) / count
+        changes, hours = page_stats.get(page, (0, 0.0))
+        rate = (changes + PRIOR_WEIGHT * prior) / (hours + PRIOR_WEIGHT)
+        stale_by_page[page] = sum(group_count * (1 - math.exp(-rate * age)) for _, age, group_count in groups)
+        characters += count
+
+    unknown = [page for page in all_pages if page not in stale_by_page]
+    known = sorted((page for page in all_pages if page in stale_by_page), key=lambda page: -stale_by_page[page])
+    chosen = (unknown + known)[:budget]
+    chosen_set = set(chosen)
+    stale_before = sum(stale_by_page.values())
+    stale_after = sum(stale for page, stale in stale_by_page.items() if page not in chosen_set)
+    return {
+        'full': False,
+        'base_db': base_db,
+        'pages': sorted(chosen),
+        'total_pages': len(all_pages),
+        'unknown_pages': len(unknown),
+        'characters': characters,
+        'rate_per_day': overall * 24,
+        'oldest_age_hours': oldest_age,
+        'stale_before': stale_before / characters if characters else 0.0,
+        'stale_after': stale_after / characters if characters else 0.0,
+    }
+
+
+def describe_plan(plan):
+    """Строки отчета о плане обхода для лога"""
+    if plan['full']:
+        return [f"Полный обход {len(plan['pages'])} страниц: {plan['reason']}"]
+    return [
+        f"Выборочный обход: {len(plan['pages'])} из {plan['total_pages']} страниц "
+        f"(без истории: {plan['unknown_pages']}), база для дополнения: {plan['base_db']}",
+        f"Изменений на персонажа в сутки: {plan['rate_per_day']:.4f}, "
+        f"самая старая запись: {plan['oldest_age_hours']:.1f} ч",
+        f"Ожидаемая доля устаревших записей: до обхода {plan['stale_before']:.2%}, "
+        f"после обхода {plan['stale_after']:.2%}",
+    ]
+
+
+def main():
+    """План обхода без скачивания: python EzFreshness.py <бюджет_страниц> [мир]"""
+    if len(sys.argv) < 2:
+        print("Использование: python EzFreshness.py <бюджет_страниц> [мир]")
+        return
+    budget = int(sys.argv[1])
+    realm = int(sys.argv[2]) if len(sys.argv) > 2 else None
+    history = history_databases(realm=realm)
+    if not history:
+        print("Ошибка: финальные базы не найдены")
+        return
+    conn = sqlite3.connect(f"file:{history[-1]}?mode=ro", uri=True)
+    known_ranks = conn.execute("SELECT MAX(playtime) FROM characters WHERE source = 'playtime'").fetchone()[0] or 0
+    conn.close()
+    plan = plan_revisits(history, (known_ranks - 1) // PAGE_SIZE + 1 if known_ranks else 0, budget)
+    for line in describe_plan(plan):
+        print(line)
+    if not plan['full']:
+        print(f"Страницы (st=): {', '.join(str(page) for page in plan['pages'])}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,287 @@
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import OrderedDict
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# ==================== КОНФИГУРАЦИЯ ====================
+BASES_FOLDER = 'BASES'
+# Мир, базы которого обслуживаются (DoubleScout с несколькими REALMS пишет ezbase_final_*_r<номер>.db):
+#   None - базы без номера мира (сканирование одного мира), номер мира - только базы этого мира
+REALM = None
+HOST = '127.0.0.1'       # Сервис только для локальных инструментов (бот гильдии, страница)
+PORT = 8765
+CACHE_SIZE = 4096        # Размер LRU кэша ответов (сбрасывается вместе с индексом при смене базы)
+WATCH_INTERVAL = 30      # Как часто проверять BASES на новую финальную базу, секунд
+SETTLE_SECONDS = 10      # База берется, только если не менялась столько секунд (объединение завершено)
+PREFIX_SEARCH_LIMIT = 15
+GUILD_SEARCH_LIMIT = 50
+
+FIELDS = ('ez_id', 'forum_name', 'name', 'level', 'gs', 'class', 'race', 'guild')
+
+
+def log(message):
+    print(f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')} {message}", flush=True)
+
+# ==================== ИНДЕКС ====================
+
+class CharacterIndex:
+    """Неизменяемый индекс одной финальной базы со своим LRU кэшем ответов
+
+    Персонажи хранятся кортежами в порядке FIELDS, списки аккаунтов и гильдий
+    упорядочены по убыванию GS. После построения индекс не меняется, поэтому
+    читать его можно из любых потоков без блокировок (кроме кэша).
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.mtime = os.path.getmtime(db_path)
+        self.loaded_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        self.characters = {}
+        self.by_name = {}
+        self.by_account = {}
+        self.by_guild = {}
+
+        conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+        cursor = conn.execute(f"SELECT {', '.join(FIELDS)} FROM characters ORDER BY gs DESC, ez_id")
+        for row in cursor:
+            ez_id, forum_name, name, _, _, _, _, guild = row
+            self.characters[ez_id] = row
+            # При совпадении имен остается персонаж с большим GS
+            self.by_name.setdefault((name or '').lower(), ez_id)
+            if forum_name:
+                self.by_account.setdefault(forum_name.lower(), []).append(ez_id)
+            if guild:
+                self.by_guild.setdefault(guild.lower(), []).append(ez_id)
+        conn.close()
+        self.sorted_names = sorted(self.by_name)
+
+        self.cache = OrderedDict()
+        self.cache_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def cached(self, key, compute):
+        """Ответ из LRU кэша или вычисление с сохранением (включая "не найдено")"""
+        with self.cache_lock:
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                self.hits += 1
+                return self.cache[key]
+            self.misses += 1
+        result = compute()
+        with self.cache_lock:
+            self.cache[key] = result
+            if len(self.cache) > CACHE_SIZE:
+                self.cache.popitem(last=False)
+        return result
+
+    def record(self, ez_id):
+        return dict(zip(FIELDS, self.characters[ez_id]))
+
+    def account_records(self, forum_name):
+        return [self.record(ez_id) for ez_id in self.by_account.get((forum_name or '').lower(), [])]
+
+    def find_character(self, name):
+        """Персонаж по имени и все персонажи его аккаунта"""
+        ez_id = self.by_name.get(name.lower())
+        if ez_id is None:
+            return None
+        character = self.record(ez_id)
+        return {'character': character, 'account': self.account_records(character['forum_name'])}
+
+    def find_account(self, forum_name):
+        characters = self.account_records(forum_name)
+        return {'forum_name': characters[0]['forum_name'], 'characters': characters} if characters else None
+
+    def find_guild(self, guild, limit=GUILD_SEARCH_LIMIT):
+        members = self.by_guild.get(guild.lower())
+        if not members:
+            return None
+        accounts = {self.characters[ez_id][1] for ez_id in members if self.characters[ez_id][1]}
+        return {'guild': self.characters[members[0]][7], 'characters': len(members), 'accounts': len(accounts),
+                'members': [self.record(ez_id) for ez_id in members[:limit]]}
+
+    def find_prefix(self, prefix, limit=PREFIX_SEARCH_LIMIT):
+        """Персонажи, чьи имена начинаются с prefix (бинарный поиск по отсортированным именам)"""
+        prefix = prefix.lower()
+        result = []
+        position = bisect_left(self.sorted_names, prefix)
+        while position < len(self.sorted_names) and len(result) < limit:
+            name = self.sorted_names[position]
+            if not name.startswith(prefix):
+                break
+            result.append(self.record(self.by_name[name]))
+            position += 1
+        return result
+
+    def status(self):
+        return {'database': os.path.basename(self.db_path), 'loaded_at': self.loaded_at,
+                'characters': len(self.characters), 'accounts': len(self.by_account), 'guilds': len(self.by_guild),
+                'cache': {'size': len(self.cache), 'limit': CACHE_SIZE, 'hits': self.hits, 'misses': self.misses}}
+
+# ==================== СЕРВИС ====================
+
+def find_newest_database():
+    """Самая новая завершенная финальная база мира REALM: не менялась SETTLE_SECONDS и содержит персонажей"""
+    if not os.path.isdir(BASES_FOLDER):
+        return None
+    candidates = []
+    for file in os.listdir(BASES_FOLDER):
+        match = re.fullmatch(r'ezbase_final_.*?(?:_r(\d+))?\.db', file)
+        if match and (int(match.group(1)) if match.group(1) else None) == REALM:
+            path = os.path.join(BASES_FOLDER, file)
+            candidates.append((os.path.getmtime(path), path))
+    for mtime, path in sorted(candidates, reverse=True):
+        if time.time() - mtime < SETTLE_SECONDS:
+            continue
+        try:
+            conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+            has_rows = conn.execute("SELECT 1 FROM characters LIMIT 1").fetchone() is not None
+            conn.close()
+        except sqlite3.Error:
+            continue
+        if has_rows:
+            return path
+    return None
+
+
+class LookupService:
+    """Поиск персонажей поверх последней финальной базы с атомарной заменой индекса
+
+    Новый индекс строится в фоне, затем одной операцией присваивается self.index:
+    запросы, начатые до замены, дорабатывают на старом индексе, новые идут в новый.
+    db_path - явно указанная база: сервис остается на ней и не следит за BASES.
+    """
+
+    def __init__(self, db_path=None):
+        self.index = None
+        self.pinned_path = db_path
+        self.stop_event = threading.Event()
+        self.watcher = None
+        self.reload()
+
+    def reload(self):
+        """Загружает указанную при запуске (или самую новую) базу, если она отличается от текущей"""
+        db_path = self.pinned_path or find_newest_database()
+        current = self.index
+        if not db_path or (current and current.db_path == db_path and current.mtime == os.path.getmtime(db_path)):
+            return False
+        start = time.perf_counter()
+        index = CharacterIndex(db_path)
+        self.index = index
+        log(f"Загружена база {db_path}: {len(index.characters)} персонажей за {time.perf_counter() - start:.2f} с")
+        return True
+
+    def watch(self):
+        while not self.stop_event.wait(WATCH_INTERVAL):
+            try:
+                self.reload()
+            except Exception as e:
+                log(f"Ошибка загрузки новой базы: {e}")
+
+    def start_watching(self):
+        """Фоновая проверка BASES на новые базы (после объединения в DoubleScout), если база не указана явно"""
+        if self.pinned_path:
+            return
+        self.watcher = threading.Thread(target=self.watch, name='Lookup_Watcher', daemon=True)
+        self.watcher.start()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def query(self, kind, value):
+        """Запрос к текущему индексу через кэш: kind - character, account, guild или prefix"""
+        index = self.index
+        if index is None:
+            return None
+        compute = {
+            'character': index.find_character,
+            'account': index.find_account,
+            'guild': index.find_guild,
+            'prefix': index.find_prefix,
+        }[kind]
+        return index.cached((kind, value.lower()), lambda: compute(value))
+
+    def find_character(self, name):
+        return self.query('character', name)
+
+    def find_account(self, forum_name):
+        return self.query('account', forum_name)
+
+    def find_guild(self, guild):
+        return self.query('guild', guild)
+
+    def find_prefix(self, prefix):
+        return self.query('prefix', prefix)
+
+    def status(self):
+        return self.index.status() if self.index else {'database': None}
+
+# ==================== HTTP ====================
+
+class LookupHandler(BaseHTTPRequestHandler):
+    """GET /character?name=, /account?name=, /guild?name=, /prefix?name=, /status - ответы в JSON"""
+    service = None
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        kind = url.path.strip('/')
+        value = parse_qs(url.query).get('name', [''])[0].strip()
+        if kind == 'status':
+            self.send_json(200, self.service.status())
+        elif kind not in ('character', 'account', 'guild', 'prefix'):
+            self.send_json(404, {'error': 'unknown endpoint'})
+        elif not value:
+            self.send_json(400, {'error': 'name is required'})
+        elif self.service.index is None:
+            self.send_json(503, {'error': 'database is not loaded'})
+        else:
+            result = self.service.query(kind, value)
+            if result is None or result == []:
+                self.send_json(404, {'error': 'not found'})
+            else:
+                self.send_json(200, result)
+
+    def send_json(self, code, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Без строки в консоли на каждый запрос
+        pass
+
+
+def main():
+    """Запуск HTTP сервиса поверх последней (или указанной) финальной базы"""
+    service = LookupService(sys.argv[1] if len(sys.argv) > 1 else None)
+    if service.index is None:
+        log(f"Готовая финальная база {'мира ' + str(REALM) + ' ' if REALM is not None else ''}пока не найдена, "
+            "сервис ждет ее появления в BASES")
+    service.start_watching()
+    LookupHandler.service = service
+    server = ThreadingHTTPServer((HOST, PORT), LookupHandler)
+    log(f"Сервис поиска запущен: http://{HOST}:{PORT}/character?name=<имя>")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.stop()
+        server.server_close()
+        log("Сервис поиска остановлен")
+
+
+if __name__ == "__main__":
+    main()
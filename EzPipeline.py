@@ -0,0 +1,196 @@
+import os
+import signal
+import time
+from datetime import datetime, timedelta
+
+import DataInfuser
+import DoubleScout
+import EzAnalytics
+import EzDiff
+
+# ==================== КОНФИГУРАЦИЯ ====================
+CYCLE_INTERVAL_MINUTES = 360  # Интервал между запусками циклов (от начала до начала)
+RUN_ON_START = True           # Запустить первый цикл сразу, не дожидаясь интервала
+BUILD_ADDON = True            # Собирать аддон из свежей финальной базы после каждого цикла
+EXPORT_ANALYTICS = True       # Выгружать финальную базу в колоночный формат для EzAnalytics (нужен numpy)
+DIFF_SNAPSHOTS = True         # Сравнивать новую финальную базу с предыдущей (LOGS/EzDiff_*)
+
+# Политика хранения: сколько последних баз каждого типа оставлять в BASES
+# и сколько дней хранить логи в LOGS. None - не удалять
+KEEP_FINAL_BASES = 5
+KEEP_TECH_BASES = 2
+KEEP_LOGS_DAYS = 14
+# Удаляются только текстовые логи конвейера, DoubleScout и DataInfuser; остальные файлы LOGS (отчеты
+# бенчмарков и т.п.) остаются - с ними сравниваются следующие отчеты
+ROTATED_LOG_PREFIXES = ('pipeline_', 'direct_parser_', 'DataInfuser_')
+
+# ==================== ХРАНЕНИЕ ФАЙЛОВ ====================
+
+def rotate_bases(bases_folder, prefix, keep, protected=()):
+    """Удаляет старые базы с заданным префиксом, оставляя keep самых новых (и защищенные)"""
+    if keep is None or not os.path.isdir(bases_folder):
+        return []
+    db_files = []
+    for file in os.listdir(bases_folder):
+        if file.startswith(prefix) and file.endswith('.db'):
+            file_path = os.path.join(bases_folder, file)
+            db_files.append((os.path.getmtime(file_path), file_path))
+    db_files.sort(reverse=True)
+    removed = []
+    for _, file_path in db_files[keep:]:
+        if os.path.abspath(file_path) in protected:
+            continue
+        try:
+            os.remove(file_path)
+            removed.append(file_path)
+        except OSError as e:
+            DoubleScout.logger.error(f"Не удалось удалить {file_path}: {e}")
+    return removed
+
+def rotate_logs(logs_folder, keep_days, protected=()):
+    """Удаляет текстовые логи (ROTATED_LOG_PREFIXES) старше keep_days дней"""
+    if keep_days is None or not os.path.isdir(logs_folder):
+        return []
+    border = time.time() - keep_days * 86400
+    removed = []
+    for file in os.listdir(logs_folder):
+        if not (file.startswith(ROTATED_LOG_PREFIXES) and file.endswith('.txt')):
+            continue
+        file_path = os.path.join(logs_folder, file)
+        if not os.path.isfile(file_path) or os.path.abspath(file_path) in protected:
+            continue
+        if os.path.getmtime(file_path) < border:
+            try:
+                os.remove(file_path)
+                removed.append(file_path)
+            except OSError as e:
+                DoubleScout.logger.error(f"Не удалось удалить {file_path}: {e}")
+    return removed
+
+def apply_retention(final_dbs, log_filename):
+    """Применяет политику хранения к BASES и LOGS, не трогая файлы текущего цикла
+
+    Лимиты баз задаются в запусках: при нескольких мирах каждый запуск дает по базе на мир.
+    """
+    protected = {os.path.abspath(path) for path in list(final_dbs) + [log_filename] if path}
+    bases_folder = DoubleScout.CONFIG['bases_folder']
+    realm_count = len(DoubleScout.REALMS)
+    removed = rotate_bases(bases_folder, 'ezbase_final_', KEEP_FINAL_BASES and KEEP_FINAL_BASES * realm_count, protected)
+    removed += rotate_bases(bases_folder, 'tech_base_', KEEP_TECH_BASES and KEEP_TECH_BASES * realm_count, protected)
+    removed += rotate_logs(DoubleScout.CONFIG['logs_folder'], KEEP_LOGS_DAYS, protected)
+    if removed:
+        DoubleScout.logger.log(f"Удалено старых файлов: {len(removed)}")
+
+# ==================== ЦИКЛ ====================
+
+def open_log():
+    """Открывает новый лог конвейера и возвращает путь к нему"""
+    log_filename = f"{DoubleScout.CONFIG['logs_folder']}/pipeline_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
+    DoubleScout.logger.setup(log_filename)
+    return log_filename
+
+def run_cycle(sessions, cycle_number, log_filename):
+    """Один цикл конвейера: сканирование → объединение → сборка аддона → очистка
+
+    log_filename - текущий лог конвейера (защищается от очистки).
+    Возвращает список финальных баз цикла (по одной на мир).
+    """
+    start_time = time.time()
+    DoubleScout.logger.log('=' * 60)
+    DoubleScout.logger.log(f'ЦИКЛ КОНВЕЙЕРА #{cycle_number}')
+    DoubleScout.logger.log('=' * 60)
+
+    results = [(realm, final_db, total) for realm, final_db, total in DoubleScout.run_scan(sessions) if total > 0]
+    if not results:
+        DoubleScout.logger.log("Цикл завершен без данных, аддон не пересобирается")
+        return []
+    final_dbs = [final_db for _, final_db, _ in results]
+
+    if BUILD_ADDON:
+        # Финальные базы передаются напрямую, без повторного поиска в BASES;
+        # DataInfuser.REALM оставляет в аддоне только один мир
+        addon_dbs = [final_db for realm, final_db, _ in results if DataInfuser.REALM in (None, realm)]
+        if not addon_dbs:
+            # Пустой список заставил бы DataInfuser искать базу в BASES заново
+            DoubleScout.logger.log(f"Мир {DataInfuser.REALM} (DataInfuser.REALM) не сканировался в этом цикле, аддон не пересобирается")
+        else:
+            DataInfuser.setup_logging()
+            try:
+                DataInfuser.generate_addon_with_database(addon_dbs)
+            except Exception as e:
+                DataInfuser.log_message(f"Ошибка сборки аддона: {e}")
+            finally:
+                DataInfuser.close_logging()
+
+    for realm, final_db, _ in results:
+        publish_database(realm, final_db)
+
+    apply_retention(final_dbs, log_filename)
+    total_duration = time.time() - start_time
+    DoubleScout.logger.log(f'Цикл #{cycle_number} завершен за {int(total_duration // 60):02d}:{int(total_duration % 60):02d}, '
+                           f'персонажей: {sum(total for _, _, total in results)}, базы: {", ".join(final_dbs)}')
+    return final_dbs
+
+def publish_database(realm, final_db):
+    """Сравнение с предыдущей базой того же мира и колоночная выгрузка"""
+    if DIFF_SNAPSHOTS:
+        realm_filter = realm if len(DoubleScout.REALMS) > 1 else None
+        previous = [path for path in EzDiff.latest_final_databases(2, realm_filter)
+                    if os.path.abspath(path) != os.path.abspath(final_db)]
+        if previous:
+            try:
+                summary = EzDiff.write_diff(previous[-1], final_db)
+                counts = summary['counts']
+                DoubleScout.logger.log(f"Изменения с {summary['old']}: новых {counts.get('added', 0)}, "
+                                       f"удалено {counts.get('deleted', 0)}, изменено {counts.get('changed', 0)} "
+                                       f"({summary['changes_file']})")
+            except Exception as e:
+                DoubleScout.logger.error(f"Ошибка сравнения баз: {e}")
+
+    if EXPORT_ANALYTICS and EzAnalytics.np is not None:
+        try:
+            DoubleScout.logger.log(f"Колоночная выгрузка: {EzAnalytics.export_database(final_db)}")
+        except Exception as e:
+            DoubleScout.logger.error(f"Ошибка колоночной выгрузки: {e}")
+
+def wait_until(next_run):
+    """Ожидание следующего цикла с проверкой сигнала остановки"""
+    while DoubleScout.download_active and datetime.now() < next_run:
+        time.sleep(1)
+
+def main():
+    """Долгоживущий режим: сканирование по расписанию и сборка аддона в одном процессе"""
+    signal.signal(signal.SIGINT, DoubleScout.signal_handler)
+    os.makedirs(DoubleScout.CONFIG['logs_folder'], exist_ok=True)
+    os.makedirs(DoubleScout.CONFIG['bases_folder'], exist_ok=True)
+    # Первый цикл пишется в лог запуска, каждый следующий - в свой
+    log_filename = open_log()
+
+    # Сессии создаются один раз и переиспользуются между циклами (keep-alive соединения)
+    sessions = DoubleScout.create_sessions()
+    if not sessions:
+        return
+
+    interval = timedelta(minutes=CYCLE_INTERVAL_MINUTES)
+    next_run = datetime.now() if RUN_ON_START else datetime.now() + interval
+    cycle_number = 0
+    while DoubleScout.download_active:
+        wait_until(next_run)
+        if not DoubleScout.download_active:
+            break
+        cycle_number += 1
+        next_run = datetime.now() + interval
+        if cycle_number > 1:
+            log_filename = open_log()
+        try:
+            run_cycle(sessions, cycle_number, log_filename)
+        except Exception as e:
+            DoubleScout.logger.error(f'КРИТИЧЕСКАЯ ОШИБКА цикла #{cycle_number}: {str(e)}')
+            import traceback
+            DoubleScout.logger.error(traceback.format_exc())
+        if DoubleScout.download_active:
+            DoubleScout.logger.log(f"Следующий цикл: {next_run.strftime('%Y-%m-%d %H:%M:%S')}")
+    DoubleScout.logger.log("Конвейер остановлен")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+import cProfile
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+
+# ==================== КОНФИГУРАЦИЯ ====================
+TOP_FUNCTIONS = 30       # Сколько самых дорогих функций (по cumtime) сохранять для каждого потока
+TOP_ALLOCATIONS = 20     # Сколько мест с наибольшим объемом выделенной памяти сохранять
+TRACEMALLOC_FRAMES = 1   # Глубина стека для tracemalloc (1 - только строка выделения)
+
+
+class PhaseProfiler:
+    """Профилировщик запуска: время по фазам, cProfile по потокам, пик памяти tracemalloc
+
+    В выключенном состоянии все методы ничего не делают, поэтому вызовы можно оставлять в коде.
+    """
+
+    def __init__(self, script_name, enabled=False):
+        self.script_name = script_name
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.phases = {}
+        self.threads = {}
+        self.unprofiled_threads = []
+        self.snapshot = None
+        self.snapshot_phase = None
+        self.snapshot_size = -1
+        self.started_at = None
+        self.start_wall = 0.0
+        self.start_cpu = 0.0
+
+    def start(self, trace_memory=True):
+        """Начало замеров: общее время и tracemalloc (trace_memory=False - только время, без накладных расходов)"""
+        if not self.enabled:
+            return
+        self.started_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        self.start_wall = time.perf_counter()
+        self.start_cpu = time.process_time()
+        if trace_memory:
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+
+    def _record(self, name, wall, cpu, thread_cpu):
+        with self.lock:
+            entry = self.phases.setdefault(name, {'count': 0, 'wall': 0.0, 'cpu': 0.0, 'thread_cpu': 0.0})
+            entry['count'] += 1
+            entry['wall'] += wall
+            entry['cpu'] += cpu
+            entry['thread_cpu'] += thread_cpu
+
+    @contextmanager
+    def phase(self, name):
+        """Замер фазы: стеновое время, CPU процесса и CPU текущего потока (суммируется по вызовам)"""
+        if not self.enabled:
+            yield
+            return
+        wall, cpu, thread_cpu = time.perf_counter(), time.process_time(), time.thread_time()
+        try:
+            yield
+        finally:
+            self._record(name, time.perf_counter() - wall, time.process_time() - cpu, time.thread_time() - thread_cpu)
+
+    def switch_phase(self, name):
+        """Завершает текущую последовательную фазу потока и начинает следующую (None - только завершить)
+
+        На границе фаз снимается срез памяти, если сейчас выделено больше, чем в прошлых срезах:
+        так места выделений в отчете соответствуют моменту наибольшего потребления.
+        """
+        if not self.enabled:
+            return
+        current = getattr(self.local, 'current', None)
+        now = (time.perf_counter(), time.process_time(), time.thread_time())
+        if current:
+            current_name, started = current
+            self._record(current_name, now[0] - started[0], now[1] - started[1], now[2] - started[2])
+            self._take_snapshot(current_name)
+        self.local.current = (name, (time.perf_counter(), time.process_time(), time.thread_time())) if name else None
+
+    def _take_snapshot(self, phase_name):
+        if not tracemalloc.is_tracing():
+            return
+        size = tracemalloc.get_traced_memory()[0]
+        with self.lock:
+            if size <= self.snapshot_size:
+                return
+            self.snapshot_size = size
+            self.snapshot_phase = phase_name
+            self.snapshot = tracemalloc.take_snapshot()
+
+    def run_profiled(self, func, *args, **kwargs):
+        """Выполняет функцию под cProfile, статистика сохраняется под именем текущего потока"""
+        if not self.enabled:
+            return func(*args, **kwargs)
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Python 3.12+: в процессе может быть активен только один профилировщик. Поток выполняется
+            # без своего cProfile, и это отмечается в отчете, чтобы отсутствие статистики не было молчаливым
+            with self.lock:
+                self.unprofiled_threads.append(threading.current_thread().name)
+            return func(*args, **kwargs)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profile.disable()
+            self._store_profile(threading.current_thread().name, profile)
+
+    def _store_profile(self, thread_name, profile):
+        stats = pstats.Stats(profile).stats
+        functions = []
+        for (filename, line, func_name), (_, ncalls, tottime, cumtime, _) in stats.items():
+            functions.append({
+                'function': f"{os.path.basename(filename)}:{line}({func_name})",
+                'ncalls': ncalls,
+                'tottime': round(tottime, 6),
+                'cumtime': round(cumtime, 6),
+            })
+        functions.sort(key=lambda f: f['cumtime'], reverse=True)
+        with self.lock:
+            self.threads[thread_name] = functions[:TOP_FUNCTIONS]
+
+    def save(self, folder):
+        """Сохраняет отчет в JSON рядом с логами и возвращает путь к нему"""
+        if not self.enabled:
+            return None
+        self.switch_phase(None)
+        memory = {}
+        if tracemalloc.is_tracing():
+            self._take_snapshot('end')
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            memory = {
+                'current_kb': round(current / 1024, 1),
+                'peak_kb': round(peak / 1024, 1),
+                'top_allocations_after': self.snapshot_phase,
+                'top_allocations': [
+                    {
+                        'site': f"{os.path.basename(stat.traceback[0].filename)}:{stat.traceback[0].lineno}",
+                        'size_kb': round(stat.size / 1024, 1),
+                        'count': stat.count,
+                    }
+                    for stat in self.snapshot.statistics('lineno')[:TOP_ALLOCATIONS]
+                ],
+            }
+        report = {
+            'script': self.script_name,
+            'started_at': self.started_at,
+            'python': sys.version.split()[0],
+            'total': {
+                'wall': round(time.perf_counter() - self.start_wall, 4),
+                'cpu': round(time.process_time() - self.start_cpu, 4),
+            },
+            'phases': {
+                name: {key: round(value, 4) if isinstance(value, float) else value for key, value in entry.items()}
+                for name, entry in self.phases.items()
+            },
+            'threads': self.threads,
+            'unprofiled_threads': self.unprofiled_threads,
+            'memory': memory,
+        }
+        os.makedirs(folder, exist_ok=True)
+        path = os.path.join(folder, f"{self.script_name}_profile_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2, sort_keys=True)
+        return path
+
+
+def compare_reports(old_path, new_path):
+    """Печатает разницу по фазам и памяти между двумя отчетами профилирования"""
+    with open(old_path, 'r', encoding='utf-8') as f:
+        old = json.load(f)
+    with open(new_path, 'r', encoding='utf-8') as f:
+        new = json.load(f)
+    print(f"{'Фаза':<32}{'wall было':>12}{'wall стало':>12}{'Δ %':>9}{'cpu было':>12}{'cpu стало':>12}")
+    rows = [('TOTAL', old['total'], new['total'])]
+    for name in sorted(set(old['phases']) | set(new['phases'])):
+        rows.append((name, old['phases'].get(name, {}), new['phases'].get(name, {})))
+    for name, before, after in rows:
+        wall_before, wall_after = before.get('wall', 0.0), after.get('wall', 0.0)
+        delta = f"{(wall_after - wall_before) / wall_before * 100:+.1f}" if wall_before else "-"
+        print(f"{name:<32}{wall_before:>12}{wall_after:>12}{delta:>9}{before.get('cpu', 0.0):>12}{after.get('cpu', 0.0):>12}")
+    peak_before = old.get('memory', {}).get('peak_kb', 0)
+    peak_after = new.get('memory', {}).get('peak_kb', 0)
+    print(f"{'Пик памяти, KB':<32}{peak_before:>12}{peak_after:>12}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("Использование: python EzProfiler.py <старый_отчет.json> <новый_отчет.json>")
+    else:
+        compare_reports(sys.argv[1], sys.argv[2])
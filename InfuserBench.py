@@ -0,0 +1,359 @@
+import json
+import os
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from itertools import accumulate
+
+import DataInfuser
+from EzProfiler import PhaseProfiler
+
+try:
+    import resource
+except ImportError:
+    # Windows: пик памяти считается через tracemalloc (медленнее и только объекты Python)
+    resource = None
+
+# ==================== КОНФИГУРАЦИЯ ====================
+SIZES = [10000, 100000, 1000000]  # Количество персонажей в синтетических базах
+# Режимы генерации, которые замеряются на каждом размере
+BENCH_MODES = [
+    {'name': 'classic', 'codegen_mode': 'classic', 'shard_count': 0},
+    {'name': 'compact', 'codegen_mode': 'compact', 'shard_count': 0},
+    {'name': 'prerendered', 'codegen_mode': 'prerendered', 'shard_count': 0},
+]
+REPEATS = 3               # Прогонов для замера времени, в отчет идет самый быстрый
+MEASURE_MEMORY = True     # Отдельный прогон в дочернем процессе для пика памяти (на время не влияет)
+RANDOM_SEED = 42
+DATA_FOLDER = 'BENCH_DATA'  # Синтетические базы (создаются один раз и переиспользуются)
+OUTPUT_FOLDER = 'LOGS'
+GENERATOR_VERSION = 2     # Увеличить при изменении генератора, чтобы базы пересоздались
+
+# Распределения синтетических данных
+NO_ACCOUNT_SHARE = 0.06       # Персонажи без форумного аккаунта (попадают в NOFORUMNAME)
+ACCOUNT_PARETO_ALPHA = 1.6    # Персонажей на аккаунт: Парето (много аккаунтов с 1-3 персонажами, редкие с десятками)
+MAX_CHARACTERS_PER_ACCOUNT = 60
+NO_GUILD_SHARE = 0.35
+GUILD_ZIPF_EXPONENT = 1.0     # Размер гильдии обратно пропорционален ее месту: несколько больших и длинный хвост маленьких
+ACCOUNT_GUILD_SHARE = 0.6     # Вероятность, что персонаж состоит в "основной" гильдии своего аккаунта
+MAX_LEVEL_SHARE = 0.45
+UNKNOWN_CLASS_SHARE = 0.005   # Классы вне CLASSES (часть - в другом регистре, они находятся без учета регистра)
+UNKNOWN_RACE_SHARE = 0.003
+CYRILLIC_NAME_SHARE = 0.1
+
+CLASS_WEIGHTS = {
+    'Death Knight': 14, 'Paladin': 13, 'Warrior': 11, 'Druid': 10, 'Priest': 10,
+    'Hunter': 9, 'Mage': 9, 'Rogue': 8, 'Shaman': 8, 'Warlock': 8,
+}
+UNKNOWN_CLASSES = ['Monk', 'Demon Hunter', 'mage', 'DEATH KNIGHT', '']
+UNKNOWN_RACES = ['Goblin', 'Worgen', 'night elf', '']
+LATIN_SYLLABLES = ['ar', 'th', 'as', 'mo', 'ra', 'ke', 'li', 'zu', 'an', 'el', 'or', 'dor', 'vy', 'sha', 'quel', 'mi']
+CYRILLIC_SYLLABLES = ['ар', 'ин', 'ка', 'ру', 'мо', 'ле', 'ши', 'дар', 'вел', 'то']
+
+FINAL_DB_SCHEMA = """
+CREATE TABLE characters (
+    ez_id INTEGER PRIMARY KEY,
+    forum_name TEXT,
+    name TEXT,
+    level INTEGER,
+    gs INTEGER,
+    ilvl INTEGER,
+    class TEXT,
+    race TEXT,
+    guild TEXT,
+    kills INTEGER,
+    ap INTEGER,
+    pers_online BOOLEAN,
+    forum_online BOOLEAN,
+    source TEXT,
+    scan_date TEXT,
+    playtime INTEGER
+)
+"""
+
+
+def unique_name(rng, used):
+    """Уникальное имя персонажа из слогов (латиница или кириллица)"""
+    syllables = CYRILLIC_SYLLABLES if rng.random() < CYRILLIC_NAME_SHARE else LATIN_SYLLABLES
+    while True:
+        name = ''.join(rng.choice(syllables) for _ in range(rng.randint(2, 4))).capitalize()
+        if name in used:
+            name += ''.join(rng.choice('abcdefghijklmnopqrstuvwxyz') for _ in range(rng.randint(1, 3)))
+        if name not in used:
+            used.add(name)
+            return name
+
+
+def synthetic_characters(size, seed):
+    """Генератор строк таблицы characters с распределениями, похожими на реальную базу"""
+    rng = random.Random(seed)
+    classes, class_weights = list(CLASS_WEIGHTS), list(CLASS_WEIGHTS.values())
+    races = list(DataInfuser.RACES)
+    guild_count = max(1, size // 40)
+    guilds = [f"Guild {index}" for index in range(guild_count)]
+    # Несколько названий с кавычками и кириллицей, чтобы проверялось экранирование
+    guilds[:3] = ['Апостолы', 'Quo"te', "Bob's Inn"][:len(guilds)]
+    guild_weights = list(accumulate(1 / (rank ** GUILD_ZIPF_EXPONENT) for rank in range(1, guild_count + 1)))
+
+    def pick_guild():
+        if rng.random() < NO_GUILD_SHARE:
+            return ''
+        return rng.choices(guilds, cum_weights=guild_weights)[0]
+
+    used_names = set()
+    ez_id = 0
+    account_number = 0
+    while ez_id < size:
+        if rng.random() < NO_ACCOUNT_SHARE:
+            forum_name, count = '', 1
+        else:
+            account_number += 1
+            forum_name = f"acc{account_number}"
+            count = min(int(rng.paretovariate(ACCOUNT_PARETO_ALPHA)), MAX_CHARACTERS_PER_ACCOUNT)
+        account_guild = pick_guild()
+        for _ in range(min(count, size - ez_id)):
+            ez_id += 1
+            level = 80 if rng.random() < MAX_LEVEL_SHARE else min(79, int(rng.expovariate(1 / 25)) + 1)
+            gs = max(0, min(6500, int(rng.gauss(4300, 1000)))) if level == 80 else (rng.randint(0, 1500) if level > 60 else 0)
+            class_ = rng.choice(UNKNOWN_CLASSES) if rng.random() < UNKNOWN_CLASS_SHARE else rng.choices(classes, class_weights)[0]
+            race = rng.choice(UNKNOWN_RACES) if rng.random() < UNKNOWN_RACE_SHARE else rng.choice(races)
+            guild = account_guild if rng.random() < ACCOUNT_GUILD_SHARE else pick_guild()
+            yield (ez_id, forum_name, unique_name(rng, used_names), level, gs, 0, class_, race, guild, 0, 0,
+                   rng.random() < 0.05, rng.random() < 0.05, 'playtime', '2026-01-01 00:00:00', ez_id)
+
+
+def synthetic_database(size, seed=RANDOM_SEED):
+    """Путь к синтетической базе на size персонажей (создается при первом обращении)"""
+    os.makedirs(DATA_FOLDER, exist_ok=True)
+    db_path = os.path.join(DATA_FOLDER, f"synthetic_v{GENERATOR_VERSION}_{size}_s{seed}.db")
+    if os.path.exists(db_path):
+        return db_path
+    print(f"Создание синтетической базы на {size} персонажей...")
+    tmp_path = db_path + '.tmp'
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    conn = sqlite3.connect(tmp_path)
+    conn.execute(FINAL_DB_SCHEMA)
+    conn.executemany("INSERT INTO characters VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                     synthetic_characters(size, seed))
+    conn.commit()
+    conn.close()
+    os.replace(tmp_path, db_path)
+    return db_path
+
+
+def database_stats(db_path):
+    """Характеристики базы для отчета: персонажи, аккаунты, гильдии, неизвестные классы"""
+    conn = sqlite3.connect(db_path)
+    known_classes = ', '.join(f"'{name.lower()}'" for name in DataInfuser.CLASSES)
+    stats = {
+        'characters': conn.execute("SELECT COUNT(*) FROM characters").fetchone()[0],
+        'accounts': conn.execute("SELECT COUNT(DISTINCT forum_name) FROM characters WHERE forum_name != ''").fetchone()[0],
+        'no_account': conn.execute("SELECT COUNT(*) FROM characters WHERE forum_name = ''").fetchone()[0],
+        'max_account_characters': conn.execute(
+            "SELECT MAX(cnt) FROM (SELECT COUNT(*) AS cnt FROM characters WHERE forum_name != '' GROUP BY forum_name)").fetchone()[0],
+        'guilds': conn.execute("SELECT COUNT(DISTINCT guild) FROM characters WHERE guild != ''").fetchone()[0],
+        'unknown_classes': conn.execute(
+            f"SELECT COUNT(*) FROM characters WHERE class != '' AND lower(class) NOT IN ({known_classes})").fetchone()[0],
+    }
+    conn.close()
+    return stats
+
+
+def run_generation(db_path, output_dir, trace_memory=False):
+    """Один прогон generate_addon_with_database с профилировщиком DataInfuser
+
+    Возвращает (время, фазы профилировщика, пик tracemalloc в байтах или None).
+    """
+    DataInfuser.profiler = PhaseProfiler('DataInfuser', enabled=True)
+    DataInfuser.profiler.start(trace_memory=trace_memory)
+    start = time.perf_counter()
+    addon_path = DataInfuser.generate_addon_with_database(db_path, output_dir=output_dir, install=False)
+    wall = time.perf_counter() - start
+    peak = None
+    if trace_memory:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    phases = DataInfuser.profiler.phases
+    DataInfuser.profiler = PhaseProfiler('DataInfuser')
+    if not addon_path:
+        raise RuntimeError(f"генерация аддона из {db_path} завершилась ошибкой")
+    return wall, phases, peak
+
+
+def peak_rss_kb():
+    """Пиковый размер процесса в KB или None, если узнать его нельзя
+
+    В Linux берется VmHWM: ru_maxrss там наследуется от родителя через fork/exec и
+    показал бы пик процесса бенчмарка. В macOS - ru_maxrss (в байтах).
+    """
+    try:
+        with open('/proc/self/status', 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    if resource:
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return max_rss / 1024 if sys.platform == 'darwin' else max_rss
+    return None
+
+
+def measure_memory(db_path):
+    """Пик памяти одного прогона в текущем процессе (вызывается в дочернем процессе)
+
+    Берется прирост пикового RSS за время генерации; если RSS недоступен (Windows) - пик tracemalloc.
+    """
+    with tempfile.TemporaryDirectory() as work_dir:
+        baseline = peak_rss_kb()
+        if baseline is not None:
+            run_generation(db_path, work_dir)
+            return peak_rss_kb() - baseline
+        _, _, peak = run_generation(db_path, work_dir, trace_memory=True)
+        return peak / 1024
+
+
+def peak_memory_kb(db_path, mode):
+    """Пик памяти генерации в отдельном процессе, чтобы на него не влияли предыдущие прогоны"""
+    completed = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--memory', db_path, mode['codegen_mode'], str(mode['shard_count'])],
+        capture_output=True, text=True, encoding='utf-8', errors='replace')
+    for line in reversed(completed.stdout.splitlines()):
+        if line.startswith('PEAK_MEMORY_KB='):
+            return round(float(line.split('=', 1)[1]), 1)
+    print(f"Ошибка замера памяти ({mode['name']}): {completed.stderr.strip().splitlines()[-1:] or completed.returncode}")
+    return None
+
+
+def bench_generation(db_path, mode, work_dir):
+    """Время генерации по фазам, пик памяти и размер результата в режиме mode"""
+    DataInfuser.CODEGEN_MODE = mode['codegen_mode']
+    DataInfuser.SHARD_COUNT = mode['shard_count']
+    output_dir = os.path.join(work_dir, 'timing')
+    wall, phases, _ = min((run_generation(db_path, output_dir) for _ in range(REPEATS)), key=lambda run: run[0])
+    result = {
+        'repeats': REPEATS,
+        'total_s': round(wall, 4),
+        'phases_s': {name: round(entry['wall'], 4) for name, entry in phases.items()},
+        'output_kb': round(sum(os.path.getsize(os.path.join(root, name))
+                               for root, _, files in os.walk(output_dir) for name in files) / 1024, 1),
+    }
+    if MEASURE_MEMORY:
+        result['peak_memory_kb'] = peak_memory_kb(db_path, mode)
+    return result
+
+
+def current_commit():
+    """Короткий хеш текущего коммита (если скрипт лежит в git репозитории)"""
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def previous_report(exclude=None):
+    """Последний сохраненный отчет бенчмарка (для сравнения с текущим)"""
+    if not os.path.isdir(OUTPUT_FOLDER):
+        return None
+    reports = sorted(file for file in os.listdir(OUTPUT_FOLDER)
+                     if file.startswith('InfuserBench_') and file.endswith('.json'))
+    reports = [os.path.join(OUTPUT_FOLDER, file) for file in reports]
+    reports = [path for path in reports if path != exclude]
+    return reports[-1] if reports else None
+
+
+def print_report(report):
+    """Выводит сводную таблицу по размерам и режимам"""
+    print("=" * 110)
+    print(f"Коммит: {report['commit'] or '-'}, Python {report['python']}")
+    print(f"{'Режим':<10}{'Персонажей':>11}{'Всего с':>9}{'query':>8}{'transform':>10}{'codegen':>9}"
+          f"{'render':>8}{'write':>8}{'Пик KB':>11}{'Размер KB':>11}")
+    for key, result in report['results'].items():
+        mode, size = key.split('/')
+        phases = result['phases_s']
+        print(f"{mode:<10}{size:>11}{result['total_s']:>9}{phases.get('query', 0):>8}"
+              f"{phases.get('transform_rows', 0):>10}{phases.get('generate_database_code', 0):>9}"
+              f"{phases.get('render_template', 0):>8}{phases.get('write_files', 0):>8}"
+              f"{result.get('peak_memory_kb', '-'):>11}{result['output_kb']:>11}")
+    print("=" * 110)
+
+
+def compare_reports(old_path, new_path):
+    """Печатает изменение времени, пика памяти и размера результата между двумя отчетами"""
+    with open(old_path, 'r', encoding='utf-8') as f:
+        old = json.load(f)
+    with open(new_path, 'r', encoding='utf-8') as f:
+        new = json.load(f)
+    print(f"Сравнение: {os.path.basename(old_path)} ({old.get('commit') or '-'}) → "
+          f"{os.path.basename(new_path)} ({new.get('commit') or '-'})")
+    print(f"{'Режим/размер':<22}{'Время с':>20}{'Δ %':>8}{'Пик KB':>26}{'Δ %':>8}{'Размер KB':>24}{'Δ %':>8}")
+
+    def delta(before, after):
+        return f"{(after - before) / before * 100:+.1f}" if before and after is not None else "-"
+
+    for key, after in new['results'].items():
+        before = old['results'].get(key)
+        if not before:
+            continue
+        print(f"{key:<22}{before['total_s']:>10}{after['total_s']:>10}{delta(before['total_s'], after['total_s']):>8}"
+              f"{before.get('peak_memory_kb', '-'):>13}{after.get('peak_memory_kb', '-'):>13}"
+              f"{delta(before.get('peak_memory_kb'), after.get('peak_memory_kb')):>8}"
+              f"{before['output_kb']:>12}{after['output_kb']:>12}{delta(before['output_kb'], after['output_kb']):>8}")
+
+
+def main():
+    """Замеряет DataInfuser на синтетических базах разных размеров и сохраняет отчет в LOGS
+
+    python InfuserBench.py [размер ...] - выбранные размеры вместо SIZES
+    python InfuserBench.py --compare <старый.json> <новый.json> - сравнение двух отчетов
+    """
+    if len(sys.argv) == 4 and sys.argv[1] == '--compare':
+        compare_reports(sys.argv[2], sys.argv[3])
+        return
+    if len(sys.argv) == 5 and sys.argv[1] == '--memory':
+        DataInfuser.CODEGEN_MODE, DataInfuser.SHARD_COUNT = sys.argv[3], int(sys.argv[4])
+        print(f"PEAK_MEMORY_KB={measure_memory(sys.argv[2])}")
+        return
+    sizes = [int(arg) for arg in sys.argv[1:]] or SIZES
+
+    saved_settings = DataInfuser.CODEGEN_MODE, DataInfuser.SHARD_COUNT
+    report = {
+        'created_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'commit': current_commit(),
+        'python': sys.version.split()[0],
+        'seed': RANDOM_SEED,
+        'generator_version': GENERATOR_VERSION,
+        'modes': BENCH_MODES,
+        'databases': {},
+        'results': {},
+    }
+    try:
+        for size in sizes:
+            db_path = synthetic_database(size)
+            report['databases'][str(size)] = database_stats(db_path)
+            for mode in BENCH_MODES:
+                with tempfile.TemporaryDirectory() as work_dir:
+                    report['results'][f"{mode['name']}/{size}"] = bench_generation(db_path, mode, work_dir)
+    finally:
+        DataInfuser.CODEGEN_MODE, DataInfuser.SHARD_COUNT = saved_settings
+
+    print_report(report)
+    os.makedirs(OUTPUT_FOLDER, exist_ok=True)
+    report_path = os.path.join(OUTPUT_FOLDER, f"InfuserBench_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    with open(report_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"Отчет сохранен: {report_path}")
+    previous = previous_report(exclude=report_path)
+    if previous:
+        compare_reports(previous, report_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,292 @@
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import DataInfuser
+
+# ==================== КОНФИГУРАЦИЯ ====================
+# Режимы генерации, которые сравниваются между собой
+BENCH_MODES = [
+    {'name': 'classic', 'codegen_mode': 'classic', 'shard_count': 0},
+    {'name': 'compact', 'codegen_mode': 'compact', 'shard_count': 0},
+    {'name': 'prerendered', 'codegen_mode': 'prerendered', 'shard_count': 0},
+    {'name': 'classic_sharded', 'codegen_mode': 'classic', 'shard_count': 8},
+    {'name': 'compact_sharded', 'codegen_mode': 'compact', 'shard_count': 8},
+]
+
+LOOKUPS_FILE = None       # Файл с запросами /qq (по одному в строке). None - запросы берутся случайно из базы
+LOOKUP_COUNT = 500        # Поисков по имени персонажа
+ACCOUNT_LOOKUP_COUNT = 100  # Поисков по имени аккаунта
+MISS_COUNT = 100          # Поисков несуществующих имен
+PREFIX_COUNT = 100        # Поисков по началу имени (/qq arth*)
+GUILD_COUNT = 50          # Поисков по гильдии (/qq g:<название>)
+TARGET_EVENT_COUNT = 500  # Событий смены цели при включенном автопоиске
+TARGET_HOT_SHARE = 0.6    # Доля событий, когда цель выбирается из небольшой "толпы" (повторы)
+RANDOM_SEED = 42
+OUTPUT_FOLDER = 'LOGS'
+
+# Заглушки API клиента WoW 3.3.5, достаточные для загрузки EzInfo.lua и его шардов
+WOW_API_STUBS = r'''
+strlower, strupper, strfind, strsub, strmatch, strlen, format = string.lower, string.upper, string.find, string.sub, string.match, string.len, string.format
+gsub, tinsert, tremove = string.gsub, table.insert, table.remove
+
+EZBENCH_NOW = 0
+EZBENCH_LINES = 0
+EZBENCH_TARGET = nil
+EZBENCH_FRAMES = {}
+
+function print(...)
+    EZBENCH_LINES = EZBENCH_LINES + 1
+end
+
+function GetTime()
+    return EZBENCH_NOW
+end
+
+function UnitName(unit)
+    if unit == "target" then
+        return EZBENCH_TARGET
+    end
+    return "Bench"
+end
+
+function UnitIsPlayer(unit)
+    return unit ~= "target" or EZBENCH_TARGET ~= nil
+end
+
+function UnitExists(unit)
+    return unit ~= "target" or EZBENCH_TARGET ~= nil
+end
+
+function CreateFrame()
+    local frame = {events = {}, scripts = {}, shown = true}
+    function frame:RegisterEvent(event) self.events[event] = true end
+    function frame:UnregisterEvent(event) self.events[event] = nil end
+    function frame:SetScript(name, handler) self.scripts[name] = handler end
+    function frame:GetScript(name) return self.scripts[name] end
+    function frame:Show() self.shown = true end
+    function frame:Hide() self.shown = false end
+    function frame:IsShown() return self.shown end
+    EZBENCH_FRAMES[#EZBENCH_FRAMES + 1] = frame
+    return frame
+end
+
+function EZBENCH_FIRE(event, ...)
+    for _, frame in ipairs(EZBENCH_FRAMES) do
+        if frame.events[event] and frame.scripts.OnEvent then
+            frame.scripts.OnEvent(frame, event, ...)
+        end
+    end
+end
+
+function EZBENCH_UPDATE(elapsed)
+    for _, frame in ipairs(EZBENCH_FRAMES) do
+        if frame.shown and frame.scripts.OnUpdate then
+            frame.scripts.OnUpdate(frame, elapsed)
+        end
+    end
+end
+
+function LoadAddOn(name)
+    if EZBENCH_LOAD_ADDON(name) then
+        EZBENCH_FIRE("ADDON_LOADED", name)
+        return 1
+    end
+    return nil, "MISSING"
+end
+
+SlashCmdList = {}
+'''
+
+
+def load_lua_module():
+    """Загружает интерпретатор Lua 5.1 через lupa (как в клиенте WoW)"""
+    try:
+        import lupa.lua51 as lua_module
+        return lua_module
+    except ImportError:
+        pass
+    try:
+        import lupa as lua_module
+    except ImportError:
+        print("Ошибка: для бенчмарка нужен пакет lupa (pip install lupa)")
+        return None
+    print("Предупреждение: lupa собран без Lua 5.1, результаты могут отличаться от клиента WoW")
+    return lua_module
+
+
+def build_queries(db_path):
+    """Формирует запросы /qq и цели автопоиска из базы (или из LOOKUPS_FILE)"""
+    rng = random.Random(RANDOM_SEED)
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    cursor.execute("SELECT name FROM characters WHERE name != ''")
+    names = [row[0] for row in cursor.fetchall()]
+    cursor.execute("SELECT DISTINCT forum_name FROM characters WHERE forum_name != ''")
+    accounts = [row[0] for row in cursor.fetchall()]
+    cursor.execute("SELECT DISTINCT guild FROM characters WHERE guild != ''")
+    guilds = [row[0] for row in cursor.fetchall()]
+    conn.close()
+
+    queries = {}
+    if LOOKUPS_FILE:
+        with open(LOOKUPS_FILE, 'r', encoding='utf-8') as f:
+            queries['replay'] = [line.strip() for line in f if line.strip()]
+    else:
+        queries['name'] = [rng.choice(names) for _ in range(LOOKUP_COUNT)] if names else []
+        queries['account'] = [rng.choice(accounts) for _ in range(ACCOUNT_LOOKUP_COUNT)] if accounts else []
+        queries['miss'] = [f"Nobody{rng.randint(0, 10 ** 9)}" for _ in range(MISS_COUNT)]
+        queries['prefix'] = [rng.choice(names)[:3] + "*" for _ in range(PREFIX_COUNT)] if names else []
+        queries['guild'] = ["g:" + rng.choice(guilds) for _ in range(GUILD_COUNT)] if guilds else []
+
+    crowd = [rng.choice(names) for _ in range(10)] if names else []
+    targets = []
+    for _ in range(TARGET_EVENT_COUNT if names else 0):
+        target = rng.choice(crowd) if rng.random() < TARGET_HOT_SHARE else rng.choice(names)
+        # Промежуток до следующей смены цели: часто быстрый Tab, иногда пауза
+        gap = rng.choice([0.05, 0.1, 0.2, 0.5, 1.0, 3.0])
+        targets.append((target, gap))
+    return queries, targets
+
+
+def percentiles(samples):
+    """Перцентили задержки в миллисекундах"""
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+
+    def pick(p):
+        return round(ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))] * 1000, 4)
+
+    return {'count': len(ordered), 'p50': pick(50), 'p90': pick(90), 'p99': pick(99),
+            'max': round(ordered[-1] * 1000, 4)}
+
+
+def bench_addon(lua_module, addon_dir, queries, targets):
+    """Загружает сгенерированный аддон в чистый интерпретатор и замеряет загрузку, память и поиски"""
+    lua = lua_module.LuaRuntime(unpack_returned_tuples=True)
+    lua.execute(WOW_API_STUBS)
+    lua_globals = lua.globals()
+    shard_loads = []
+
+    def load_addon(name):
+        path = os.path.join(addon_dir, name, f"{name}.lua")
+        if not os.path.exists(path):
+            return False
+        with open(path, 'r', encoding='utf-8') as f:
+            source = f.read()
+        start = time.perf_counter()
+        lua.execute(source)
+        shard_loads.append(time.perf_counter() - start)
+        return True
+
+    lua_globals.EZBENCH_LOAD_ADDON = load_addon
+    collect = lua.eval('function() collectgarbage("collect") return collectgarbage("count") end')
+
+    with open(os.path.join(addon_dir, 'EzInfo.lua'), 'r', encoding='utf-8') as f:
+        source = f.read()
+    base_memory = collect()
+    start = time.perf_counter()
+    chunk = lua.compile(source)
+    compile_time = time.perf_counter() - start
+    start = time.perf_counter()
+    chunk()
+    lua_globals.EZBENCH_FIRE("ADDON_LOADED", "EzInfo")
+    run_time = time.perf_counter() - start
+    loaded_memory = collect() - base_memory
+
+    slash = lua_globals.SlashCmdList["EZINFO"]
+    lookups = {}
+    for kind, kind_queries in queries.items():
+        samples = []
+        for query in kind_queries:
+            start = time.perf_counter()
+            slash(query)
+            samples.append(time.perf_counter() - start)
+        lookups[kind] = percentiles(samples)
+
+    # Автопоиск: смены цели с реальными промежутками, OnUpdate после каждого промежутка
+    slash("on")
+    lines_before = lua_globals.EZBENCH_LINES
+    samples = []
+    for target, gap in targets:
+        start = time.perf_counter()
+        lua_globals.EZBENCH_TARGET = target
+        lua_globals.EZBENCH_FIRE("PLAYER_TARGET_CHANGED")
+        lua_globals.EZBENCH_NOW = lua_globals.EZBENCH_NOW + gap
+        lua_globals.EZBENCH_UPDATE(gap)
+        samples.append(time.perf_counter() - start)
+    lookups['autotarget'] = percentiles(samples)
+    autotarget_lines = lua_globals.EZBENCH_LINES - lines_before
+    slash("off")
+
+    return {
+        'file_size_kb': round(sum(os.path.getsize(os.path.join(root, name))
+                                  for root, _, files in os.walk(addon_dir) for name in files if name.endswith('.lua')) / 1024, 1),
+        'compile_ms': round(compile_time * 1000, 2),
+        'run_ms': round(run_time * 1000, 2),
+        'memory_loaded_kb': round(loaded_memory, 1),
+        'memory_after_lookups_kb': round(collect() - base_memory, 1),
+        'shards_loaded': len(shard_loads),
+        'shard_load_ms': round(sum(shard_loads) * 1000, 2),
+        'autotarget_chat_lines': autotarget_lines,
+        'lookups_ms': lookups,
+    }
+
+
+def print_report(results):
+    """Выводит сводную таблицу по режимам"""
+    print("=" * 100)
+    print(f"{'Режим':<18}{'Размер KB':>11}{'Компиляция мс':>15}{'Запуск мс':>11}{'Память KB':>11}"
+          f"{'После поисков KB':>18}{'Шардов':>8}")
+    for name, result in results.items():
+        print(f"{name:<18}{result['file_size_kb']:>11}{result['compile_ms']:>15}{result['run_ms']:>11}"
+              f"{result['memory_loaded_kb']:>11}{result['memory_after_lookups_kb']:>18}{result['shards_loaded']:>8}")
+    print("-" * 100)
+    print(f"{'Режим':<18}{'Запросы':<12}{'Кол-во':>8}{'p50 мс':>10}{'p90 мс':>10}{'p99 мс':>10}{'max мс':>10}")
+    for name, result in results.items():
+        for kind, stats in result['lookups_ms'].items():
+            if stats:
+                print(f"{name:<18}{kind:<12}{stats['count']:>8}{stats['p50']:>10}{stats['p90']:>10}"
+                      f"{stats['p99']:>10}{stats['max']:>10}")
+        print(f"{name:<18}{'чат автопоиска, строк':<32}{result['autotarget_chat_lines']:>8}")
+    print("=" * 100)
+
+
+def main():
+    """Генерирует аддон в каждом режиме и замеряет его в Lua 5.1"""
+    lua_module = load_lua_module()
+    if not lua_module:
+        return
+    db_path = sys.argv[1] if len(sys.argv) > 1 else DataInfuser.find_database_file()
+    if not db_path:
+        print("Ошибка: Файл базы данных не найден!")
+        return
+    queries, targets = build_queries(db_path)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as work_dir:
+        for mode in BENCH_MODES:
+            DataInfuser.CODEGEN_MODE = mode['codegen_mode']
+            DataInfuser.SHARD_COUNT = mode['shard_count']
+            addon_dir = os.path.join(work_dir, mode['name'])
+            if not DataInfuser.generate_addon_with_database(db_path, output_dir=addon_dir, install=False):
+                return
+            results[mode['name']] = bench_addon(lua_module, addon_dir, queries, targets)
+
+    print_report(results)
+    os.makedirs(OUTPUT_FOLDER, exist_ok=True)
+    report_path = os.path.join(OUTPUT_FOLDER, f"LuaBench_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    with open(report_path, 'w', encoding='utf-8') as f:
+        json.dump({'database': os.path.basename(db_path), 'lua': lua_module.LuaRuntime().eval('_VERSION'),
+                   'modes': BENCH_MODES, 'results': results}, f, ensure_ascii=False, indent=2)
+    print(f"Отчет сохранен: {report_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Скрипты лежат в корне репозитория и импортируются как модули
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
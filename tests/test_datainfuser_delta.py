@@ -0,0 +1,119 @@
+import json
+import os
+import re
+import sqlite3
+
+import pytest
+
+import DataInfuser
+import InfuserBench
+import LuaBench
+
+lupa = pytest.importorskip('lupa')
+
+SEARCH_TIME = re.compile(r'\d+\.\d+ сек')
+
+
+def make_database(path, rows):
+    conn = sqlite3.connect(path)
+    conn.execute(InfuserBench.FINAL_DB_SCHEMA)
+    conn.executemany("INSERT INTO characters VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+    conn.commit()
+    conn.close()
+    return str(path)
+
+
+def mutate(db_path):
+    """Изменения между сканированиями: GS, гильдии, переименования, переносы, удаленные и новые аккаунты"""
+    conn = sqlite3.connect(db_path)
+    conn.execute("UPDATE characters SET gs = gs + 500 WHERE ez_id % 97 = 0")
+    conn.execute("UPDATE characters SET guild = 'Guild Renamed' WHERE guild = 'Guild 5'")
+    conn.execute("UPDATE characters SET name = name || 'x' WHERE ez_id % 151 = 0")
+    conn.execute("UPDATE characters SET forum_name = 'acc2' WHERE ez_id IN (SELECT ez_id FROM characters WHERE forum_name = 'acc7' LIMIT 1)")
+    conn.execute("DELETE FROM characters WHERE forum_name IN ('acc3', 'acc11')")
+    conn.executemany("INSERT INTO characters VALUES (?, ?, ?, 80, 5100, 0, 'Mage', 'Human', ?, 0, 0, 0, 0, 'playtime', '', ?)",
+                     [(100001, 'accnew', 'Newcomer', 'Guild 1', 100001), (100002, 'accnew', 'Newcomerb', '', 100002)])
+    conn.commit()
+    conn.close()
+
+
+def build(db_path, output_dir, delta):
+    DataInfuser.DELTA_BUILD = delta
+    os.makedirs(output_dir, exist_ok=True)
+    assert DataInfuser.generate_addon_with_database(db_path, output_dir=str(output_dir), install=False)
+
+
+def search_all(addon_dir, queries):
+    """Вывод /qq для каждого запроса в интерпретаторе Lua с заглушками клиента (время поиска вырезано)"""
+    lua = LuaBench.load_lua_module().LuaRuntime(unpack_returned_tuples=True)
+    lua.execute(LuaBench.WOW_API_STUBS)
+    lua_globals = lua.globals()
+    lines = []
+    lua_globals.EZTEST_PRINT = lambda *parts: lines.append(SEARCH_TIME.sub('', ' '.join(str(part) for part in parts)))
+    lua.execute('function print(...) EZTEST_PRINT(...) end')
+
+    def load_addon(name):
+        path = os.path.join(addon_dir, name, f"{name}.lua")
+        if not os.path.exists(path):
+            return False
+        with open(path, 'r', encoding='utf-8') as f:
+            lua.execute(f.read())
+        return True
+
+    lua_globals.EZBENCH_LOAD_ADDON = load_addon
+    with open(os.path.join(addon_dir, 'EzInfo.lua'), 'r', encoding='utf-8') as f:
+        lua.execute(f.read())
+    lua_globals.EZBENCH_FIRE("ADDON_LOADED", "EzInfo")
+    slash = lua_globals.SlashCmdList["EZINFO"]
+    output = []
+    for query in queries:
+        del lines[:]
+        slash(query)
+        output.append((query, list(lines)))
+    return output
+
+
+def database_queries(*db_paths):
+    names, accounts, guilds = set(), set(), set()
+    for db_path in db_paths:
+        conn = sqlite3.connect(db_path)
+        for forum_name, name, guild in conn.execute("SELECT forum_name, name, guild FROM characters"):
+            names.add(name)
+            accounts.add(forum_name)
+            guilds.add(guild)
+        conn.close()
+    accounts.discard('')
+    guilds.discard('')
+    prefixes = {name[:2] + '*' for name in names}
+    return sorted(names) + sorted(accounts) + sorted(f"g:{guild}" for guild in guilds) + sorted(prefixes) + ['Nobody']
+
+
+@pytest.mark.parametrize('codegen_mode', ['classic', 'compact', 'prerendered'])
+def test_delta_build_matches_full_build(tmp_path, monkeypatch, codegen_mode):
+    monkeypatch.setattr(DataInfuser, 'CODEGEN_MODE', codegen_mode)
+    monkeypatch.setattr(DataInfuser, 'SHARD_COUNT', 0)
+    monkeypatch.setattr(DataInfuser, 'DELTA_BUILD', True)
+    monkeypatch.setattr(DataInfuser, 'DELTA_COMPACT_RATIO', 1.0)
+    old_db = make_database(tmp_path / 'ezbase_final_260101_0000.db', InfuserBench.synthetic_characters(600, 7))
+    new_db = make_database(tmp_path / 'ezbase_final_260101_0600.db', InfuserBench.synthetic_characters(600, 7))
+    mutate(new_db)
+
+    delta_dir, full_dir = tmp_path / 'delta', tmp_path / 'full'
+    build(old_db, delta_dir, delta=True)
+    with open(delta_dir / DataInfuser.BASE_MANIFEST, 'r', encoding='utf-8') as f:
+        base_id = json.load(f)['id']
+    build(new_db, delta_dir, delta=True)
+    build(new_db, full_dir, delta=False)
+
+    # Вторая сборка - дельта к той же базе, а не новая база
+    with open(delta_dir / DataInfuser.BASE_MANIFEST, 'r', encoding='utf-8') as f:
+        assert json.load(f)['id'] == base_id
+    with open(delta_dir / DataInfuser.DELTA_ADDON / f"{DataInfuser.DELTA_ADDON}.lua", 'r', encoding='utf-8') as f:
+        assert f'base = "{base_id}"' in f.read()
+
+    queries = database_queries(old_db, new_db)
+    delta_output = search_all(str(delta_dir), queries)
+    full_output = search_all(str(full_dir), queries)
+    assert delta_output == full_output
+    # Запросы действительно находят персонажей (а не только "не найден")
+    assert sum(1 for _, lines in full_output if len(lines) > 2) > len(queries) // 2
@@ -0,0 +1,124 @@
+import sqlite3
+import threading
+import time
+
+import pytest
+
+import DoubleScout
+
+
+def character(ez_id, name='Arthas'):
+    """Значения персонажа в порядке CHARACTER_FIELDS"""
+    return (ez_id, f"acc{ez_id}", name, 80, 5000, 0, 'Paladin', 'Human', '', 0, 0, False, True)
+
+
+def make_batch(page_number, ez_ids):
+    batch = DoubleScout.CharacterBatch(page_number)
+    for ez_id in ez_ids:
+        batch.append(character(ez_id, f"Name{ez_id}"))
+    return batch
+
+
+@pytest.fixture
+def tech_db(tmp_path, monkeypatch):
+    monkeypatch.setitem(DoubleScout.CONFIG, 'bases_folder', str(tmp_path))
+    return DoubleScout.init_technical_db('test')
+
+
+def test_character_batch_rows():
+    batch = make_batch(40, [7, 3])
+    assert len(batch) == 2
+    assert list(batch.rows()) == [character(7, 'Name7') + (40,), character(3, 'Name3') + (40,)]
+
+
+def test_save_characters_batch_falls_back_to_single_rows(tech_db):
+    conn = sqlite3.connect(tech_db)
+    conn.execute("CREATE TRIGGER reject_two BEFORE INSERT ON playtime_data WHEN NEW.ez_id = 2 "
+                 "BEGIN SELECT RAISE(ABORT, 'rejected'); END")
+    conn.commit()
+    conn.close()
+
+    assert DoubleScout.save_characters_batch(tech_db, 'playtime', make_batch(0, [1, 2, 3])) == 2
+
+    conn = sqlite3.connect(tech_db)
+    saved = [row[0] for row in conn.execute("SELECT ez_id FROM playtime_data ORDER BY ez_id")]
+    conn.close()
+    assert saved == [1, 3]
+
+
+class FakeRanking:
+    """Рейтинг из last + 1 непустых страниц, считает проверки страниц"""
+
+    def __init__(self, last):
+        self.last = last
+        self.checked = []
+        self.lock = threading.Lock()
+
+    def page_has_characters(self, session, base_url, page_index):
+        with self.lock:
+            self.checked.append(page_index)
+        return page_index <= self.last
+
+
+@pytest.mark.parametrize('last, known', [(0, 0), (1, 0), (2, 0), (5, 0), (37, 0), (64, 0), (1000, 0), (12345, 0),
+                                         (40, 40), (41, 40), (100, 41)])
+def test_search_last_page_index(monkeypatch, last, known):
+    ranking = FakeRanking(last)
+    monkeypatch.setattr(DoubleScout, 'page_has_characters', ranking.page_has_characters)
+
+    assert DoubleScout.search_last_page_index(None, 'url', known) == last
+    # Экспоненциальный поиск границы и бинарный внутри нее: проверок порядка log2 числа страниц
+    assert len(ranking.checked) <= 4 * ((last - known + 1).bit_length() + 2)
+
+
+def test_tail_tracker_hands_growth_to_waiting_stream(monkeypatch):
+    ranking = FakeRanking(3)
+    monkeypatch.setattr(DoubleScout, 'page_has_characters', ranking.page_has_characters)
+    monkeypatch.setattr(DoubleScout, 'TAIL_RECHECK_SECONDS', 600)
+    monkeypatch.setattr(DoubleScout, 'download_active', True)
+    pages = {'playtime': [0, 20, 40, 60], 'name': [0, 20, 40, 60]}
+    tracker = DoubleScout.TailTracker(None, 1, {'pages': pages, 'last_page': 60, 'total_pages': 4})
+
+    # playtime дошел до конца и ждет, name еще обходит свои страницы
+    result = []
+    waiter = threading.Thread(target=lambda: result.append(tracker.wait_for_pages('playtime', pages['playtime'], 4)))
+    waiter.start()
+    deadline = time.monotonic() + 5
+    while 'playtime' not in tracker.idle and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert waiter.is_alive()
+
+    # Рост рейтинга, найденный другим потоком, достается и ожидающему потоку
+    ranking.last = 5
+    tracker.refresh(force=True)
+    waiter.join(5)
+    assert result == [True]
+    assert pages['playtime'][4:] == pages['name'][4:] == [80, 100]
+
+    # name завершился, у playtime новых страниц нет - обход закончен
+    tracker.finish('name')
+    assert tracker.wait_for_pages('playtime', pages['playtime'], 6) is False
+    assert tracker.done
+
+
+def test_character_batch_exclude():
+    batch = make_batch(20, [1, 2, 3, 4]).exclude(DoubleScout.EzIdSet([2, 4]))
+    assert batch.page_number == 20
+    assert [row[0] for row in batch.rows()] == [1, 3]
+
+
+def test_ez_id_set_add_and_contains():
+    ez_ids = DoubleScout.EzIdSet([5, 0, 5, -1])
+    ez_ids.update([8, 1000003])
+    assert len(ez_ids) == 4
+    assert [ez_id for ez_id in (-1, 0, 1, 5, 7, 8, 9, 1000003, 1000004, 10 ** 9) if ez_id in ez_ids] == [0, 5, 8, 1000003]
+
+
+def test_ez_id_set_resumes_from_tech_db(tech_db):
+    DoubleScout.save_characters_batch(tech_db, 'playtime', make_batch(0, [3, 17, 64]))
+    DoubleScout.save_characters_batch(tech_db, 'name', make_batch(0, [99]))
+
+    saved = DoubleScout.load_saved_ez_ids(tech_db, 'playtime')
+    assert len(saved) == 3
+    assert 3 in saved and 17 in saved and 64 in saved
+    assert 99 not in saved and 4 not in saved
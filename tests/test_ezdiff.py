@@ -0,0 +1,49 @@
+import sqlite3
+from collections import Counter
+
+import EzDiff
+
+
+def make_snapshot(path, rows):
+    """База с таблицей characters из строк (ez_id, forum_name, name, level, gs, class, race, guild)"""
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE characters (ez_id INTEGER PRIMARY KEY, forum_name TEXT, name TEXT, level INTEGER, "
+                 "gs INTEGER, class TEXT, race TEXT, guild TEXT)")
+    conn.executemany("INSERT INTO characters VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+    conn.commit()
+    conn.close()
+    return str(path)
+
+
+def test_diff_snapshots_counts(tmp_path, monkeypatch):
+    # Маленькие пачки, чтобы слияние проходило через границы пачек обеих баз
+    monkeypatch.setattr(EzDiff, 'FETCH_BATCH', 2)
+    old_db = make_snapshot(tmp_path / 'old.db', [
+        (1, 'acc1', 'Arthas', 80, 5000, 'Paladin', 'Human', 'Guild A'),
+        (2, 'acc1', 'Jaina', 79, 0, 'Mage', 'Human', 'Guild A'),
+        (3, 'acc2', 'Thrall', 80, 4000, 'Shaman', 'Orc', ''),
+        (4, 'acc2', 'Sylvanas', 80, 4000, 'Hunter', 'Undead', 'Guild B'),
+        (5, 'acc3', 'Illidan', 80, 3000, 'Warrior', 'Night Elf', ''),
+        (6, 'acc3', 'Tyrande', 80, 3000, 'Priest', 'Night Elf', ''),
+    ])
+    new_db = make_snapshot(tmp_path / 'new.db', [
+        (1, 'acc1', 'Arthas', 80, 5000, 'Paladin', 'Human', 'Guild A'),        # без изменений
+        (2, 'acc1', 'Jaina', 80, 0, 'Mage', 'Human', 'Guild A'),               # level_up
+        (3, 'acc2', 'Thrall', 80, 4050, 'Shaman', 'Orc', ''),                  # GS меньше порога - без изменений
+        (4, 'acc2', 'Sylvanas', 80, 4300, 'Hunter', 'Undead', 'Guild C'),      # gs_jump и guild_change
+        (6, 'acc4', 'Whisperwind', 80, 3000, 'Priest', 'Night Elf', ''),       # renamed и account_relink
+        (7, 'acc5', 'Varian', 80, 4500, 'Warrior', 'Human', ''),               # added
+        (8, 'acc5', 'Anduin', 70, 0, 'Priest', 'Human', ''),                   # added
+    ])
+
+    counts = Counter()
+    changes = list(EzDiff.diff_snapshots(old_db, new_db, counts))
+
+    assert counts == Counter({
+        'old': 6, 'new': 7, 'unchanged': 2, 'changed': 3, 'added': 2, 'deleted': 1,
+        'level_up': 1, 'gs_jump': 1, 'guild_change': 1, 'renamed': 1, 'account_relink': 1,
+    })
+    assert [(change['type'], change['ez_id']) for change in changes] == [
+        ('level_up', 2), ('gs_jump', 4), ('guild_change', 4), ('deleted', 5),
+        ('account_relink', 6), ('renamed', 6), ('added', 7), ('added', 8),
+    ]